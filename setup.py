@@ -35,8 +35,13 @@ PROJECT_URLS = {
 }
 
 dependencies = [
+    'numpy',
 ]
 
+extras = {
+    'parquet': ['pyarrow'],
+}
+
 from setuptools import setup
 
 if __name__ == '__main__':
@@ -52,4 +57,6 @@ if __name__ == '__main__':
         classifiers=CLASSIFIERS,
         project_urls=PROJECT_URLS,
         python_requires='>=3.6',
+        install_requires=dependencies,
+        extras_require=extras,
     )
@@ -3,3 +3,18 @@ from .stdf_to_csv import StdfToCsv
 from .stdf_patch import StdfPatch
 from .stdf_per_part import StdfPerPart
 from .stdf_to_sql import StdfToSql
+from .stdf_cache import StdfCache
+from .async_stdf_record import AsyncStdfRecord
+from .stdf_ingest import StdfIngest
+from .stdf_scan import StdfScanner
+from .stdf_wafer_map import StdfWaferMap
+from .stdf_summary import StdfSummary
+from .stdf_lot import StdfLot
+from .part_index import PartIndex
+from .stdf_matrix import StdfToMatrix
+from .result_store import ResultStore
+from .stdf_writer import StdfWriter
+from .stdf_generator import StdfGenerator
+from .stdf_verify import StdfVerify
+from .stdf_diff import StdfDiff
+from .stdf_to_txt import StdfToTxt
@@ -0,0 +1,385 @@
+import argparse
+import logging
+import os
+import sys
+from util import parse_size, peak_rss
+
+
+def ingest(args):
+    from stdf_utils.stdf_ingest import StdfIngest
+    stdf_ingest = StdfIngest(args.root, db_path=args.db, storage=args.storage, dry_run=args.dry_run,
+                             checkpoint_every=args.checkpoint_every, max_memory=args.max_memory,
+                             tmp_dir=args.tmp_dir)
+    for reason, path in stdf_ingest.pending:
+        print(f"{reason:8} {path}")
+    if not args.dry_run:
+        print(f"ingested: {len(stdf_ingest.ingested)}, failed: {len(stdf_ingest.failed)}")
+    return 1 if stdf_ingest.failed else 0
+
+
+def to_csv(args):
+    from stdf_utils.stdf_to_csv import StdfToCsv
+    for path in args.stdf:
+        stdf_to_csv = StdfToCsv(path, csv_path=args.output if len(args.stdf) == 1 else None,
+                                max_memory=args.max_memory, tmp_dir=args.tmp_dir)
+        print(f"{path} -> {stdf_to_csv.csv_path}")
+    return 0
+
+
+def matrix(args):
+    from stdf_utils.stdf_matrix import StdfToMatrix
+    tests = [int(t) for t in args.tests.split(",")] if args.tests else None
+    stdf_to_matrix = StdfToMatrix(args.stdf, args.output, tests=tests, chunk_rows=args.chunk_rows)
+    print(f"{stdf_to_matrix.part_cnt} parts x {len(stdf_to_matrix.catalog)} tests -> {args.output}, "
+          f"columns: {stdf_to_matrix.columns_path}")
+    return 0
+
+
+def summary(args):
+    from stdf_utils.stdf_summary import StdfSummary
+    for path in args.stdf:
+        stdf_summary = StdfSummary(path)
+        yield_ = f"{stdf_summary.yield_:.2%}" if stdf_summary.yield_ is not None else "n/a"
+        print(f"{path}: parts {stdf_summary.part_cnt}, good {stdf_summary.good_cnt}, yield {yield_}")
+        for test in stdf_summary.top_failing_tests(args.top):
+            print(f"  {test['test_num']:>10} {test['fail_cnt']:>8} / {test['exec_cnt']:<8} {test['test_nam']}")
+    return 0
+
+
+def find_stdf(paths: list) -> list:
+    """ Files as given, directories walked for stdf files """
+    from stdf_utils.stdf_ingest import RE_STDF
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for cur_dir, dirs, file_names in os.walk(path):
+                dirs.sort()
+                found += [os.path.join(cur_dir, f) for f in sorted(file_names) if RE_STDF.search(f)]
+        else:
+            found.append(path)
+    return found
+
+
+def lot(args):
+    from stdf_utils.stdf_lot import StdfLot
+    stdf_lot = StdfLot(find_stdf(args.paths), jobs=args.jobs, cache_dir=args.cache_dir)
+    stdf_lot.to_csv(args.output)
+    print(f"{len(stdf_lot.files)} files, {stdf_lot.part_cnt} parts, {len(stdf_lot.names)} tests -> {args.output}")
+    return 0
+
+
+def store(args):
+    from stdf_utils.result_store import ResultStore
+    result_store = ResultStore(args.root)
+    for path in result_store.add(find_stdf(args.paths)):
+        print(f"appended {path}")
+    print(f"{len(result_store.files())} files, {result_store.part_cnt} parts, {len(result_store.tests())} tests")
+    return 0
+
+
+def dedup(args):
+    from stdf_utils.part_index import PartIndex
+    part_index = PartIndex(args.stdf)
+    first, final = part_index.yield_("first"), part_index.yield_("final")
+    print(f"parts {part_index.part_cnt}, dies {part_index.die_cnt}, "
+          f"retested {sum(1 for _ in part_index.retested())}")
+    if first is not None:
+        print(f"first pass yield {first:.2%}, final yield {final:.2%}")
+    if args.db:
+        from stdf_utils.sql_conn import SqlConn
+        part_index.to_sql(SqlConn(args.db))
+    return 0
+
+
+def parse_assignments(assignments: list) -> dict:
+    """ ["Mir.LOT_ID=A12345", ...] -> {"Mir": {"LOT_ID": b"A12345"}}, typed after the field format """
+    from stdf_utils.stdf_writer import KEYS
+    from stdf_utils.stdf_record import RECORD_TABLE
+    values = {}
+    for assignment in assignments:
+        name, _, value = assignment.partition("=")
+        rec_type, _, field = name.partition(".")
+        if rec_type not in KEYS:
+            raise ValueError(f"record type '{rec_type}' is not supported")
+        fmt = dict(RECORD_TABLE[KEYS[rec_type]]["fields"]).get(field)
+        if fmt is None:
+            raise ValueError(f"{rec_type} has no field '{field}'")
+        if fmt[0] in "UI" or fmt in ("B1", "B0"):  # flags as numbers: PART_FLG=0x08
+            value = int(value, 0)
+        elif fmt[0] == "R":
+            value = float(value)
+        elif fmt != "C1":
+            value = value.encode("latin1")
+        values.setdefault(rec_type, {})[field] = value
+    return values
+
+
+def patch(args):
+    from stdf_utils.stdf_patch import StdfInPlacePatch, set_fields, undo_patch
+    from stdf_utils.stdf_scan import StdfScanner
+    if args.undo:
+        undo_patch(args.stdf + ".undo")
+        print(f"{args.stdf}: restored")
+        return 0
+    if not args.set:
+        print("nothing to patch: give at least one --set REC.FIELD=VALUE, or --undo", file=sys.stderr)
+        return 2
+    values = parse_assignments(args.set)
+    scanner = StdfScanner(args.stdf, {"Far"})
+    next(iter(scanner), None)  # the byte order
+    stdf_patch = StdfInPlacePatch(args.stdf, set_fields(values, scanner.ENDIAN), set(values),
+                                  dry_run=args.dry_run, mod_stdf_path=args.output)
+    if stdf_patch.in_place:
+        for offset, original, patched in stdf_patch.edits:
+            print(f"{offset:>12} {len(patched)} bytes{' (dry run)' if args.dry_run else ''}")
+        if stdf_patch.edits and not args.dry_run:
+            print(f"{args.stdf}: patched in place, undo journal: {stdf_patch.journal_path}")
+    elif stdf_patch.mod_stdf_path:
+        print(f"{args.stdf}: record length changes, rewritten to {stdf_patch.mod_stdf_path}")
+    else:
+        print(f"{args.stdf}: record length changes, would be rewritten (dry run)")
+    return 0
+
+
+def generate(args):
+    from stdf_utils.stdf_generator import StdfGenerator
+    stdf_generator = StdfGenerator(args.output, parts=args.parts, sites=args.sites, tests=args.tests,
+                                   mpr_ratio=args.mpr, ftr_ratio=args.ftr, truncate_ptr=not args.full_ptr,
+                                   noise_rate=args.noise, fail_rate=args.fail_rate, retest_rate=args.retest,
+                                   wafers=args.wafers, endian=args.endian, seed=args.seed)
+    print(f"{args.output}: {stdf_generator.part_cnt} parts ({stdf_generator.retest_cnt} retests), "
+          f"{stdf_generator.record_cnt} records, {os.path.getsize(args.output) / (1 << 20):.1f} MiB")
+    return 0
+
+
+def bench(args):
+    from stdf_utils.stdf_bench import StdfBench
+    split = (lambda text: text.split(",") if text else None)
+    compressions = None if args.compression is None else \
+        ["" if c in {"", "none", "stdf"} else "." + c.lstrip(".") for c in args.compression.split(",")]
+    stdf_bench = StdfBench(split(args.only), split(args.sizes), compressions, repeat=args.repeat, alloc=args.alloc,
+                           data_dir=args.data_dir)
+    stdf_bench.save(args.output)
+    for key, result in stdf_bench.results.items():
+        print(f"{key:40} {result['records_per_s']:>14,.0f} rec/s {result['mb_per_s']:>9.1f} MB/s "
+              f"{(result['peak_rss'] or 0) / (1 << 20):>8.1f} MiB")
+    print(f"-> {args.output}")
+    if args.baseline:
+        return bench_compare(argparse.Namespace(baseline=args.baseline, current=args.output,
+                                                threshold=args.threshold))
+    return 0
+
+
+def bench_compare(args):
+    from stdf_utils.stdf_bench import compare
+    regressions = compare(args.baseline, args.current, args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r['benchmark']}: {r['baseline']:,.0f} -> {r['current']:,.0f} rec/s ({r['change']:+.1%})")
+    if not regressions:
+        print(f"no regression past {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def verify(args):
+    from stdf_utils.stdf_verify import StdfVerify
+    stdf_paths = find_stdf(args.stdf)
+    if args.output and len(stdf_paths) > 1:
+        print("-o only goes with a single stdf, use --salvage for many", file=sys.stderr)
+        return 2
+    failed = 0
+    for stdf_path in stdf_paths:
+        salvage_path = args.output
+        if args.salvage and not salvage_path:
+            name = os.path.basename(stdf_path)
+            stem, ext = (name[:-3], ".gz") if name.endswith(".gz") else (name, "")
+            stem = os.path.splitext(stem)[0]
+            salvage_path = os.path.join(os.path.dirname(stdf_path), f"{stem}_salvaged.stdf{ext}")
+        stdf_verify = StdfVerify(stdf_path, salvage_path, max_issues=args.max_issues)
+        for issue in stdf_verify.issues:
+            print(f"{stdf_path}:{issue.offset}: {issue.kind}: {issue.detail}")
+        if stdf_verify.issue_cnt > len(stdf_verify.issues):
+            print(f"{stdf_path}: {stdf_verify.issue_cnt - len(stdf_verify.issues)} more issues not listed")
+        print(f"{stdf_path}: {'ok' if stdf_verify.ok else 'FAILED'}, {stdf_verify.record_cnt} records, "
+              f"{stdf_verify.size} bytes, {stdf_verify.damaged_bytes} damaged, {stdf_verify.truncated_bytes} truncated"
+              + (f" -> {salvage_path}" if salvage_path else ""))
+        failed += not stdf_verify.ok
+    return 1 if failed else 0
+
+
+def diff(args):
+    from stdf_utils.stdf_diff import StdfDiff
+    split = (lambda text: set(text.split(",")) if text else None)
+    stdf_diff = StdfDiff(args.old, args.new, rel_tol=args.rel_tol, abs_tol=args.abs_tol, ignore=split(args.ignore),
+                         types=split(args.types), max_diffs=args.max_diffs)
+    for line in stdf_diff.report():
+        print(line)
+    return 0 if stdf_diff.identical else 1
+
+
+def to_txt(args):
+    from stdf_utils.stdf_to_txt import StdfToTxt
+    split = (lambda text: set(text.split(",")) if text else None)
+    stdf_paths = find_stdf(args.stdf)
+    if args.output and len(stdf_paths) > 1:
+        print("-o only goes with a single stdf", file=sys.stderr)
+        return 2
+    for stdf_path in stdf_paths:
+        stdf_to_txt = StdfToTxt(stdf_path, args.output, style=args.style, types=split(args.types),
+                                fields=split(args.fields), workers=args.workers, batch_size=args.batch_size)
+        print(f"{stdf_path}: {stdf_to_txt.record_cnt} records -> {stdf_to_txt.txt_path}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m stdf_utils")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--max-memory", type=parse_size, metavar="SIZE",
+                        help="e.g. 2G: spill intermediate results to sorted temp runs beyond this")
+    parser.add_argument("--tmp-dir", help="where spilled runs go, default: the system temp dir")
+    parser.add_argument("--stats", action="store_true",
+                        help="count and time records per type while parsing, printed at the end; "
+                             "worker processes are not included")
+    parser.add_argument("--stats-sample", type=int, default=1, metavar="N", help="time 1 in N records")
+    parser.add_argument("--progress", action="store_true", help="bytes, records/s and ETA of every parse on stderr")
+    parser.add_argument("--progress-interval", type=float, default=1.0, metavar="SECONDS")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("ingest", help="load new or changed stdf files under a directory into sqlite")
+    p.add_argument("root")
+    p.add_argument("--db", help="sqlite path, default: <root>/local.db")
+    p.add_argument("--storage", choices=("row", "blob"), default="row")
+    p.add_argument("--dry-run", action="store_true", help="only list the pending files")
+    p.add_argument("--checkpoint-every", type=int, default=0, metavar="N",
+                   help="commit every N parts so an interrupted ingest can resume")
+    p.set_defaults(func=ingest)
+
+    p = commands.add_parser("csv", help="per-test statistics of each stdf file")
+    p.add_argument("stdf", nargs="+")
+    p.add_argument("-o", "--output", help="csv path for a single stdf, default: next to the stdf")
+    p.set_defaults(func=to_csv)
+
+    p = commands.add_parser("matrix", help="part x test float32 matrix as .npy, .parquet or .csv")
+    p.add_argument("stdf")
+    p.add_argument("output", help="format from the extension: .npy, .parquet (needs pyarrow) or .csv")
+    p.add_argument("--tests", help="comma separated test numbers, in column order")
+    p.add_argument("--chunk-rows", type=int, default=4096)
+    p.set_defaults(func=matrix)
+
+    p = commands.add_parser("summary", help="yield and top failing tests from the summary records")
+    p.add_argument("stdf", nargs="+")
+    p.add_argument("--top", type=int, default=10, help="number of failing tests to list")
+    p.set_defaults(func=summary)
+
+    p = commands.add_parser("lot", help="per-test statistics over many stdf files, per tester and site")
+    p.add_argument("paths", nargs="+", help="stdf files or directories")
+    p.add_argument("-o", "--output", default="lot.csv")
+    p.add_argument("-j", "--jobs", type=int, help="worker processes, default: cpu count")
+    p.add_argument("--cache-dir", help="keep per-file partials here and reuse them while the file is unchanged")
+    p.set_defaults(func=lot)
+
+    p = commands.add_parser("store", help="append stdf files to a memory-mapped result store")
+    p.add_argument("root", help="store directory, created if missing")
+    p.add_argument("paths", nargs="+", help="stdf files or directories")
+    p.set_defaults(func=store)
+
+    p = commands.add_parser("dedup", help="first pass and final yield per die across retests")
+    p.add_argument("stdf", nargs="+")
+    p.add_argument("--db", help="write the PartDedup table (PartFirst/PartFinal views) into this sqlite db")
+    p.set_defaults(func=dedup)
+
+    p = commands.add_parser("patch", help="overwrite record fields, in place when lengths are kept")
+    p.add_argument("stdf")
+    p.add_argument("--set", action="append", default=[], metavar="REC.FIELD=VALUE", help="e.g. Mir.LOT_ID=A12345")
+    p.add_argument("--dry-run", action="store_true", help="only list the records that would change")
+    p.add_argument("-o", "--output", help="rewrite target when a length changes, default: <name>_mod.stdf")
+    p.add_argument("--undo", action="store_true", help="restore the bytes saved in <stdf>.undo")
+    p.set_defaults(func=patch)
+
+    p = commands.add_parser("verify", help="check record headers and sequence, exit 1 on damage")
+    p.add_argument("stdf", nargs="+", help="stdf files or directories")
+    p.add_argument("--salvage", action="store_true", help="write the good records to <name>_salvaged.stdf")
+    p.add_argument("-o", "--output", help="salvage target of a single stdf, .gz compressed")
+    p.add_argument("--max-issues", type=int, default=1000, help="issues listed per file")
+    p.set_defaults(func=verify)
+
+    p = commands.add_parser("diff", help="record-level differences against a golden stdf, exit 1 when any")
+    p.add_argument("old", help="golden stdf")
+    p.add_argument("new")
+    p.add_argument("--rel-tol", type=float, default=1e-9, help="relative tolerance of float fields")
+    p.add_argument("--abs-tol", type=float, default=0.0, help="absolute tolerance of float fields")
+    p.add_argument("--ignore", help="comma separated fields, e.g. Mir.START_T,Mrr.FINISH_T or SETUP_T")
+    p.add_argument("--types", help="comma separated record types to compare, default: all")
+    p.add_argument("--max-diffs", type=int, default=1000, help="differences listed per kind")
+    p.set_defaults(func=diff)
+
+    p = commands.add_parser("txt", help="byte-stable text dump, one ATDF-style line per record")
+    p.add_argument("stdf", nargs="+", help="stdf files or directories")
+    p.add_argument("-o", "--output", help="target of a single stdf, default: <name>.atdf or <name>.txt")
+    p.add_argument("--style", choices=("atdf", "txt"), default="atdf",
+                   help="txt: the '=== Ptr ===' block per record with one 'FIELD: value' line per field")
+    p.add_argument("--types", help="comma separated record types, default: all")
+    p.add_argument("--fields", help="comma separated fields to keep, e.g. Ptr.TEST_NUM,Ptr.RESULT")
+    p.add_argument("--workers", type=int, default=0, help="format batches in this many processes")
+    p.add_argument("--batch-size", type=int, default=4096, help="records per formatted batch")
+    p.set_defaults(func=to_txt)
+
+    p = commands.add_parser("generate", help="deterministic synthetic stdf for scale tests and benchmarks")
+    p.add_argument("output", help=".stdf, .stdf.gz or .stdf.bz2")
+    p.add_argument("--parts", type=int, default=1000, help="dies tested once, retests not included")
+    p.add_argument("--sites", type=int, default=4)
+    p.add_argument("--tests", type=int, default=100, help="tests per part")
+    p.add_argument("--mpr", type=float, default=0.0, help="share of the tests that are MPRs")
+    p.add_argument("--ftr", type=float, default=0.0, help="share of the tests that are FTRs")
+    p.add_argument("--full-ptr", action="store_true", help="write every PTR in full, not only the first touchdown")
+    p.add_argument("--noise", type=float, default=0.0, help="share of the parts followed by a DTR and a GDR")
+    p.add_argument("--fail-rate", type=float, default=0.05)
+    p.add_argument("--retest", type=float, default=0.0, help="share of every wafer's dies tested again")
+    p.add_argument("--wafers", type=int, default=1, help="0: package test, no wafer records or coordinates")
+    p.add_argument("--endian", choices=("<", ">"), default="<")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=generate)
+
+    p = commands.add_parser("bench", help="throughput of the parser and exporters over generated inputs")
+    p.add_argument("-o", "--output", default="bench.json")
+    p.add_argument("--only", help="comma separated benchmarks, default: all")
+    p.add_argument("--sizes", help="comma separated: small, medium, large; default: small,medium")
+    p.add_argument("--compression", help="comma separated: none, gz, bz2; default: all three")
+    p.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    p.add_argument("--alloc", action="store_true", help="also measure the tracemalloc peak, in an extra run")
+    p.add_argument("--data-dir", help="where the generated inputs are kept, default: <tmp>/stdf-bench")
+    p.add_argument("--baseline", help="compare against this results json, exit 1 on a regression")
+    p.add_argument("--threshold", type=float, default=0.1, help="allowed drop in records/s, default: 0.1")
+    p.set_defaults(func=bench)
+
+    p = commands.add_parser("bench-compare", help="exit 1 when records/s dropped past the threshold")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.1, help="allowed drop in records/s, default: 0.1")
+    p.set_defaults(func=bench_compare)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    if args.stats:
+        from stdf_utils import parse_stats
+        parse_stats.default_stats = parse_stats.ParseStats(args.stats_sample)
+    if args.progress:
+        from stdf_utils import progress
+        progress.default_progress = progress.Progress(progress.print_progress, interval=args.progress_interval)
+    try:
+        return args.func(args)
+    finally:
+        if args.progress:
+            progress.default_progress = None
+        if args.stats:
+            print(parse_stats.default_stats.table(), file=sys.stderr)
+            parse_stats.default_stats = None
+        rss = peak_rss()
+        if rss is not None:
+            print(f"peak rss: {rss / (1 << 20):.1f} MiB", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
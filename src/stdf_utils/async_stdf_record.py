@@ -0,0 +1,118 @@
+import asyncio
+import concurrent.futures
+import threading
+from collections import deque
+from typing import Any, List, Optional, Tuple
+from stdf_utils.stdf_record import StdfRecord
+
+
+class AsyncStdfRecord:
+    """
+    `async for` over StdfRecord. Decompression and decoding run in an executor thread, and records are
+    handed to the event loop in batches through a bounded queue, so a slow consumer throttles the reader.
+
+        async for rec_type, rec in AsyncStdfRecord(stdf_path, {"Ptr"}):
+            ...
+
+        async for batch in AsyncStdfRecord(stdf_path).batches():
+            ...
+    """
+    POLL_INTERVAL = 0.1  # seconds, how often a blocked producer checks for cancellation
+
+    def __init__(self, file_path: str, parse_types: set = None, batch_size: int = 512, max_batches: int = 8,
+                 executor: concurrent.futures.Executor = None):
+        self.file_path = file_path
+        self.parse_types = parse_types
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.executor = executor
+
+        # cache
+        self._batches = None
+        self._batch: deque = deque()
+
+    def __aiter__(self):
+        self._batches = self.batches()
+        self._batch.clear()
+        return self
+
+    async def __anext__(self) -> Tuple[str, dict]:
+        while not self._batch:
+            try:
+                self._batch.extend(await self._batches.__anext__())
+            except StopAsyncIteration:
+                self._batches = None
+                raise
+        return self._batch.popleft()
+
+    async def aclose(self):
+        """ Stop the reader thread; needed when leaving an `async for` early with `break` """
+        if self._batches is not None:
+            await self._batches.aclose()
+            self._batches = None
+        self._batch.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def batches(self):
+        """ Yield lists of up to batch_size (rec_type, record) tuples """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_batches)
+        stop = threading.Event()
+        producer = loop.run_in_executor(self.executor, self._produce, loop, queue, stop)
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                yield batch
+            await producer  # re-raise errors from the reader thread
+        finally:
+            stop.set()
+
+    def _produce(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, stop: threading.Event):
+        batch: List[Tuple[str, Any]] = []
+        reader = StdfRecord(self.file_path, self.parse_types)
+        next_record = reader.get_next_record
+
+        def get_next_record():
+            # checked per record read, not only per record yielded: with narrow parse_types those can be a
+            # whole file apart
+            if stop.is_set():
+                raise EOFError
+            return next_record()
+        reader.get_next_record = get_next_record
+        try:
+            for rec_type, rec in reader:
+                if stop.is_set():
+                    return
+                batch.append((rec_type, rec))
+                if len(batch) >= self.batch_size:
+                    if not self._put(loop, queue, stop, batch):
+                        return
+                    batch = []
+            if batch:
+                self._put(loop, queue, stop, batch)
+        finally:
+            self._put(loop, queue, stop, None)
+
+    def _put(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, stop: threading.Event,
+             batch: Optional[list]) -> bool:
+        """ Blocking put from the reader thread; returns False once the consumer has gone away """
+        if stop.is_set() or loop.is_closed():
+            return False
+        future = asyncio.run_coroutine_threadsafe(queue.put(batch), loop)
+        while True:
+            try:
+                future.result(timeout=self.POLL_INTERVAL)
+                return True
+            except concurrent.futures.CancelledError:
+                return False
+            except concurrent.futures.TimeoutError:
+                if stop.is_set() or loop.is_closed():
+                    future.cancel()
+                    return False
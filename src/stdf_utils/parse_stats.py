@@ -0,0 +1,114 @@
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+# picked up by every StdfRecord created without its own `stats`, e.g. by the CLI's --stats
+default_stats: Optional["ParseStats"] = None
+
+
+class TimedFile:
+    """ Raw file whose reads are added to stats.io_s; everything else is passed through """
+    def __init__(self, fp, stats: "ParseStats"):
+        self._fp = fp
+        self._stats = stats
+
+    def read(self, n: int = -1) -> bytes:
+        start = time.perf_counter()
+        data = self._fp.read(n)
+        self._stats.io_s += time.perf_counter() - start
+        return data
+
+    def readinto(self, b) -> int:
+        start = time.perf_counter()
+        n = self._fp.readinto(b)
+        self._stats.io_s += time.perf_counter() - start
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+
+class ParseStats:
+    """
+    Where a StdfRecord parse spends its time. Records and bytes are counted per type; 1 in `sample` records
+    is timed for decode (per type) and for the consumer (the code between two yields), and totals are
+    extrapolated from the timed ones. Time blocked on the file is split into raw I/O and decompression.
+        stats = ParseStats()
+        for rec_type, rec in StdfRecord(path, stats=stats):
+            ...
+        print(stats.table())
+    A StdfRecord without stats runs its plain loop and pays nothing.
+    """
+    def __init__(self, sample: int = 1):
+        self.sample = max(sample, 1)
+        self.counts: Counter = Counter()
+        self.bytes: Counter = Counter()
+        self.timed: Counter = Counter()
+        self.decode_s: Dict[str, float] = defaultdict(float)
+        self.read_s: float = 0.0  # blocked in read(): I/O + decompression
+        self.io_s: float = 0.0  # raw reads of the file
+        self.consumer_s: float = 0.0
+        self.consumer_timed: int = 0
+        self.yielded: int = 0
+        self.wall_s: float = 0.0
+        self.files: int = 0
+
+    def timed_file(self, fp) -> TimedFile:
+        return TimedFile(fp, self)
+
+    def timed_read(self, read):
+        clock = time.perf_counter
+
+        def timed(n: int) -> bytes:
+            start = clock()
+            data = read(n)
+            self.read_s += clock() - start
+            return data
+        return timed
+
+    # totals
+    def decode_total(self, rec_type: str) -> float:
+        timed = self.timed[rec_type]
+        return self.decode_s[rec_type] * self.counts[rec_type] / timed if timed else 0.0
+
+    @property
+    def consumer_total(self) -> float:
+        return self.consumer_s * self.yielded / self.consumer_timed if self.consumer_timed else 0.0
+
+    def merge(self, other: "ParseStats"):
+        self.counts.update(other.counts)
+        self.bytes.update(other.bytes)
+        self.timed.update(other.timed)
+        for rec_type, seconds in other.decode_s.items():
+            self.decode_s[rec_type] += seconds
+        for name in ("read_s", "io_s", "consumer_s", "consumer_timed", "yielded", "wall_s", "files"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def to_dict(self) -> dict:
+        return {
+            "files": self.files,
+            "sample": self.sample,
+            "wall_s": self.wall_s,
+            "read_s": self.read_s,
+            "io_s": self.io_s,
+            "decompress_s": max(self.read_s - self.io_s, 0.0),
+            "consumer_s": self.consumer_total,
+            "yielded": self.yielded,
+            "types": {rec_type: {"count": self.counts[rec_type], "bytes": self.bytes[rec_type],
+                                 "decode_s": self.decode_total(rec_type)}
+                      for rec_type in sorted(self.counts, key=lambda t: -self.counts[t])},
+        }
+
+    def table(self) -> str:
+        if not self.files:
+            return "parse stats: nothing was parsed through StdfRecord"
+        d = self.to_dict()
+        lines = [f"{'type':8} {'records':>12} {'bytes':>14} {'decode s':>10} {'us/rec':>8}"]
+        for rec_type, t in d["types"].items():
+            us = t["decode_s"] / t["count"] * 1e6 if t["count"] else 0.0
+            lines.append(f"{rec_type or 'Unknown':8} {t['count']:>12,} {t['bytes']:>14,} {t['decode_s']:>10.3f} "
+                         f"{us:>8.2f}")
+        lines.append(f"read {d['read_s']:.3f} s (io {d['io_s']:.3f} s, decompress {d['decompress_s']:.3f} s), "
+                     f"consumer {d['consumer_s']:.3f} s, wall {d['wall_s']:.3f} s, files {d['files']}"
+                     + (f", 1 in {self.sample} records timed" if self.sample > 1 else ""))
+        return "\n".join(lines)
@@ -41,6 +41,21 @@ class PartData:
 
         # TODO: Add TimeStamp
 
+    def to_dict(self) -> dict:
+        """ In-flight state for a checkpoint """
+        state = {k: v for k, v in vars(self).items() if k not in {"ptr_list", "ptr_fact"}}
+        state["ptr_list"] = [(ptr.test_num, ptr.result) for ptr in self.ptr_list]
+        return state
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "PartData":
+        part_data = cls(state["site"])
+        for k, v in state.items():
+            if k != "ptr_list":
+                setattr(part_data, k, v)
+        part_data.ptr_list = [Ptr({"TEST_NUM": test_num, "RESULT": result}) for test_num, result in state["ptr_list"]]
+        return part_data
+
     def update_ptr(self, row: dict):
         if self.ptr_fact.check_unique_test_num(row):
             self.ptr_list.append(Ptr(row))
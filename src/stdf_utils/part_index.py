@@ -0,0 +1,169 @@
+import logging
+import os
+import re
+import struct
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+from stdf_utils.stdf_record import StdfRecord
+from stdf_utils.stdf_scan import StdfScanner
+
+INVALID_COORD = -32768
+RE_ECID = re.compile(r"ECID_(VALID|FAB|LOT_ID|WAFER_ID|X_COORD|Y_COORD),\d+,(\d+),(\w+)")
+
+
+def stdf_name(stdf_path: str) -> str:
+    """ Same name StdfToSql stores in the Stdf table """
+    return re.sub(r"(\.stdf)(\.gz)?", "", os.path.basename(stdf_path), flags=re.I)
+
+
+class PartRef(NamedTuple):
+    order: Tuple[int, int, int]  # (MIR START_T, file sequence, part sequence): test order across files
+    stdf_name: str
+    part_seq: int  # n-th PRR of the file, unlike PART_ID unique across heads and retests
+    part_id: str
+    site: int
+    hard_bin: int
+    soft_bin: int
+    passed: bool
+
+
+class Die:
+    __slots__ = ("first", "final", "count")
+
+    def __init__(self, part: PartRef):
+        self.first: PartRef = part
+        self.final: PartRef = part
+        self.count: int = 1
+
+    def add(self, part: PartRef):
+        self.count += 1
+        if part.order < self.first.order:
+            self.first = part
+        if part.order >= self.final.order:
+            self.final = part
+
+
+class PartIndex:
+    """
+    One entry per physical die, keyed by the ECID from the DTRs when there is one, else by MIR LOT_ID,
+    WIR WAFER_ID and the PRR coordinates. Each entry keeps the first and the final test of the die, so
+    memory grows with unique dies however many times they were retested. Parts without either key
+    (packaged parts without ECID) are their own die.
+    """
+    def __init__(self, stdf_paths: Iterable[str] = ()):
+        self.dies: Dict[str, Die] = {}
+        self.file_cnt: int = 0
+        self.part_cnt: int = 0
+        self.short_prr_cnt: int = 0  # truncated PRRs, indexed with defaults for the missing fields
+        for stdf_path in stdf_paths:
+            self.add_file(stdf_path)
+
+    def add(self, key: str, part: PartRef):
+        self.part_cnt += 1
+        die = self.dies.get(key)
+        if die is None:
+            self.dies[key] = Die(part)
+        else:
+            die.add(part)
+
+    def add_file(self, stdf_path: str):
+        """ One pass over MIR/WIR/DTR/PIR/PRR; PTRs are stepped over without being decoded """
+        name = stdf_name(stdf_path)
+        file_seq = self.file_cnt
+        self.file_cnt += 1
+        scanner = StdfScanner(stdf_path, {"Mir", "Wir", "Dtr", "Pir", "Prr"})
+        decoder = StdfRecord(stdf_path)
+        prr = None
+        start_t, lot_id, wafer_id = 0, "", ""
+        ecid: Dict[int, Dict[str, str]] = {}  # {site: {field: value}} for the open parts
+        part_seq = 0
+        for offset, key, body in scanner:
+            if prr is None:
+                prr = struct.Struct(f"{scanner.ENDIAN}xBBxxHHhh").unpack_from
+                decoder.ENDIAN = scanner.ENDIAN
+            if key == b'\x05\x14':  # Prr
+                # HEAD_NUM U1, SITE_NUM U1, PART_FLG B1, NUM_TEST U2, HARD_BIN U2, SOFT_BIN U2, X I2, Y I2,
+                # TEST_T U4, PART_ID Cn
+                if len(body) >= 17:
+                    site, part_flg, hard_bin, soft_bin, x, y = prr(body, 0)
+                    part_id = body[18:18 + body[17]].decode(errors="replace") if len(body) > 17 else ""
+                else:
+                    # truncated: fields cut off come back as None and take their "invalid" values
+                    rec = decoder.decode(key, body)
+                    site, hard_bin, soft_bin, x, y = (
+                        default if rec[field] is None else rec[field] for field, default in (
+                            ("SITE_NUM", 0), ("HARD_BIN", 0xFFFF), ("SOFT_BIN", 0xFFFF), ("X_COORD", INVALID_COORD),
+                            ("Y_COORD", INVALID_COORD)))
+                    part_flg = int(rec["PART_FLG"], 16) if rec["PART_FLG"] is not None else 0x10
+                    part_id = ""
+                    self.short_prr_cnt += 1
+                    logging.warning(f"{name}: PRR #{part_seq} at offset {offset} is {len(body)} bytes, truncated")
+                if part_flg & 0x10:  # pass/fail flag invalid
+                    passed = hard_bin == 1
+                else:
+                    passed = not part_flg & 0x08
+                fields = ecid.pop(site, {})
+                if "WAFER_ID" in fields and "X_COORD" in fields and "Y_COORD" in fields:
+                    die_key = f"{fields.get('LOT_ID', '')}_W{fields['WAFER_ID']}_X{fields['X_COORD']}Y{fields['Y_COORD']}"
+                elif x != INVALID_COORD and y != INVALID_COORD:
+                    die_key = f"{lot_id}_W{wafer_id}_X{x}Y{y}"
+                else:
+                    die_key = f"{name}#{part_id or part_seq}"
+                self.add(die_key, PartRef((start_t, file_seq, part_seq), name, part_seq, part_id, site, hard_bin,
+                                          soft_bin, passed))
+                part_seq += 1
+            elif key == b'\x05\n':  # Pir
+                ecid.pop(body[1] if len(body) > 1 else 0, None)
+            else:
+                rec = decoder.decode(key, body)
+                if decoder.rec_type == "Mir":
+                    start_t = rec["START_T"] or 0
+                    lot_id = (rec["LOT_ID"] or b"").decode()
+                elif decoder.rec_type == "Wir":
+                    wafer_id = (rec["WAFER_ID"] or b"").decode()
+                elif decoder.rec_type == "Dtr":
+                    text = (rec["TEXT_DAT"] or b"").decode(errors="replace")
+                    if text.startswith("ECID"):
+                        for field, site, value in RE_ECID.findall(text):
+                            ecid.setdefault(int(site), {})[field] = value
+
+    # views
+    def kept(self, keep: str = "final") -> Set[Tuple[str, int]]:
+        """ {(stdf_name, part_seq)} of the first or final test of every die; part_seq counts the file's PRRs """
+        if keep not in {"first", "final"}:
+            raise ValueError(f"keep '{keep}' is not supported")
+        return {(part.stdf_name, part.part_seq) for part in self.parts(keep)}
+
+    def parts(self, keep: str = "final") -> Iterator[PartRef]:
+        for die in self.dies.values():
+            yield getattr(die, keep)
+
+    def retested(self) -> Iterator[Tuple[str, Die]]:
+        return ((key, die) for key, die in self.dies.items() if die.count > 1)
+
+    @property
+    def die_cnt(self) -> int:
+        return len(self.dies)
+
+    def yield_(self, keep: str = "final") -> Optional[float]:
+        if not self.dies:
+            return None
+        return sum(part.passed for part in self.parts(keep)) / len(self.dies)
+
+    def to_sql(self, sql_conn):
+        """ Replace the PartDedup table; PartFirst / PartFinal then select the matching Part rows """
+        stdf_ids = sql_conn.get_stdf_ids()
+        rows = []
+        for key, die in self.dies.items():
+            first_id, final_id = stdf_ids.get(die.first.stdf_name), stdf_ids.get(die.final.stdf_name)
+            if first_id is None or final_id is None:
+                continue  # not ingested
+            rows.append((key, die.count, first_id, self._int(die.first.part_id), final_id,
+                         self._int(die.final.part_id)))
+        sql_conn.replace_part_dedup(rows)
+
+    @staticmethod
+    def _int(part_id: str) -> Optional[int]:
+        try:
+            return int(part_id)
+        except ValueError:
+            return None
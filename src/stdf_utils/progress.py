@@ -0,0 +1,147 @@
+import logging
+import os
+import struct
+import sys
+import time
+from typing import Callable, Optional
+
+# picked up by every StdfRecord created without its own `progress`, e.g. by the CLI's --progress
+default_progress: Optional["Progress"] = None
+
+
+def format_progress(info: dict) -> str:
+    eta = f", eta {info['eta_s']:.0f} s" if info["eta_s"] is not None else ""
+    fraction = f"{info['fraction']:6.1%} " if info["fraction"] is not None else ""
+    batch = f" [batch {info['batch_fraction']:.1%}, eta {info['batch_eta_s']:.0f} s]" \
+        if info.get("batch_eta_s") is not None else ""
+    return (f"{os.path.basename(info['file_path'])}: {fraction}{info['bytes'] / (1 << 20):.1f} MiB, "
+            f"{info['records_per_s']:,.0f} rec/s{eta}{batch}")
+
+
+def log_progress(info: dict):
+    logging.info(format_progress(info))
+
+
+def print_progress(info: dict):
+    """ One status line on stderr, rewritten in place """
+    sys.stderr.write(f"\r{format_progress(info):<100}" + ("\n" if info["done"] else ""))
+    sys.stderr.flush()
+
+
+class Progress:
+    """
+    Throttled progress of a StdfRecord parse: bytes consumed, records/s and ETA. The fraction done comes from
+    the compressed offset in the raw file over its size, which holds for plain, gz and bz2; for a gz, the
+    ISIZE trailer gives the uncompressed total instead, until the offset passes it (ISIZE is mod 4 GiB and
+    only covers the last member). The clock is only read every `check_every` reads, and `callback(info)`
+    (default: logging.info) is called at most every `interval` seconds, plus once at the end with
+    info["done"] True. begin_batch() / batch_file_done() add a batch fraction and ETA over many files.
+    """
+    def __init__(self, callback: Callable[[dict], None] = None, interval: float = 1.0, check_every: int = 1024):
+        self.callback = callback or log_progress
+        self.interval = interval
+        self.check_every = check_every
+        self.batch_total: int = 0  # on-disk bytes of the batch
+        self.batch_done: int = 0
+        self.batch_start: float = 0.0
+        self._reset("", 0)
+
+    def _reset(self, file_path: str, start_offset: int):
+        self.file_path = file_path
+        self.start_offset = start_offset
+        self.size: int = os.path.getsize(file_path) if file_path else 0
+        self.isize: Optional[int] = self._isize(file_path) if file_path.endswith(".gz") else None
+        self.bytes: int = start_offset  # uncompressed bytes consumed
+        self.reads: int = 0
+        self.start = self.last = time.perf_counter()
+        self._raw = None
+
+    @staticmethod
+    def _isize(file_path: str) -> Optional[int]:
+        with open(file_path, "rb") as f_in:
+            f_in.seek(0, os.SEEK_END)
+            if f_in.tell() < 18:
+                return None
+            f_in.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", f_in.read(4))[0]
+
+    # hooks for StdfRecord
+    def start_file(self, file_path: str, start_offset: int = 0):
+        self._reset(file_path, start_offset)
+
+    def watch(self, raw):
+        """ wrap_raw hook of OpenFile: keeps the raw file to read the compressed offset from """
+        self._raw = raw
+        return raw
+
+    def wrap_read(self, read):
+        check_every = self.check_every
+
+        def counted(n: int) -> bytes:
+            data = read(n)
+            self.bytes += len(data)
+            self.reads += 1
+            if self.reads % check_every == 0:
+                now = time.perf_counter()
+                if now - self.last >= self.interval:
+                    self.last = now
+                    self.callback(self.info(now))
+            return data
+        return counted
+
+    def end_file(self):
+        self.callback(self.info(time.perf_counter(), done=True))
+
+    # batch
+    def begin_batch(self, total_size: int):
+        self.batch_total, self.batch_done, self.batch_start = total_size, 0, time.perf_counter()
+
+    def batch_file_done(self, size: int):
+        """ A file of the batch is finished, parsed or not """
+        self.batch_done += size
+        self.size = 0  # not counted twice until the next file starts
+
+    def fraction(self) -> Optional[float]:
+        if self.isize and self.bytes <= self.isize:
+            return self.bytes / self.isize
+        if self.size:
+            try:
+                pos = self._raw.tell() if self._raw is not None else self.bytes
+            except (OSError, ValueError):
+                return None
+            return min(pos / self.size, 1.0)
+        return None
+
+    def info(self, now: float = None, done: bool = False) -> dict:
+        now = now or time.perf_counter()
+        elapsed = now - self.start
+        records = (self.reads + 1) // 2  # the FAR is one read, every other record a header and a body read
+        fraction = 1.0 if done else self.fraction()
+        consumed = fraction - self._start_fraction() if fraction is not None else None
+        eta = elapsed * (1 - fraction) / consumed if consumed and fraction is not None else None
+        info = {
+            "file_path": self.file_path,
+            "bytes": self.bytes,
+            "records": records,
+            "elapsed_s": elapsed,
+            "records_per_s": records / elapsed if elapsed > 0 else 0.0,
+            "bytes_per_s": (self.bytes - self.start_offset) / elapsed if elapsed > 0 else 0.0,
+            "fraction": fraction,
+            "eta_s": 0.0 if done else eta,
+            "done": done,
+        }
+        if self.batch_total:
+            batch_done = self.batch_done + (fraction or 0.0) * self.size
+            batch_fraction = min(batch_done / self.batch_total, 1.0)
+            batch_elapsed = now - self.batch_start
+            info["batch_fraction"] = batch_fraction
+            info["batch_eta_s"] = batch_elapsed * (1 - batch_fraction) / batch_fraction if batch_fraction else None
+        return info
+
+    def _start_fraction(self) -> float:
+        """ Part of the file skipped by a resumed parse """
+        if not self.start_offset:
+            return 0.0
+        if self.isize and self.start_offset <= self.isize:
+            return self.start_offset / self.isize
+        return self.start_offset / self.size if self.size and not self.file_path.endswith((".gz", ".bz2")) else 0.0
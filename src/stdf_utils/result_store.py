@@ -0,0 +1,226 @@
+import logging
+import os
+import sqlite3
+import struct
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from stdf_utils.part_index import stdf_name
+from stdf_utils.stdf_record import StdfRecord
+from stdf_utils.stdf_scan import StdfScanner, PtrUnpacker
+
+PART_DTYPE = np.dtype([("file_id", "<u4"), ("part_id", "<i8"), ("site", "<u2"), ("x", "<i2"), ("y", "<i2"),
+                       ("hard_bin", "<u2"), ("soft_bin", "<u2")])
+ROW_DTYPE = np.dtype("<u4")  # row in parts.npy
+RESULT_DTYPE = np.dtype("<f4")
+INVALID_COORD = -32768
+# PART_DTYPE fields after part_id, in order, with what a truncated PRR that leaves them out gets instead
+PRR_DEFAULTS = (("SITE_NUM", 0), ("X_COORD", INVALID_COORD), ("Y_COORD", INVALID_COORD), ("HARD_BIN", 0xFFFF),
+                ("SOFT_BIN", 0xFFFF))
+
+
+class AppendableNpy:
+    """
+    A 1-d .npy whose header is padded to fit any row count, so rows can be appended in place and only the
+    shape in the header rewritten. `count` is passed in by the owner (the catalog), not trusted from the
+    header: rows past it are leftovers of an interrupted append and get overwritten. The owner publishes
+    the shape with set_count() once its catalog has committed, so a plain np.load never shows more.
+    """
+    def __init__(self, path: str, dtype: np.dtype):
+        self.path = path
+        self.dtype = dtype
+        if os.path.exists(path):
+            with open(path, "rb") as f_in:
+                self.header_len = 10 + struct.unpack("<H", f_in.read(10)[8:10])[0]
+        else:
+            # magic + version + length + dict with the widest shape, rounded up to 64 as the format wants
+            self.header_len = (10 + len(self._dict(1 << 63)) + 1 + 63) // 64 * 64
+            with open(path, "wb") as f_out:
+                f_out.write(self._header(0))
+
+    def _dict(self, count: int) -> bytes:
+        return repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                     "shape": (count,)}).encode("latin1")
+
+    def _header(self, count: int) -> bytes:
+        header = self._dict(count)
+        pad = self.header_len - 10 - len(header) - 1
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", self.header_len - 10) + header + b" " * pad + b"\n"
+
+    def append(self, count: int, values: np.ndarray) -> int:
+        """ Write values after the first `count` rows, the header left as it is; returns the new count """
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        with open(self.path, "r+b") as f:
+            f.seek(self.header_len + count * self.dtype.itemsize)
+            f.write(values.tobytes())
+            f.truncate()
+        return count + len(values)
+
+    def set_count(self, count: int):
+        """ Rewrite the shape in the header """
+        with open(self.path, "r+b") as f:
+            f.write(self._header(count))
+
+    def read(self, count: int) -> np.ndarray:
+        """ Zero-copy view of the first `count` rows """
+        if count == 0:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.header_len, shape=(count,))
+
+
+class ResultStore:
+    """
+    Out-of-core PTR results of a lot: a directory of appendable .npy files plus an sqlite catalog.
+        parts.npy             one row per part across all files (PART_DTYPE)
+        tests/<num>.rows.npy  row in parts.npy of every result of the test
+        tests/<num>.npy       the float32 results
+        catalog.db            StoreFile / StoreTest: files with their part range, tests with name, limits
+                              and the number of rows that are committed
+    Files are appended one at a time; the catalog commit after the arrays are written is what makes them
+    visible, so an interrupted append leaves the store as it was. The .npy headers are updated after the
+    commit, so np.load of an array never goes past the catalog either (at worst it stops short of it).
+    Reads are memmap slices.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "tests"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, "catalog.db"))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS StoreFile (
+                file_id INTEGER PRIMARY KEY,
+                path VARCHAR(1024) NOT NULL UNIQUE,
+                stdf_name VARCHAR(256) NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                part_offset INTEGER NOT NULL,
+                part_cnt INTEGER NOT NULL
+            );""")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS StoreTest (
+                test_num INTEGER PRIMARY KEY,
+                test_name VARCHAR(256),
+                lo_limit REAL,
+                hi_limit REAL,
+                count INTEGER NOT NULL
+            );""")
+        self.conn.commit()
+        self._parts = AppendableNpy(os.path.join(root, "parts.npy"), PART_DTYPE)
+
+    # catalog
+    @property
+    def part_cnt(self) -> int:
+        row = self.conn.execute("SELECT MAX(part_offset + part_cnt) FROM StoreFile").fetchone()
+        return row[0] or 0
+
+    def files(self) -> List[dict]:
+        columns = ("file_id", "path", "stdf_name", "size", "mtime_ns", "part_offset", "part_cnt")
+        return [dict(zip(columns, row)) for row in
+                self.conn.execute(f"SELECT {', '.join(columns)} FROM StoreFile ORDER BY file_id")]
+
+    def tests(self) -> Dict[int, dict]:
+        columns = ("test_num", "test_name", "lo_limit", "hi_limit", "count")
+        return {row[0]: dict(zip(columns, row)) for row in
+                self.conn.execute(f"SELECT {', '.join(columns)} FROM StoreTest ORDER BY test_num")}
+
+    def _count(self, test_num: int) -> int:
+        row = self.conn.execute("SELECT count FROM StoreTest WHERE test_num = ?", (test_num,)).fetchone()
+        return row[0] if row else 0
+
+    # read
+    def parts(self) -> np.ndarray:
+        return self._parts.read(self.part_cnt)
+
+    def results(self, test_num: int) -> np.ndarray:
+        """ float32 results of one test across every file, in append order """
+        count = self._count(test_num)
+        return self._column(test_num, "", RESULT_DTYPE).read(count) if count else np.empty(0, RESULT_DTYPE)
+
+    def rows(self, test_num: int) -> np.ndarray:
+        """ parts.npy row of each value of results(test_num) """
+        count = self._count(test_num)
+        return self._column(test_num, ".rows", ROW_DTYPE).read(count) if count else np.empty(0, ROW_DTYPE)
+
+    def _column(self, test_num: int, suffix: str, dtype: np.dtype) -> AppendableNpy:
+        return AppendableNpy(os.path.join(self.root, "tests", f"{test_num}{suffix}.npy"), dtype)
+
+    # write
+    def add(self, stdf_paths: Iterable[str]) -> List[str]:
+        """ Append every file not in the store yet; returns the ones appended """
+        return [path for path in stdf_paths if self.append(path)]
+
+    def append(self, stdf_path: str) -> bool:
+        path = os.path.abspath(stdf_path)
+        st = os.stat(path)
+        row = self.conn.execute("SELECT size, mtime_ns FROM StoreFile WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            if row != (st.st_size, st.st_mtime_ns):
+                logging.warning(f"{path} changed since it was stored; the store is append only, not replaced")
+            return False
+
+        file_id = (self.conn.execute("SELECT MAX(file_id) FROM StoreFile").fetchone()[0] or 0) + 1
+        part_offset = self.part_cnt
+        parts, columns, catalog = self._read(path, file_id, part_offset)
+
+        # arrays first, then the catalog that makes them visible, then the .npy headers
+        written = [(self._parts, self._parts.append(part_offset, parts))]
+        for test_num, (rows, results) in columns.items():
+            count = self._count(test_num)
+            for npy, values in ((self._column(test_num, ".rows", ROW_DTYPE), np.frombuffer(rows, dtype=np.uint32)),
+                                (self._column(test_num, "", RESULT_DTYPE), np.frombuffer(results, dtype=np.float32))):
+                written.append((npy, npy.append(count, values)))
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO StoreFile (file_id, path, stdf_name, size, mtime_ns, part_offset, part_cnt) "
+                "Values (?, ?, ?, ?, ?, ?, ?)",
+                (file_id, path, stdf_name(path), st.st_size, st.st_mtime_ns, part_offset, len(parts)))
+            for test_num, (rows, results) in columns.items():
+                test_name, lo_limit, hi_limit = catalog[test_num]
+                self.conn.execute(
+                    "INSERT INTO StoreTest (test_num, test_name, lo_limit, hi_limit, count) Values (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (test_num) DO UPDATE SET count = count + excluded.count",
+                    (test_num, test_name, lo_limit, hi_limit, len(results)))
+        for npy, count in written:
+            npy.set_count(count)
+        return True
+
+    @staticmethod
+    def _read(path: str, file_id: int, part_offset: int) -> Tuple[np.ndarray, Dict[int, Tuple[array, array]], dict]:
+        """ One file's parts, {test_num: (rows, results)} and {test_num: (name, lo, hi)} """
+        scanner = StdfScanner(path, {"Pir", "Ptr", "Prr"})
+        decoder = StdfRecord(path)
+        unpack_ptr: Optional[PtrUnpacker] = None
+        parts: List[tuple] = []
+        columns: Dict[int, Tuple[array, array]] = defaultdict(lambda: (array("I"), array("f")))
+        catalog: Dict[int, tuple] = {}
+        open_ptr: Dict[int, List[tuple]] = defaultdict(list)  # {site: [(test_num, result)]} until PRR
+        for offset, key, body in scanner:
+            if unpack_ptr is None:
+                unpack_ptr = PtrUnpacker(scanner.ENDIAN)
+                decoder.ENDIAN = scanner.ENDIAN
+            if key == b'\x0f\n':  # Ptr
+                test_num, head_num, site, test_flg, result, test_txt, lo_limit, hi_limit = unpack_ptr(body)
+                if result is None:
+                    continue
+                if test_num not in catalog:
+                    catalog[test_num] = ((test_txt or b"").decode(errors="replace"), lo_limit, hi_limit)
+                open_ptr[site].append((test_num, result))
+            elif key == b'\x05\n':  # Pir
+                open_ptr.pop(body[1] if len(body) > 1 else 0, None)
+            else:  # Prr
+                rec = decoder.decode(key, body)
+                row = part_offset + len(parts)
+                for test_num, result in open_ptr.pop(rec["SITE_NUM"], []):
+                    rows, results = columns[test_num]
+                    rows.append(row)
+                    results.append(result)
+                part_id = (rec["PART_ID"] or b"").decode(errors="replace")
+                # a truncated PRR leaves fields out (None): defaults as in StdfWaferMap
+                parts.append((file_id, int(part_id) if part_id.isdigit() else -1, *(
+                    default if rec[field] is None else rec[field] for field, default in PRR_DEFAULTS)))
+        return np.array(parts, dtype=PART_DTYPE), columns, catalog
+
+    def close(self):
+        self.conn.close()
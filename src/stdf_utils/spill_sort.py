@@ -0,0 +1,74 @@
+import heapq
+import os
+import struct
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterator, List, Tuple
+
+
+class SpillSorter:
+    """
+    External sort for fixed-layout rows. Rows are kept in a list until `max_memory` worth of them has been
+    pushed; the list is then sorted and written to a temp file as one run. Reading merges the runs (and
+    whatever is still in memory) with heapq.merge, so memory stays at one buffer plus one block per run.
+    """
+    BLOCK_ROWS = 4096  # rows read from a run at a time
+
+    def __init__(self, fmt: str, max_memory: int, tmp_dir: str = None):
+        """ fmt: struct format of a row, without byte order, e.g. "IHQd" """
+        self.row = struct.Struct("<" + fmt)
+        # a list slot, the tuple and its boxed values
+        self.row_bytes = 8 + 56 + 40 * len(self.row.unpack(bytes(self.row.size)))
+        self.max_rows = max(max_memory // self.row_bytes, self.BLOCK_ROWS)
+        self.tmp_dir = tmp_dir
+        self.rows: List[tuple] = []
+        self.runs: List[str] = []
+        self.row_cnt: int = 0
+
+    def push(self, row: tuple):
+        self.rows.append(row)
+        self.row_cnt += 1
+        if len(self.rows) >= self.max_rows:
+            self.spill()
+
+    def spill(self):
+        if not self.rows:
+            return
+        self.rows.sort()
+        fd, path = tempfile.mkstemp(suffix=".run", prefix="stdf_", dir=self.tmp_dir)
+        self.runs.append(path)
+        pack = self.row.pack
+        with os.fdopen(fd, "wb", buffering=1 << 20) as f_out:
+            for i in range(0, len(self.rows), self.BLOCK_ROWS):
+                f_out.write(b"".join(pack(*row) for row in self.rows[i:i + self.BLOCK_ROWS]))
+        self.rows = []
+
+    def _read_run(self, path: str) -> Iterator[tuple]:
+        block = self.row.size * self.BLOCK_ROWS
+        with open(path, "rb") as f_in:
+            while chunk := f_in.read(block):
+                yield from self.row.iter_unpack(chunk)
+
+    def __iter__(self) -> Iterator[tuple]:
+        """ All rows in sorted order """
+        self.rows.sort()
+        if not self.runs:
+            return iter(self.rows)
+        return heapq.merge(self.rows, *(self._read_run(path) for path in self.runs))
+
+    def groups(self, key_len: int) -> Iterator[Tuple[tuple, Iterator[tuple]]]:
+        """ Sorted rows grouped on their first key_len fields """
+        return groupby(self, key=itemgetter(*range(key_len)) if key_len > 1 else itemgetter(0))
+
+    def close(self):
+        for path in self.runs:
+            os.unlink(path)
+        self.runs.clear()
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
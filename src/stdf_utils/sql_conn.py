@@ -1,19 +1,48 @@
 import re
+import sys
+import json
+import math
+import zlib
 import sqlite3
-from typing import Optional, Dict
+from array import array
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Iterator, Tuple
 
 from stdf_utils.part_data import PartData
 
 
 class SqlConn:
-    def __init__(self, db_path: str):
+    # built after a bulk load instead of being maintained row by row
+    SECONDARY_INDEXES: Dict[str, str] = {
+        "Part_ecid_idx": "CREATE INDEX IF NOT EXISTS Part_ecid_idx ON Part (ecid)",
+    }
+    # per-test lookups answered from the index alone, without touching the Ptr table
+    COVERING_INDEXES: Dict[str, str] = {
+        "Ptr_test_num_idx": "CREATE INDEX IF NOT EXISTS Ptr_test_num_idx ON Ptr (test_num, stdf_id, part_id, result)",
+    }
+
+    def __init__(self, db_path: str, covering_index: bool = False):
         self.conn = sqlite3.connect(db_path)
         self.cursor = self.conn.cursor()
+        self.secondary_indexes: Dict[str, str] = dict(self.SECONDARY_INDEXES)
+        # bulk load buffers
+        self._bulk: bool = False
+        self.batch_size: int = 100_000
+        self._part_rows: List[tuple] = []
+        self._ptr_rows: List[tuple] = []
         # create table
         self._create_stdf()
         self._create_part()
         self._create_ptr()
         self._create_ptr_fact()
+        self._create_ptr_blob()
+        self._create_ingest_manifest()
+        self._create_ingest_checkpoint()
+        self._create_part_dedup()
+        # once created, a covering index is kept (and deferred during bulk loads) by every later connection
+        if covering_index or self._index_exists(*self.COVERING_INDEXES):
+            self.secondary_indexes.update(self.COVERING_INDEXES)
+        self.create_secondary_indexes()
         self.conn.commit()
 
     # Stdf
@@ -32,16 +61,16 @@ class SqlConn:
     def insert_stdf(self, mir_rec: dict, stdf_name: str) -> int:
         """ Insert into table Stdf and return stdf_id """
 
-        job = mir_rec["JOB_NAM"].decode()
-        temperature = self._parse_int(mir_rec["TST_TEMP"].decode())
-        lot_id = mir_rec["LOT_ID"].decode()
+        job = (mir_rec["JOB_NAM"] or b"").decode()
+        temperature = self._parse_int((mir_rec["TST_TEMP"] or b"").decode())
+        lot_id = (mir_rec["LOT_ID"] or b"").decode()
         tag = "_".join(stdf_name.split("_")[:2])
         self.cursor.execute(
             "INSERT INTO Stdf (stdf_name, job, temperature, lot_id, tag) Values (?, ?, ?, ?, ?) "
             "ON CONFLICT (stdf_name) DO NOTHING;",
             (stdf_name, job, temperature, lot_id, tag))
         # query stdf_id
-        return self.cursor.execute(f"SELECT stdf_id from Stdf WHERE STDF_NAME = '{stdf_name}'").fetchone()[0]
+        return self.cursor.execute("SELECT stdf_id from Stdf WHERE STDF_NAME = ?", (stdf_name,)).fetchone()[0]
 
     # Part
     def _create_part(self):
@@ -60,13 +89,18 @@ class SqlConn:
             PRIMARY KEY (stdf_id, part_id)
         );""")
 
+    INSERT_PART = ("INSERT INTO Part (site, stdf_id, ecid_wafer_id, ecid_lot_id, ecid, soft_bin, hard_bin, part_id)"
+                   " Values (?, ?, ?, ?, ?, ?, ?, ?)")
+
     def insert_part(self, part_data: PartData):
-        self.cursor.execute(
-            "INSERT INTO Part (site, stdf_id, ecid_wafer_id, ecid_lot_id, ecid, soft_bin, hard_bin, part_id)"
-            " Values (?, ?, ?, ?, ?, ?, ?, ?)",
-            (part_data.site, part_data.stdf_id, part_data.ecid_wafer_id, part_data.ecid_lot_id, part_data.ecid,
-             part_data.soft_bin, part_data.hard_bin, part_data.part_id)
-        )
+        row = (part_data.site, part_data.stdf_id, part_data.ecid_wafer_id, part_data.ecid_lot_id, part_data.ecid,
+               part_data.soft_bin, part_data.hard_bin, part_data.part_id)
+        if self._bulk:
+            self._part_rows.append(row)
+            if len(self._part_rows) >= self.batch_size:
+                self.flush()
+        else:
+            self.cursor.execute(self.INSERT_PART, row)
 
     # Ptr
     def _create_ptr(self):
@@ -79,13 +113,63 @@ class SqlConn:
             PRIMARY KEY (stdf_id, part_id, test_num)
         );""")
 
+    INSERT_PTR = "INSERT INTO Ptr (stdf_id, part_id, test_num, result) Values (?, ?, ?, ?)"
+
     def insert_ptr(self, part_data: PartData):
+        rows = ((part_data.stdf_id, part_data.part_id, ptr.test_num, ptr.result)
+                for ptr in part_data.ptr_list)
+        if self._bulk:
+            self._ptr_rows.extend(rows)
+            if len(self._ptr_rows) >= self.batch_size:
+                self.flush()
+        else:
+            self.cursor.executemany(self.INSERT_PTR, rows)
+
+    # Ptr Blob: one row per (stdf_id, test_num), results and part ids packed little-endian and zlib compressed
+    def _create_ptr_blob(self):
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS PtrBlob (
+            stdf_id INTEGER NOT NULL,
+            test_num INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            part_ids BLOB NOT NULL,
+            results BLOB NOT NULL,
+            PRIMARY KEY (stdf_id, test_num)
+        );""")
+
+    def insert_ptr_blobs(self, stdf_id: int, columns: Dict[int, Tuple[array, array]]):
+        """ columns: {test_num: (part_ids array('q'), results array('f'))} """
         self.cursor.executemany(
-            "INSERT INTO Ptr (stdf_id, part_id, test_num, result) Values (?, ?, ?, ?)",
-            ((part_data.stdf_id, part_data.part_id, ptr.test_num, ptr.result)
-             for ptr in part_data.ptr_list)
+            "INSERT INTO PtrBlob (stdf_id, test_num, count, part_ids, results) Values (?, ?, ?, ?, ?)",
+            ((stdf_id, test_num, len(results), self._pack(part_ids), self._pack(results))
+             for test_num, (part_ids, results) in columns.items())
         )
 
+    def get_ptr_blobs(self, test_num: int, stdf_id: int = None) -> Iterator[Tuple[int, array, array]]:
+        """ Yield (stdf_id, part_ids array('q'), results array('f')) per stdf for one test """
+        sql = "SELECT stdf_id, part_ids, results FROM PtrBlob WHERE test_num = ?"
+        params: tuple = (test_num,)
+        if stdf_id is not None:
+            sql += " AND stdf_id = ?"
+            params += (stdf_id,)
+        for stdf_id, part_ids, results in self.conn.execute(sql, params):
+            yield stdf_id, self._unpack("q", part_ids), self._unpack("f", results)
+
+    @staticmethod
+    def _pack(values: array) -> bytes:
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        return zlib.compress(values.tobytes(), 1)
+
+    @staticmethod
+    def _unpack(typecode: str, blob: bytes) -> array:
+        values = array(typecode)
+        values.frombytes(zlib.decompress(blob))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
     # Ptr Fact
     def _create_ptr_fact(self):
         self.cursor.execute("""
@@ -99,10 +183,80 @@ class SqlConn:
         );""")
 
     def insert_ptr_fact(self, stdf_id: int, ptr_fact_dict: Dict[int, dict]):
-        self.cursor.executemany("""
-        INSERT INTO PtrFact (stdf_id, test_num, test_name, lo_lim, hi_lim)
-            Values (?, ?, ?, ?, ?)""", ((stdf_id, test_num, ptr['TEST_TXT'].decode(), ptr['LO_LIMIT'], ptr['HI_LIMIT'])
-                                        for (test_num, ptr) in ptr_fact_dict.items()))
+        """ A PTR without TEST_TXT (a later PTR of its test, resumed past the first) never replaces a fact """
+        for verb, full in (("REPLACE", True), ("IGNORE", False)):
+            self.cursor.executemany(f"""
+            INSERT OR {verb} INTO PtrFact (stdf_id, test_num, test_name, lo_lim, hi_lim)
+                Values (?, ?, ?, ?, ?)""", (
+                (stdf_id, test_num, ptr['TEST_TXT'].decode() if full else None, ptr['LO_LIMIT'], ptr['HI_LIMIT'])
+                for (test_num, ptr) in ptr_fact_dict.items() if (ptr['TEST_TXT'] is not None) == full))
+
+    # Bulk load
+    @contextmanager
+    def bulk_load(self, batch_size: int = 100_000, cache_size_kib: int = 512 * 1024, defer_indexes: bool = True):
+        """
+        Load mode for ingest: WAL journal, synchronous=OFF and a large page cache while inside the block,
+        Part/Ptr rows buffered across parts into large executemany calls, and secondary indexes dropped
+        on entry and rebuilt on exit. Callers still commit once per file; the buffers are flushed first.
+        """
+        self.conn.commit()  # pragmas below cannot change inside a transaction
+        saved = {pragma: self.cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+                 for pragma in ("journal_mode", "synchronous", "cache_size")}
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=OFF")
+        self.cursor.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+        if defer_indexes:
+            self.drop_secondary_indexes()
+
+        self._bulk, self.batch_size = True, batch_size
+        try:
+            yield self
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        finally:
+            self._bulk = False
+            if defer_indexes:
+                self.create_secondary_indexes()
+            self.conn.commit()
+            for pragma, value in saved.items():
+                self.cursor.execute(f"PRAGMA {pragma}={value}")
+
+    def flush(self):
+        """ Write buffered bulk rows; Part first so a part's results never land without it """
+        if self._part_rows:
+            self.cursor.executemany(self.INSERT_PART, self._part_rows)
+            self._part_rows.clear()
+        if self._ptr_rows:
+            self.cursor.executemany(self.INSERT_PTR, self._ptr_rows)
+            self._ptr_rows.clear()
+
+    def commit(self):
+        self.flush()
+        self.conn.commit()
+
+    def rollback(self):
+        self._part_rows.clear()
+        self._ptr_rows.clear()
+        self.conn.rollback()
+
+    def drop_secondary_indexes(self):
+        for name in self.secondary_indexes:
+            self.cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def create_secondary_indexes(self):
+        for sql in self.secondary_indexes.values():
+            self.cursor.execute(sql)
+
+    def create_covering_index(self):
+        self.secondary_indexes.update(self.COVERING_INDEXES)
+        self.create_secondary_indexes()
+        self.conn.commit()
+
+    def _index_exists(self, *names: str) -> bool:
+        return any(self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                       (name,)).fetchone() for name in names)
 
     @staticmethod
     def _parse_int(value: str) -> Optional[int]:
@@ -111,8 +265,155 @@ class SqlConn:
         except ValueError:
             return None
 
+    def delete_stdf(self, stdf_name: str):
+        """ Delete an stdf and all its rows; left uncommitted so a re-ingest can replace it atomically """
+        row = self.cursor.execute("SELECT stdf_id from Stdf WHERE STDF_NAME = ?", (stdf_name,)).fetchone()
+        if row is None:
+            return
+        for table in ("Part", "Ptr", "PtrBlob", "PtrFact", "IngestCheckpoint", "Stdf"):
+            self.cursor.execute(f"DELETE FROM {table} WHERE stdf_id = ?", row)
+
+    # Ingest Manifest: what was loaded from where, checked before a file is opened
+    def _create_ingest_manifest(self):
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS IngestManifest (
+            path VARCHAR(1024) PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            fingerprint VARCHAR(64) NOT NULL,
+            status VARCHAR(16) NOT NULL,
+            stdf_id INTEGER,
+            part_count INTEGER,
+            ptr_count INTEGER
+        );""")
+
+    def get_manifest(self) -> Dict[str, dict]:
+        columns = ("path", "size", "mtime_ns", "fingerprint", "status", "stdf_id", "part_count", "ptr_count")
+        return {row[0]: dict(zip(columns, row))
+                for row in self.cursor.execute(f"SELECT {', '.join(columns)} FROM IngestManifest")}
+
+    def upsert_manifest(self, path: str, size: int, mtime_ns: int, fingerprint: str, status: str,
+                        stdf_id: int = None, part_count: int = None, ptr_count: int = None):
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO IngestManifest "
+            "(path, size, mtime_ns, fingerprint, status, stdf_id, part_count, ptr_count) "
+            "Values (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, fingerprint, status, stdf_id, part_count, ptr_count))
+
+    # Ingest Checkpoint: where an interrupted ingest resumes; one row per stdf while it is incomplete
+    def _create_ingest_checkpoint(self):
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS IngestCheckpoint (
+            stdf_id INTEGER PRIMARY KEY,
+            offset INTEGER NOT NULL,
+            part_count INTEGER NOT NULL,
+            ptr_count INTEGER NOT NULL,
+            site_state TEXT NOT NULL
+        );""")
+
+    def save_checkpoint(self, stdf_id: int, offset: int, part_count: int, ptr_count: int, site_state: dict):
+        """ site_state: {site: PartData.to_dict()} of the parts still open at offset """
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO IngestCheckpoint (stdf_id, offset, part_count, ptr_count, site_state) "
+            "Values (?, ?, ?, ?, ?)",
+            (stdf_id, offset, part_count, ptr_count, json.dumps(site_state)))
+
+    def get_checkpoint(self, stdf_name: str) -> Optional[dict]:
+        row = self.cursor.execute(
+            "SELECT c.stdf_id, c.offset, c.part_count, c.ptr_count, c.site_state "
+            "FROM IngestCheckpoint c JOIN Stdf s ON s.stdf_id = c.stdf_id WHERE s.stdf_name = ?",
+            (stdf_name,)).fetchone()
+        if row is None:
+            return None
+        stdf_id, offset, part_count, ptr_count, site_state = row
+        return {"stdf_id": stdf_id, "offset": offset, "part_count": part_count, "ptr_count": ptr_count,
+                "site_state": {int(site): state for site, state in json.loads(site_state).items()}}
+
+    def delete_checkpoint(self, stdf_id: int):
+        self.cursor.execute("DELETE FROM IngestCheckpoint WHERE stdf_id = ?", (stdf_id,))
+
+    # Part Dedup: first and final test of every die, written by PartIndex.to_sql()
+    def _create_part_dedup(self):
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS PartDedup (
+            die VARCHAR(256) PRIMARY KEY,
+            test_count INTEGER NOT NULL,
+            first_stdf_id INTEGER NOT NULL,
+            first_part_id INTEGER,
+            final_stdf_id INTEGER NOT NULL,
+            final_part_id INTEGER
+        );""")
+        for view, which in (("PartFirst", "first"), ("PartFinal", "final")):
+            self.cursor.execute(f"""
+            CREATE VIEW IF NOT EXISTS {view} AS
+                SELECT d.die, d.test_count, p.* FROM PartDedup d
+                JOIN Part p ON p.stdf_id = d.{which}_stdf_id AND p.part_id = d.{which}_part_id;""")
+
+    def replace_part_dedup(self, rows: List[tuple]):
+        """ rows: (die, test_count, first_stdf_id, first_part_id, final_stdf_id, final_part_id) """
+        self.cursor.execute("DELETE FROM PartDedup")
+        self.cursor.executemany("INSERT INTO PartDedup Values (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def get_stdf_ids(self) -> Dict[str, int]:
+        return {stdf_name: stdf_id for stdf_id, stdf_name in self.cursor.execute("SELECT stdf_id, stdf_name FROM Stdf")}
+
     def stdf_exists(self, stdf_name: str) -> bool:
-        return self.cursor.execute(f"SELECT stdf_id from Stdf WHERE STDF_NAME = '{stdf_name}'").fetchone() is not None
+        return self.cursor.execute("SELECT stdf_id from Stdf WHERE STDF_NAME = ?", (stdf_name,)).fetchone() is not None
+
+    # Query
+    def get_by_test_num(self, test_num: int, stdf_ids: List[int] = None,
+                        batch_size: int = 10_000) -> Iterator[Tuple[int, int, float]]:
+        """ Stream (stdf_id, part_id, result) of one test from both Ptr rows and PtrBlob rows """
+        for stdf_id, part_ids, results in self._get_ptr_blobs(test_num, stdf_ids):
+            for part_id, result in zip(part_ids, results):
+                yield stdf_id, part_id, result
 
-    def get_by_test_num(self, test_num):
-        pass
+        where, params = self._where_test(test_num, stdf_ids)
+        cursor = self.conn.execute(f"SELECT stdf_id, part_id, result FROM Ptr {where} ORDER BY stdf_id, part_id",
+                                   params)
+        while rows := cursor.fetchmany(batch_size):
+            yield from rows
+
+    def get_test_stats(self, test_num: int, stdf_ids: List[int] = None) -> List[dict]:
+        """ Per stdf count/mean/sigma/min/max of one test; Ptr rows are aggregated inside SQLite """
+        stats = []
+        for stdf_id, part_ids, results in self._get_ptr_blobs(test_num, stdf_ids):
+            values = [r for r in results if not math.isnan(r)]
+            mean = math.fsum(values) / len(values) if values else None
+            stats.append(self._stats_row(stdf_id, len(values), mean, math.fsum((v - mean) ** 2 for v in values),
+                                         min(values, default=None), max(values, default=None)))
+
+        # two passes, the squares are taken around the mean: sum(x^2) - n * mean^2 cancels for a large mean
+        where, params = self._where_test(test_num, stdf_ids)
+        for row in self.conn.execute(f"""
+            SELECT p.stdf_id, COUNT(p.result), m.mean, SUM((p.result - m.mean) * (p.result - m.mean)),
+                   MIN(p.result), MAX(p.result)
+            FROM Ptr AS p
+            JOIN (SELECT stdf_id, AVG(result) AS mean FROM Ptr {where} GROUP BY stdf_id) AS m USING (stdf_id)
+            {self._where_test(test_num, stdf_ids, "p.")[0]}
+            GROUP BY p.stdf_id
+            ORDER BY p.stdf_id""", params + params):
+            stats.append(self._stats_row(*row))
+        return stats
+
+    def _get_ptr_blobs(self, test_num: int, stdf_ids: List[int] = None) -> Iterator[Tuple[int, array, array]]:
+        if stdf_ids is None:
+            yield from self.get_ptr_blobs(test_num)
+        else:
+            for stdf_id in stdf_ids:
+                yield from self.get_ptr_blobs(test_num, stdf_id)
+
+    @staticmethod
+    def _where_test(test_num: int, stdf_ids: List[int] = None, alias: str = "") -> Tuple[str, tuple]:
+        if stdf_ids is None:
+            return f"WHERE {alias}test_num = ?", (test_num,)
+        return (f"WHERE {alias}test_num = ? AND {alias}stdf_id IN ({', '.join('?' * len(stdf_ids))})",
+                (test_num, *stdf_ids))
+
+    @staticmethod
+    def _stats_row(stdf_id: int, count: int, mean: float, sq_dev: float, min_: float, max_: float) -> dict:
+        """ sq_dev: sum of the squared deviations from the mean """
+        mean = mean if count else None
+        sigma = math.sqrt(sq_dev / count) if count else None
+        return {"stdf_id": stdf_id, "count": count, "mean": mean, "sigma": sigma, "min": min_, "max": max_}
@@ -0,0 +1,166 @@
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+
+from stdf_utils.stdf_generator import StdfGenerator
+from stdf_utils.stdf_scan import StdfScanner
+from util import peak_rss
+
+# generated inputs, all with the same program mix; "large" is a few GB once decompressed
+SIZES: Dict[str, dict] = {
+    "small": {"parts": 1000, "tests": 100},
+    "medium": {"parts": 20000, "tests": 200},
+    "large": {"parts": 200000, "tests": 500},
+}
+COMPRESSIONS = ("", ".gz", ".bz2")
+GENERATOR_ARGS = {"sites": 4, "mpr_ratio": 0.05, "ftr_ratio": 0.05, "noise_rate": 0.01, "retest_rate": 0.05,
+                  "wafers": 2, "seed": 0}
+
+
+def _stdf_record(*types: str) -> Callable[[str, str], None]:
+    def bench(stdf_path: str, tmp_dir: str):
+        from stdf_utils.stdf_record import StdfRecord
+        for _ in StdfRecord(stdf_path, set(types) or None):
+            pass
+    return bench
+
+
+def _stdf_to_csv(stdf_path: str, tmp_dir: str):
+    from stdf_utils.stdf_to_csv import StdfToCsv
+    StdfToCsv(stdf_path, csv_path=os.path.join(tmp_dir, "bench.csv"))
+
+
+def _stdf_per_part(stdf_path: str, tmp_dir: str):
+    from stdf_utils.stdf_per_part import StdfPerPart
+    for _ in StdfPerPart(stdf_path):
+        pass
+
+
+def _stdf_to_sql(stdf_path: str, tmp_dir: str):
+    from stdf_utils.sql_conn import SqlConn
+    from stdf_utils.stdf_to_sql import StdfToSql
+    db_path = os.path.join(tmp_dir, "bench.db")
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+    sql_conn = SqlConn(db_path)
+    with sql_conn.bulk_load():
+        StdfToSql(stdf_path, sql_conn)
+    sql_conn.conn.close()
+
+
+def _stdf_patch(stdf_path: str, tmp_dir: str):
+    from stdf_utils.stdf_patch import StdfPatch
+    StdfPatch(stdf_path, os.path.join(tmp_dir, "bench.stdf"), patch_types={"Dtr"})
+
+
+BENCHMARKS: Dict[str, Callable[[str, str], None]] = {
+    "StdfRecord": _stdf_record(),
+    "StdfRecord:Ptr": _stdf_record("Ptr"),
+    "StdfRecord:Mpr": _stdf_record("Mpr"),
+    "StdfRecord:Ftr": _stdf_record("Ftr"),
+    "StdfRecord:Prr": _stdf_record("Prr"),
+    "StdfToCsv": _stdf_to_csv,
+    "StdfPerPart": _stdf_per_part,
+    "StdfToSql": _stdf_to_sql,
+    "StdfPatch": _stdf_patch,
+}
+
+
+def bench_input(data_dir: str, size: str, compression: str) -> str:
+    """ Generated once and reused: the generator is deterministic """
+    path = os.path.join(data_dir, f"bench_{size}.stdf{compression}")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = path + ".part" + compression
+        StdfGenerator(tmp_path, **SIZES[size], **GENERATOR_ARGS)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _measure(name: str, stdf_path: str, repeat: int, alloc: bool) -> dict:
+    """ Runs in a fresh process, so that peak RSS belongs to this benchmark alone """
+    bench = BENCHMARKS[name]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            bench(stdf_path, tmp_dir)
+            times.append(time.perf_counter() - start)
+        result = {"seconds": min(times), "peak_rss": peak_rss()}
+        if alloc:
+            # a separate, untimed run: tracing slows the allocations down
+            tracemalloc.start()
+            bench(stdf_path, tmp_dir)
+            result["alloc_peak"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+class StdfBench:
+    """
+    Throughput of the parser and the exporters over generated inputs. Every (benchmark, size, compression)
+    runs in its own process, best of `repeat`, and reports seconds, records/s and MB/s of uncompressed
+    stdf, peak RSS and, with `alloc`, the tracemalloc peak. Results are keyed "<benchmark>/<size>/<ext>".
+        StdfBench(sizes=["small"]).save("bench.json")
+        regressions = compare("baseline.json", "bench.json", threshold=0.1)
+    """
+    def __init__(self, benchmarks: List[str] = None, sizes: List[str] = None, compressions: List[str] = None,
+                 repeat: int = 3, alloc: bool = False, data_dir: str = None):
+        self.data_dir = data_dir or os.path.join(tempfile.gettempdir(), "stdf-bench")
+        self.results: Dict[str, dict] = {}
+        self.meta = {"python": sys.version.split()[0], "implementation": platform.python_implementation(),
+                     "platform": platform.platform(), "machine": platform.machine(), "cpu_cnt": os.cpu_count(),
+                     "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": repeat}
+        for name in benchmarks or BENCHMARKS:
+            if name not in BENCHMARKS:
+                raise ValueError(f"benchmark '{name}' is not supported")
+
+        ctx = multiprocessing.get_context("spawn")
+        for size in sizes or ["small", "medium"]:
+            for compression in COMPRESSIONS if compressions is None else compressions:
+                stdf_path = bench_input(self.data_dir, size, compression)
+                scanner = StdfScanner(stdf_path, {"Far"})  # walks every header, decodes nothing
+                for _ in scanner:
+                    pass
+                record_cnt, stdf_bytes = scanner.record_cnt, scanner.offset
+                for name in benchmarks or BENCHMARKS:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                        result = pool.submit(_measure, name, stdf_path, repeat, alloc).result()
+                    seconds = result["seconds"]
+                    self.results[f"{name}/{size}/{compression.lstrip('.') or 'stdf'}"] = {
+                        "records": record_cnt,
+                        "bytes": stdf_bytes,
+                        "records_per_s": record_cnt / seconds if seconds else None,
+                        "mb_per_s": stdf_bytes / (1 << 20) / seconds if seconds else None,
+                        **result,
+                    }
+
+    def save(self, json_path: str):
+        with open(json_path, "w") as f_out:
+            json.dump({"meta": self.meta, "results": self.results}, f_out, indent=2, sort_keys=True)
+
+
+def compare(baseline_path: str, current_path: str, threshold: float = 0.1) -> List[dict]:
+    """ Benchmarks in both files whose records/s dropped by more than `threshold` (0.1: 10%) """
+    with open(baseline_path) as f_in:
+        baseline = json.load(f_in)["results"]
+    with open(current_path) as f_in:
+        current = json.load(f_in)["results"]
+    regressions = []
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key]["records_per_s"], current[key]["records_per_s"]
+        if before and after is not None and after < before * (1 - threshold):
+            regressions.append({"benchmark": key, "baseline": before, "current": after,
+                                "change": after / before - 1})
+    return regressions
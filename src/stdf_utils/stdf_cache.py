@@ -0,0 +1,193 @@
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict, Counter, defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+from stdf_utils.stdf_record import StdfRecord
+
+INVALID_COORD = -32768
+# PRR fields of the part columns, with what a truncated PRR that leaves them out (None) gets instead
+PRR_COLUMNS = (("site", "SITE_NUM", 0), ("x", "X_COORD", INVALID_COORD), ("y", "Y_COORD", INVALID_COORD),
+               ("hard_bin", "HARD_BIN", 0xFFFF), ("soft_bin", "SOFT_BIN", 0xFFFF))
+
+
+def load_summary(stdf_path: str) -> dict:
+    """ MIR info plus part/bin counts, enough for a lookup without re-reading the file """
+    summary = {
+        "mir": {},
+        "wafer_ids": [],
+        "part_cnt": 0,
+        "good_cnt": 0,
+        "hard_bin": Counter(),
+        "soft_bin": Counter(),
+    }
+    for rec_type, rec in StdfRecord(stdf_path, {"Mir", "Wir", "Prr"}):
+        if rec_type == "Prr":
+            summary["part_cnt"] += 1
+            summary["hard_bin"][rec["HARD_BIN"]] += 1
+            summary["soft_bin"][rec["SOFT_BIN"]] += 1
+            # PART_FLG bit 3: part failed
+            if rec["PART_FLG"] is not None and not int(rec["PART_FLG"], 16) & 0x08:
+                summary["good_cnt"] += 1
+        elif rec_type == "Wir":
+            summary["wafer_ids"].append((rec["WAFER_ID"] or b"").decode())
+        elif rec_type == "Mir":
+            summary["mir"] = {k: v.decode() if isinstance(v, bytes) else v for k, v in rec.items() if v is not None}
+    return summary
+
+
+def load_columns(stdf_path: str) -> dict:
+    """ Per-part columns plus one float32 column per test number, aligned on the part row """
+    parts = {
+        "part_id": [],
+        "site": array("B"),
+        "x": array("h"),
+        "y": array("h"),
+        "hard_bin": array("H"),
+        "soft_bin": array("H"),
+    }
+    tests: Dict[int, array] = defaultdict(lambda: array("f"))
+    pending: Dict[int, Dict[int, float]] = defaultdict(dict)  # {site: {test_num: result}}
+    for rec_type, rec in StdfRecord(stdf_path, {"Ptr", "Prr"}):
+        if rec_type == "Ptr":
+            if rec["RESULT"] is not None:
+                pending[rec["SITE_NUM"]][rec["TEST_NUM"]] = rec["RESULT"]
+            continue
+
+        row = len(parts["part_id"])
+        parts["part_id"].append(rec["PART_ID"].decode() if rec["PART_ID"] is not None else "")
+        for column, field, default in PRR_COLUMNS:
+            parts[column].append(default if rec[field] is None else rec[field])
+        for test_num, result in pending.pop(rec["SITE_NUM"], {}).items():
+            column = tests[test_num]
+            if len(column) < row:
+                column.extend([float("nan")] * (row - len(column)))
+            column.append(result)
+
+    # pad the tail so every column has one value per part
+    n_parts = len(parts["part_id"])
+    for column in tests.values():
+        if len(column) < n_parts:
+            column.extend([float("nan")] * (n_parts - len(column)))
+    return {"parts": parts, "tests": dict(tests)}
+
+
+def _nbytes(obj: Any) -> int:
+    """ Rough deep size of a cached value """
+    if isinstance(obj, array):
+        return sys.getsizeof(obj) + obj.buffer_info()[1] * obj.itemsize
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(_nbytes(k) + _nbytes(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(_nbytes(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+class _Pending:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class StdfCache:
+    """
+    Thread-safe LRU cache of parsed files, keyed by (path, mtime, kind) and bounded by total bytes.
+    Concurrent misses on the same key share a single parse.
+    """
+    def __init__(self, max_bytes: int = 256 << 20, loaders: Dict[str, Callable[[str], Any]] = None):
+        self.max_bytes = max_bytes
+        self.loaders: Dict[str, Callable[[str], Any]] = {
+            "summary": load_summary,
+            "columns": load_columns,
+            **(loaders or {}),
+        }
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int, str], Tuple[Any, int]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, int, str], _Pending] = {}
+        self.nbytes: int = 0
+
+        # counters
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def summary(self, stdf_path: str) -> dict:
+        return self.get(stdf_path, "summary")
+
+    def columns(self, stdf_path: str) -> dict:
+        return self.get(stdf_path, "columns")
+
+    def get(self, stdf_path: str, kind: str = "summary") -> Any:
+        if kind not in self.loaders:
+            raise KeyError(f"Unknown cache kind: {kind}")
+        path = os.path.abspath(stdf_path)
+        key = (path, os.stat(path).st_mtime_ns, kind)
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                self.misses += 1
+                pending = self._pending[key] = _Pending()
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = self.loaders[kind](path)
+        except BaseException as e:
+            pending.error = e
+            raise
+        else:
+            self._put(key, pending.value)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.event.set()
+        return pending.value
+
+    def _put(self, key: Tuple[str, int, str], value: Any):
+        nbytes = _nbytes(value)
+        with self._lock:
+            # a newer mtime supersedes the cached parse of the same file
+            path, mtime, kind = key
+            for stale in [k for k in self._entries if k[0] == path and k[2] == kind and k[1] != mtime]:
+                self._evict(stale)
+
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: Tuple[str, int, str]):
+        _, nbytes = self._entries.pop(key)
+        self.nbytes -= nbytes
+        self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,257 @@
+import math
+import struct
+from collections import Counter
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from stdf_utils.stdf_record import RECORD_TABLE, StdfRecord
+from stdf_utils.stdf_scan import StdfScanner
+
+NAMES: Dict[bytes, str] = {key: r["name"] for key, r in RECORD_TABLE.items()}
+PART_TYPES = {"Pir", "Prr", "Ptr", "Mpr", "Ftr"}
+# struct format of the leading fields that identify a record outside of parts besides its type
+IDENTITY = {
+    "Tsr": "BBxI",  # HEAD_NUM, SITE_NUM, TEST_NUM
+    "Hbr": "BBH",  # HEAD_NUM, SITE_NUM, HBIN_NUM
+    "Sbr": "BBH",  # HEAD_NUM, SITE_NUM, SBIN_NUM
+    "Pcr": "BB",  # HEAD_NUM, SITE_NUM
+    "Wrr": "B",  # HEAD_NUM
+    "Wir": "B",  # HEAD_NUM
+}
+
+# (part, type, identity, occurrence); part is the label of the part (see _Side.label), None outside of parts
+RecordKey = Tuple[Optional[str], str, tuple, int]
+
+
+class FieldDiff(NamedTuple):
+    key: RecordKey
+    field: str
+    old: Any
+    new: Any
+
+
+def format_key(key: RecordKey) -> str:
+    part, rec_type, identity, occurrence = key
+    text = f"part {part} " if part is not None else ""
+    text += rec_type + "".join(f" {i}" for i in identity)
+    return text + (f" #{occurrence + 1}" if occurrence else "")
+
+
+def _close(old, new, rel_tol: float, abs_tol: float) -> bool:
+    if isinstance(old, float) or isinstance(new, float):
+        if old is None or new is None or isinstance(old, (str, list)) or isinstance(new, (str, list)):
+            return False
+        if math.isnan(old) and math.isnan(new):
+            return True
+        return math.isclose(old, new, rel_tol=rel_tol, abs_tol=abs_tol)
+    if isinstance(old, list) and isinstance(new, list):
+        return len(old) == len(new) and all(_close(a, b, rel_tol, abs_tol) for a, b in zip(old, new))
+    return old == new
+
+
+class _Side:
+    """ One file cut into global records and completed parts, from raw bodies """
+    def __init__(self, stdf_path: str):
+        self.scanner = StdfScanner(stdf_path)
+        self.records: Iterator[Tuple[int, bytes, bytes]] = iter(self.scanner)
+        self.globals: Dict[RecordKey, bytes] = {}
+        self._global_cnt: Counter = Counter()
+        self._open: Dict[Tuple[int, int], Tuple[Dict[tuple, bytes], Counter]] = {}
+        self._unpack: Dict[str, Any] = {}
+        self._labels: Counter = Counter()
+        self.record_cnt: int = 0
+        self.part_cnt: int = 0
+
+    @property
+    def endian(self) -> str:
+        return self.scanner.ENDIAN
+
+    def _identity(self, rec_type: str, body: bytes) -> tuple:
+        fmt = IDENTITY.get(rec_type)
+        if fmt is None:
+            return ()
+        unpack = self._unpack.get(rec_type)
+        if unpack is None:
+            unpack = self._unpack[rec_type] = struct.Struct(self.endian + fmt).unpack_from
+        try:
+            return unpack(body, 0)
+        except struct.error:
+            return ()  # truncated
+
+    def label(self, head_site: Tuple[int, int], records: Dict[tuple, Tuple[bytes, bytes]]) -> str:
+        """ What a part carries to be found in the other file: its PART_ID, else head / site and X / Y from the
+        PRR; with "#2", "#3", ... when a label comes again (a retest) """
+        prr = records.get(("Prr", (), 0))
+        body = prr[1] if prr is not None else b""
+        if len(body) > 17 and body[17]:
+            label = body[18:18 + body[17]].decode("latin1")
+        elif len(body) >= 13:
+            x, y = struct.unpack_from(self.endian + "hh", body, 9)
+            label = f"{head_site[0]}/{head_site[1]} x{x} y{y}"
+        else:
+            label = f"{head_site[0]}/{head_site[1]}"
+        occurrence = self._labels[label]
+        self._labels[label] += 1
+        return label + (f" #{occurrence + 1}" if occurrence else "")
+
+    def next_part(self) -> Optional[Tuple[str, Dict[tuple, Tuple[bytes, bytes]]]]:
+        """ (label, {(type, identity, occurrence): (key, body)}) of the next part to complete, global records
+        on the way are kept in self.globals; None at the end """
+        for offset, key, body in self.records:
+            self.record_cnt += 1
+            rec_type = NAMES[key]
+            if rec_type in PART_TYPES and len(body) >= 6 or rec_type in ("Pir", "Prr") and len(body) >= 2:
+                if rec_type in ("Pir", "Prr"):
+                    head_site = (body[0], body[1])
+                    identity = ()
+                else:
+                    head_site = (body[4], body[5])
+                    identity = (struct.unpack_from(self.endian + "I", body, 0)[0],)
+                if rec_type == "Pir":
+                    self._open[head_site] = ({}, Counter())
+                part = self._open.get(head_site)
+                if part is not None:
+                    records, counts = part
+                    occurrence = counts[rec_type, identity]
+                    counts[rec_type, identity] += 1
+                    records[rec_type, identity, occurrence] = (key, body)
+                    if rec_type == "Prr":
+                        del self._open[head_site]
+                        self.part_cnt += 1
+                        return self.label(head_site, records), records
+                    continue
+            identity = self._identity(rec_type, body)
+            occurrence = self._global_cnt[rec_type, identity]
+            self._global_cnt[rec_type, identity] += 1
+            self.globals[None, rec_type, identity, occurrence] = (key, body)
+        if self._open:
+            # parts without a PRR at the end of the file
+            self.part_cnt += 1
+            head_site, (records, counts) = self._open.popitem()
+            return self.label(head_site, records), records
+        return None
+
+
+class StdfDiff:
+    """
+    Record-level comparison of a new stdf against a golden one, at about the cost of two header scans.
+    Parts are matched by what they carry (PART_ID, else head / site and X / Y, see _Side.label), records
+    within a part by (type, TEST_NUM, occurrence), and records outside of parts by type plus their head /
+    site / bin or test number. Raw bodies are compared first and only those that differ are decoded;
+    numbers then compare with `rel_tol` / `abs_tol` and fields in `ignore` ("Mir.START_T" or "START_T")
+    are left out. The open parts of either file and the parts not found in the other one yet are held in
+    memory; the files are read in step, so that is a few parts when they test in the same order.
+        stdf_diff = StdfDiff("golden.stdf", "new.stdf", rel_tol=1e-6, ignore={"Mir.START_T"})
+        for d in stdf_diff.diffs:
+            print(format_key(d.key), d.field, d.old, d.new)
+    """
+    def __init__(self, old_path: str, new_path: str, rel_tol: float = 1e-9, abs_tol: float = 0.0,
+                 ignore: Set[str] = None, types: Set[str] = None, max_diffs: int = 1000):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.ignore: Set[str] = set(ignore or ())
+        self.types: Optional[Set[str]] = set(types) if types else None
+        self.max_diffs = max_diffs
+        self.diffs: List[FieldDiff] = []  # the first max_diffs
+        self.diff_cnt: int = 0  # fields
+        self.changed: List[RecordKey] = []  # records with a field diff, the first max_diffs
+        self.changed_cnt: int = 0
+        self.removed: List[RecordKey] = []  # only in the old file, the first max_diffs
+        self.removed_cnt: int = 0
+        self.added: List[RecordKey] = []  # only in the new file, the first max_diffs
+        self.added_cnt: int = 0
+        self.same_cnt: int = 0
+        self.decoded_cnt: int = 0  # pairs whose raw bodies differ
+
+        old, new = _Side(old_path), _Side(new_path)
+        self._decoders = (StdfRecord(old_path), StdfRecord(new_path))
+        # {label: records} of the parts of the old / new file not found in the other one yet
+        unmatched: Tuple[Dict[str, dict], Dict[str, dict]] = ({}, {})
+        parts = [old.next_part(), new.next_part()]
+        while parts[0] is not None or parts[1] is not None:
+            for i, side in enumerate((old, new)):
+                if parts[i] is None:
+                    continue
+                label, records = parts[i]
+                other = unmatched[1 - i].pop(label, None)
+                if other is None:
+                    unmatched[i][label] = records
+                else:
+                    pair = (records, other) if i == 0 else (other, records)
+                    self._compare(label, *pair, old.endian, new.endian)
+                parts[i] = side.next_part()
+        for label, records in unmatched[0].items():
+            self._compare(label, records, {}, old.endian, new.endian)
+        for label, records in unmatched[1].items():
+            self._compare(label, {}, records, old.endian, new.endian)
+        self._compare(None, old.globals, new.globals, old.endian, new.endian)
+        self.old_record_cnt, self.new_record_cnt = old.record_cnt, new.record_cnt
+        self.old_part_cnt, self.new_part_cnt = old.part_cnt, new.part_cnt
+
+    @property
+    def identical(self) -> bool:
+        return not (self.changed_cnt or self.removed_cnt or self.added_cnt)
+
+    def _compare(self, part: Optional[str], old: dict, new: dict, old_endian: str, new_endian: str):
+        types = self.types
+        for key, (rec_key, body) in old.items():
+            full_key = key if part is None else (part, *key)
+            if types is not None and full_key[1] not in types:
+                continue
+            other = new.get(key)
+            if other is None:
+                self.removed_cnt += 1
+                if len(self.removed) < self.max_diffs:
+                    self.removed.append(full_key)
+            elif other[1] == body and old_endian == new_endian:
+                self.same_cnt += 1
+            else:
+                self._compare_fields(full_key, rec_key, body, other[1], old_endian, new_endian)
+        for key in new:  # in file order, for a stable report
+            if key in old:
+                continue
+            full_key = key if part is None else (part, *key)
+            if types is not None and full_key[1] not in types:
+                continue
+            self.added_cnt += 1
+            if len(self.added) < self.max_diffs:
+                self.added.append(full_key)
+
+    def _compare_fields(self, full_key: RecordKey, rec_key: bytes, old_body: bytes, new_body: bytes,
+                        old_endian: str, new_endian: str):
+        self.decoded_cnt += 1
+        old_decoder, new_decoder = self._decoders
+        old_decoder.ENDIAN, new_decoder.ENDIAN = old_endian, new_endian
+        old_rec, new_rec = old_decoder.decode(rec_key, old_body), new_decoder.decode(rec_key, new_body)
+        rec_type = full_key[1]
+        diffs = [FieldDiff(full_key, field, old_rec[field], new_rec[field]) for field, fmt in
+                 RECORD_TABLE[rec_key]["fields"]
+                 if field not in self.ignore and f"{rec_type}.{field}" not in self.ignore
+                 and not _close(old_rec[field], new_rec[field], self.rel_tol, self.abs_tol)]
+        if not diffs:
+            self.same_cnt += 1
+            return
+        self.changed_cnt += 1
+        if len(self.changed) < self.max_diffs:
+            self.changed.append(full_key)
+        self.diff_cnt += len(diffs)
+        self.diffs += diffs[:self.max_diffs - len(self.diffs)]
+
+    def report(self, limit: int = None) -> Iterator[str]:
+        """ Human-readable lines: removed, added and changed records, then a summary """
+        limit = self.max_diffs if limit is None else limit
+        for key in self.removed[:limit]:
+            yield f"- {format_key(key)}"
+        for key in self.added[:limit]:
+            yield f"+ {format_key(key)}"
+        for d in self.diffs[:limit]:
+            yield f"~ {format_key(d.key)} {d.field}: {_show(d.old)} -> {_show(d.new)}"
+        yield (f"{self.same_cnt} same, {self.changed_cnt} changed ({self.diff_cnt} fields), {self.removed_cnt} "
+               f"removed, {self.added_cnt} added; parts {self.old_part_cnt} -> {self.new_part_cnt}")
+
+
+def _show(value: Union[Any, list]) -> str:
+    if isinstance(value, list) and len(value) > 8:
+        return f"[{', '.join(map(str, value[:8]))}, ... {len(value)} items]"
+    return str(value)
@@ -0,0 +1,233 @@
+import math
+import struct
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+
+from stdf_utils.stdf_writer import StdfWriter
+
+PTR, MPR, FTR = 0, 1, 2
+START_T = 1600000000
+
+
+class StdfGenerator:
+    """
+    Deterministic synthetic STDF for scale tests and benchmarks: the same arguments and seed give the same
+    bytes. A random test program (PTR / MPR / FTR mix) is run over `parts` dies on `wafers` wafers (0: no
+    wafer records, package test), `sites` dies per touchdown with results interleaved by site, then
+    `retest_rate` of every wafer's dies tested again at the same coordinates. `fail_rate` of the parts get
+    one PTR pushed past its high limit and a fail bin; `noise_rate` of the parts get a DTR and a GDR.
+    With `truncate_ptr`, only the first touchdown writes full PTR / MPR / FTR records and later ones leave
+    the optional fields out, as testers do. Touchdowns are built as numpy record blocks and streamed
+    through StdfWriter, so memory does not grow with the output; a path ending with .gz or .bz2 is
+    compressed at `compresslevel`.
+    """
+    def __init__(self, out_path: str, parts: int = 1000, sites: int = 4, tests: int = 100, mpr_ratio: float = 0.0,
+                 ftr_ratio: float = 0.0, mpr_pins: int = 4, truncate_ptr: bool = True, noise_rate: float = 0.0,
+                 fail_rate: float = 0.05, retest_rate: float = 0.0, wafers: int = 1, endian: str = "<",
+                 seed: int = 0, compresslevel: int = 1):
+        self.out_path = out_path
+        self.parts = parts
+        self.sites = max(sites, 1)
+        self.mpr_pins = mpr_pins
+        self.truncate_ptr = truncate_ptr
+        self.noise_rate = noise_rate
+        self.fail_rate = fail_rate
+        self.retest_rate = retest_rate
+        self.wafers = wafers
+        self.endian = endian
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.part_cnt: int = 0  # PRRs written, retests included
+        self.retest_cnt: int = 0
+        self.good_cnt: int = 0
+        self.record_cnt: int = 0
+
+        self._program(tests, mpr_ratio, ftr_ratio)
+        self._pack_pir = struct.Struct(f"{endian}H2sBB").pack
+        self._pack_prr = struct.Struct(f"{endian}H2sBBBHHHhhIB").pack
+        self._pack_mpr = struct.Struct(f"{endian}H2sIBBBBHH").pack
+        self._pack_ftr = struct.Struct(f"{endian}H2sIBBB").pack
+        self._full = True  # full records in the first touchdown
+        self.hard_bins: Counter = Counter()
+        self.soft_bins: Counter = Counter()
+        with StdfWriter(out_path, endian=endian, compresslevel=compresslevel) as self.writer:
+            self._write()
+        self.record_cnt = self.writer.record_cnt
+
+    def _program(self, tests: int, mpr_ratio: float, ftr_ratio: float):
+        """ Test kinds in program order, PTR limits and the runs of consecutive PTRs """
+        rng = self.rng
+        self.kinds = rng.choice(3, size=tests, p=(1 - mpr_ratio - ftr_ratio, mpr_ratio, ftr_ratio))
+        self.test_nums = 1000 + np.arange(tests, dtype=np.uint32)
+        ptr_tests = self.test_nums[self.kinds == PTR]
+        n_ptr = len(ptr_tests)
+        self.means = rng.uniform(-1.0, 1.0, n_ptr).astype(np.float32)
+        self.sigmas = rng.uniform(0.01, 0.1, n_ptr).astype(np.float32)
+        self.lo = self.means - 6 * self.sigmas
+        self.hi = self.means + 6 * self.sigmas
+        self.exec_cnt = np.zeros(tests, dtype=np.int64)
+        self.fail_cnt = np.zeros(n_ptr, dtype=np.int64)
+
+        # [(PTR, first, last + 1) in the ptr arrays | (MPR or FTR, test index)]
+        self.items: List[Tuple[int, int, int]] = []
+        i_ptr = 0
+        for i, kind in enumerate(self.kinds):
+            if kind == PTR:
+                if self.items and self.items[-1][0] == PTR:
+                    self.items[-1] = (PTR, self.items[-1][1], i_ptr + 1)
+                else:
+                    self.items.append((PTR, i_ptr, i_ptr + 1))
+                i_ptr += 1
+            else:
+                self.items.append((int(kind), i, 0))
+
+        # truncated PTRs of one touchdown, one row per test and one column per site
+        e = self.endian
+        self.ptr_dtype = np.dtype([("rec_len", f"{e}u2"), ("key", "S2"), ("test_num", f"{e}u4"), ("head", "u1"),
+                                   ("site", "u1"), ("test_flg", "u1"), ("parm_flg", "u1"), ("result", f"{e}f4")])
+        self.ptr_block = np.zeros((n_ptr, self.sites), dtype=self.ptr_dtype)
+        self.ptr_block["rec_len"] = 12
+        self.ptr_block["key"] = b'\x0f\n'
+        self.ptr_block["test_num"] = ptr_tests[:, None]
+        self.ptr_block["head"] = 1
+        self.ptr_block["site"] = np.arange(self.sites)[None, :]
+
+    # records
+    def _write(self):
+        writer = self.writer
+        writer.write("Far", {"CPU_TYPE": 1 if self.endian == ">" else 2, "STDF_VER": 4})
+        writer.write("Mir", {"SETUP_T": START_T, "START_T": START_T, "STAT_NUM": 1, "MODE_COD": "P",
+                             "RTST_COD": " ", "PROT_COD": " ", "BURN_TIM": 65535, "CMOD_COD": " ",
+                             "LOT_ID": f"SYN{self.seed}", "PART_TYP": "SYNTH", "NODE_NAM": "generator",
+                             "TSTR_TYP": "synthetic", "JOB_NAM": "synth_program", "JOB_REV": "1"})
+        part_id = 0
+        for wafer in range(max(self.wafers, 1)):
+            n = self.parts // max(self.wafers, 1) + (wafer < self.parts % max(self.wafers, 1))
+            width = max(int(math.ceil(math.sqrt(n))), 1)
+            dies = [(i % width, i // width) if self.wafers else (-32768, -32768) for i in range(n)]
+            if self.wafers:
+                writer.write("Wir", {"HEAD_NUM": 1, "SITE_GRP": 255, "START_T": START_T,
+                                     "WAFER_ID": f"W{wafer + 1:02}"})
+            part_cnt, good_cnt = self.part_cnt, self.good_cnt
+            for start in range(0, n, self.sites):
+                part_id = self._touchdown(dies[start:start + self.sites], part_id, retest=False)
+            retests = sorted(self.rng.choice(n, size=int(round(n * self.retest_rate)), replace=False).tolist())
+            for start in range(0, len(retests), self.sites):
+                part_id = self._touchdown([dies[i] for i in retests[start:start + self.sites]], part_id, retest=True)
+            if self.wafers:
+                writer.write("Wrr", {"HEAD_NUM": 1, "SITE_GRP": 255, "FINISH_T": START_T + 3600,
+                                     "PART_CNT": self.part_cnt - part_cnt, "RTST_CNT": len(retests),
+                                     "ABRT_CNT": 0, "GOOD_CNT": self.good_cnt - good_cnt,
+                                     "FUNC_CNT": 4294967295, "WAFER_ID": f"W{wafer + 1:02}"})
+        self._summary()
+
+    def _touchdown(self, dies: List[Tuple[int, int]], part_id: int, retest: bool) -> int:
+        writer, rng = self.writer, self.rng
+        n_sites = len(dies)
+        for site in range(n_sites):
+            writer.write_records(self._pack_pir(2, b'\x05\n', 1, site), 1)
+
+        # PTR results, with one test per failing part pushed past its high limit
+        values = self.means[:, None] + self.sigmas[:, None] * rng.standard_normal((len(self.means), n_sites),
+                                                                                   dtype=np.float32)
+        if len(self.means):
+            for site in np.flatnonzero(rng.random(n_sites) < self.fail_rate):
+                t = rng.integers(len(self.means))
+                values[t, site] = self.hi[t] + self.sigmas[t]
+        failed = (values < self.lo[:, None]) | (values > self.hi[:, None])
+        self.fail_cnt += failed.sum(axis=1)
+        self.exec_cnt += n_sites
+        block = self.ptr_block[:, :n_sites]
+        block["result"] = values
+        block["test_flg"] = failed * 0x80
+
+        for kind, a, b in self.items:
+            if kind == PTR:
+                if self._full:
+                    for t in range(a, b):
+                        for site in range(n_sites):
+                            self._write_ptr(t, block[t, site])
+                else:
+                    writer.write_records(block[a:b].tobytes(), (b - a) * n_sites)
+            elif kind == MPR:
+                for site in range(n_sites):
+                    self._write_mpr(int(self.test_nums[a]), site)
+            else:
+                for site in range(n_sites):
+                    if self._full:
+                        writer.write("Ftr", {"TEST_NUM": int(self.test_nums[a]), "HEAD_NUM": 1, "SITE_NUM": site,
+                                             "TEST_FLG": 0, "OPT_FLAG": 0xFF, "VECT_NAM": f"pat_{self.test_nums[a]}",
+                                             "TEST_TXT": f"func_{self.test_nums[a]}"})
+                    else:
+                        writer.write_records(self._pack_ftr(7, b'\x0f\x14', int(self.test_nums[a]), 1, site, 0), 1)
+
+        for site in range(n_sites):
+            if rng.random() < self.noise_rate:
+                writer.write("Dtr", {"TEXT_DAT": f"COND: site={site} part={part_id + site + 1} VDD=1.80"})
+                writer.write("Gdr", {"FLD_CNT": 2, "GEN_DATA": [(3, part_id + site + 1), (7, 1.8)]})
+
+        for site, (x, y) in enumerate(dies):
+            part_id += 1
+            fails = np.flatnonzero(failed[:, site])
+            if len(fails):
+                hard_bin, soft_bin = 2 + int(fails[0]) % 3, 200 + int(fails[0]) % 10
+            else:
+                hard_bin, soft_bin = 1, 1
+                self.good_cnt += 1
+            self.hard_bins[hard_bin] += 1
+            self.soft_bins[soft_bin] += 1
+            part_flg = (0x08 if len(fails) else 0) | (0x02 if retest and self.wafers else 0)
+            text = str(part_id).encode()
+            writer.write_records(self._pack_prr(18 + len(text), b'\x05\x14', 1, site, part_flg, len(self.kinds),
+                                                hard_bin, soft_bin, x, y, 100, len(text)) + text, 1)
+        self.part_cnt += n_sites
+        self.retest_cnt += n_sites if retest else 0
+        self._full = not self.truncate_ptr
+        return part_id
+
+    def _write_ptr(self, t: int, row):
+        """ Full PTR of row t of the ptr arrays """
+        test_num = int(row["test_num"])
+        self.writer.write("Ptr", {
+            "TEST_NUM": test_num, "HEAD_NUM": 1, "SITE_NUM": int(row["site"]),
+            "TEST_FLG": int(row["test_flg"]), "PARM_FLG": 0, "RESULT": float(row["result"]),
+            "TEST_TXT": f"test_{test_num}", "ALARM_ID": "", "OPT_FLAG": 0x0E, "RES_SCAL": 0, "LLM_SCAL": 0,
+            "HLM_SCAL": 0, "LO_LIMIT": float(self.lo[t]), "HI_LIMIT": float(self.hi[t]), "UNITS": "V",
+            "C_RESFMT": "%9.4f", "C_LLMFMT": "%9.4f", "C_HLMFMT": "%9.4f", "LO_SPEC": 0.0, "HI_SPEC": 0.0})
+
+    def _write_mpr(self, test_num: int, site: int):
+        pins = self.mpr_pins
+        results = self.rng.normal(0.5, 0.05, pins).astype(f"{self.endian}f4")
+        if self._full:
+            self.writer.write("Mpr", {
+                "TEST_NUM": test_num, "HEAD_NUM": 1, "SITE_NUM": site, "TEST_FLG": 0, "PARM_FLG": 0,
+                "RTN_ICNT": pins, "RSLT_CNT": pins, "RTN_STAT": [0] * pins, "RTN_RSLT": results.tolist(),
+                "TEST_TXT": f"mpr_{test_num}", "ALARM_ID": "", "OPT_FLAG": 0x0E, "RES_SCAL": 0, "LLM_SCAL": 0,
+                "HLM_SCAL": 0, "LO_LIMIT": 0.0, "HI_LIMIT": 1.0, "START_IN": 0.0, "INCR_IN": 0.0,
+                "RTN_INDX": list(range(1, pins + 1)), "UNITS": "V"})
+            return
+        nibbles = bytes((pins + 1) // 2)
+        body_len = 12 + len(nibbles) + 4 * pins
+        self.writer.write_records(self._pack_mpr(body_len, b'\x0f\x0f', test_num, 1, site, 0, 0, pins, pins) +
+                                  nibbles + results.tobytes(), 1)
+
+    def _summary(self):
+        writer = self.writer
+        ptr_tests = self.test_nums[self.kinds == PTR]
+        fail_cnt = dict(zip(ptr_tests.tolist(), self.fail_cnt.tolist()))
+        for i, test_num in enumerate(self.test_nums.tolist()):
+            typ = "PMF"[self.kinds[i]]
+            writer.write("Tsr", {"HEAD_NUM": 255, "SITE_NUM": 255, "TEST_TYP": typ, "TEST_NUM": test_num,
+                                 "EXEC_CNT": int(self.exec_cnt[i]), "FAIL_CNT": fail_cnt.get(test_num, 0),
+                                 "ALRM_CNT": 0, "TEST_NAM": f"test_{test_num}"})
+        for hard_bin, cnt in sorted(self.hard_bins.items()):
+            writer.write("Hbr", {"HEAD_NUM": 255, "SITE_NUM": 255, "HBIN_NUM": hard_bin, "HBIN_CNT": cnt,
+                                 "HBIN_PF": "P" if hard_bin == 1 else "F", "HBIN_NAM": f"HBIN{hard_bin}"})
+        for soft_bin, cnt in sorted(self.soft_bins.items()):
+            writer.write("Sbr", {"HEAD_NUM": 255, "SITE_NUM": 255, "SBIN_NUM": soft_bin, "SBIN_CNT": cnt,
+                                 "SBIN_PF": "P" if soft_bin == 1 else "F", "SBIN_NAM": f"SBIN{soft_bin}"})
+        writer.write("Pcr", {"HEAD_NUM": 255, "SITE_NUM": 255, "PART_CNT": self.part_cnt, "RTST_CNT": self.retest_cnt,
+                             "ABRT_CNT": 0, "GOOD_CNT": self.good_cnt, "FUNC_CNT": 4294967295})
+        writer.write("Mrr", {"FINISH_T": START_T + 3600 * max(self.wafers, 1), "DISP_COD": " "})
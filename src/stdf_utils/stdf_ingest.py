@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import re
+from typing import List, Optional, Tuple
+from stdf_utils import progress as progress_
+from stdf_utils.progress import Progress
+from stdf_utils.sql_conn import SqlConn
+from stdf_utils.stdf_to_sql import StdfToSql
+
+RE_STDF = re.compile(r"\.stdf?(\.gz|\.bz2)?$", flags=re.I)
+
+
+def fingerprint(file_path: str, size: int, block: int = 64 << 10) -> str:
+    """ Cheap content fingerprint: size plus the first and last 64 KB (the gzip trailer carries CRC32/ISIZE) """
+    h = hashlib.sha1(str(size).encode())
+    with open(file_path, "rb") as f_in:
+        h.update(f_in.read(block))
+        if size > block:
+            f_in.seek(max(size - block, block))
+            h.update(f_in.read(block))
+    return h.hexdigest()
+
+
+class StdfIngest:
+    """
+    Incremental ingest of a directory tree into one db. The IngestManifest table is checked before any
+    file is opened: unchanged files (same size and mtime) are skipped on a stat() alone, touched files
+    whose fingerprint still matches only get their mtime refreshed, and changed files are re-ingested
+    with their old rows replaced in the same transaction.
+    """
+    def __init__(self, root: str, db_path: str = None, storage: str = "row", dry_run: bool = False,
+                 checkpoint_every: int = 0, max_memory: int = None, tmp_dir: str = None, progress: Progress = None):
+        """
+        max_memory, tmp_dir: spilling of blob storage, see StdfToSql
+        progress: per file and batch progress; default: progress.default_progress, if set
+        """
+        self.root = root
+        self.db_path = db_path or os.path.join(root, "local.db")
+        self.storage = storage
+        self.checkpoint_every = checkpoint_every
+        self.max_memory = max_memory
+        self.tmp_dir = tmp_dir
+        self.dry_run = dry_run
+        self.progress: Optional[Progress] = progress if progress is not None else progress_.default_progress
+        self.sql_conn = SqlConn(self.db_path)
+        self.manifest = self.sql_conn.get_manifest()
+
+        # result
+        self.pending: List[Tuple[str, str]] = []  # [(reason, path)]
+        self.ingested: List[str] = []
+        self.failed: List[str] = []
+
+        self.pending = self.find_pending()
+        if not dry_run:
+            self.ingest()
+
+    def find_pending(self) -> List[Tuple[str, str]]:
+        """ stat() only: files that are new, or whose size/mtime differ from the manifest """
+        pending = []
+        for cur_dir, dirs, file_names in os.walk(self.root):
+            dirs.sort()
+            for file_name in sorted(file_names):
+                if not RE_STDF.search(file_name):
+                    continue
+                path = os.path.abspath(os.path.join(cur_dir, file_name))
+                st = os.stat(path)
+                row = self.manifest.get(path)
+                if row is None:
+                    pending.append(("new", path))
+                elif row["status"] == "failed":
+                    pending.append(("failed", path))
+                elif row["size"] != st.st_size or row["mtime_ns"] != st.st_mtime_ns:
+                    pending.append(("changed", path))
+        return pending
+
+    def ingest(self):
+        if self.progress is not None:
+            self.progress.begin_batch(sum(os.path.getsize(path) for _, path in self.pending))
+        with self.sql_conn.bulk_load():
+            for reason, path in self.pending:
+                try:
+                    self._ingest_file(reason, path)
+                finally:
+                    if self.progress is not None:
+                        self.progress.batch_file_done(os.path.getsize(path))
+
+    def _ingest_file(self, reason: str, path: str):
+        st = os.stat(path)
+        digest = fingerprint(path, st.st_size)
+        row = self.manifest.get(path)
+        if row is not None and reason == "changed" and row["fingerprint"] == digest:
+            # touched but identical
+            self.sql_conn.upsert_manifest(path, st.st_size, st.st_mtime_ns, digest, row["status"],
+                                          row["stdf_id"], row["part_count"], row["ptr_count"])
+            self.sql_conn.commit()
+            return
+
+        try:
+            # only rows this path loaded itself: an "exists" row points at another file's stdf
+            replace = row is not None and row["status"] == "done"
+            stdf_to_sql = StdfToSql(path, sql_conn=self.sql_conn, storage=self.storage, replace=replace,
+                                    checkpoint_every=self.checkpoint_every, max_memory=self.max_memory,
+                                    tmp_dir=self.tmp_dir, progress=self.progress)
+        except Exception as e:
+            logging.error(f"{path}: {e}")
+            self.sql_conn.upsert_manifest(path, st.st_size, st.st_mtime_ns, digest, "failed")
+            self.sql_conn.commit()
+            self.failed.append(path)
+            return
+
+        if stdf_to_sql.completed:
+            status = "done"
+        elif stdf_to_sql.skipped:
+            status = "exists"  # same stdf name already loaded from elsewhere
+        else:
+            status = "failed"  # no MRR: truncated log
+            self.sql_conn.rollback()
+        self.sql_conn.upsert_manifest(path, st.st_size, st.st_mtime_ns, digest, status, stdf_to_sql.stdf_id,
+                                      stdf_to_sql.part_count, stdf_to_sql.ptr_count)
+        self.sql_conn.commit()
+        if status == "done":
+            self.ingested.append(path)
+        elif status == "failed":
+            self.failed.append(path)
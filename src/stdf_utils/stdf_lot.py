@@ -0,0 +1,246 @@
+import csv
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from stdf_utils.stdf_record import StdfRecord
+from stdf_utils.stdf_scan import StdfScanner, PtrUnpacker
+
+CACHE_VERSION = 3  # bumped whenever a cached partial would come out different
+
+
+class TestStats:
+    """
+    Mergeable per-test partial: count, mean and sum of squared deviations (m2, updated as Welford and
+    merged as Chan et al., so a large mean keeps the sigma), min/max, fails and a sparse fixed-width
+    histogram. NaN and infinite results are counted in `nonfinite` and fails only.
+    """
+    HIST_BINS = 20  # buckets between the limits; values outside land in buckets < 0 or >= HIST_BINS
+
+    __slots__ = ("count", "nonfinite", "mean", "m2", "min", "max", "fails", "lo_lim", "hi_lim", "hist")
+
+    def __init__(self, lo_lim: float = None, hi_lim: float = None):
+        self.count: int = 0
+        self.nonfinite: int = 0
+        self.mean: Optional[float] = None
+        self.m2: float = 0.0
+        self.min: float = math.inf
+        self.max: float = -math.inf
+        self.fails: int = 0
+        self.lo_lim = lo_lim
+        self.hi_lim = hi_lim
+        # {bucket: count}; None once partials with different limits were merged
+        self.hist: Optional[Dict[int, int]] = {} if self._width is not None else None
+
+    @property
+    def _width(self) -> Optional[float]:
+        if self.lo_lim is None or self.hi_lim is None or not self.hi_lim > self.lo_lim:
+            return None
+        return (self.hi_lim - self.lo_lim) / self.HIST_BINS
+
+    def push(self, value: float, failed: bool):
+        if failed:
+            self.fails += 1
+        if not math.isfinite(value):
+            self.nonfinite += 1
+            return
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if self.hist is not None:
+            bucket = math.floor((value - self.lo_lim) / self._width)
+            self.hist[bucket] = self.hist.get(bucket, 0) + 1
+
+    def merge(self, other: "TestStats") -> "TestStats":
+        count, mean, m2 = other.count, other.mean, other.m2  # other may be self
+        if count and self.count:
+            total = self.count + count
+            delta = mean - self.mean
+            self.m2 += m2 + delta * delta * self.count * count / total
+            self.mean += delta * count / total
+        elif count:
+            self.mean, self.m2 = mean, m2
+        self.count += count
+        self.nonfinite += other.nonfinite
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.fails += other.fails
+        if self.hist is None or other.hist is None or (self.lo_lim, self.hi_lim) != (other.lo_lim, other.hi_lim):
+            self.hist = None
+        else:
+            for bucket, count in other.hist.items():
+                self.hist[bucket] = self.hist.get(bucket, 0) + count
+        return self
+
+    @property
+    def sigma(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return math.sqrt(self.m2 / self.count)
+
+    def to_dict(self) -> dict:
+        d = {k: getattr(self, k) for k in self.__slots__ if k != "hist"}
+        d["min"], d["max"] = (self.min, self.max) if self.count else (None, None)
+        d["hist"] = None if self.hist is None else {str(k): v for k, v in self.hist.items()}
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "TestStats":
+        stats = cls(d["lo_lim"], d["hi_lim"])
+        for k in ("count", "nonfinite", "mean", "m2", "fails"):
+            setattr(stats, k, d[k])
+        stats.min = d["min"] if d["min"] is not None else math.inf
+        stats.max = d["max"] if d["max"] is not None else -math.inf
+        stats.hist = None if d["hist"] is None else {int(k): v for k, v in d["hist"].items()}
+        return stats
+
+
+class LotAggregate:
+    """ {(tester, site, test_num): TestStats} plus test names; merging two aggregates is associative """
+    def __init__(self):
+        self.files: List[str] = []
+        self.part_cnt: int = 0
+        self.names: Dict[int, str] = {}
+        self.stats: Dict[Tuple[str, int, int], TestStats] = {}
+
+    def merge(self, other: "LotAggregate") -> "LotAggregate":
+        self.files += other.files
+        self.part_cnt += other.part_cnt
+        for test_num, name in other.names.items():
+            self.names.setdefault(test_num, name)
+        for key, stats in other.stats.items():
+            if key in self.stats:
+                self.stats[key].merge(stats)
+            else:
+                self.stats[key] = TestStats.from_dict(stats.to_dict())
+        return self
+
+    def rollup(self, by_tester: bool = False, by_site: bool = False) -> Dict[Tuple[str, int, int], TestStats]:
+        """ Re-key on (tester or "*", site or -1, test_num) """
+        rolled: Dict[Tuple[str, int, int], TestStats] = {}
+        for (tester, site, test_num), stats in self.stats.items():
+            key = (tester if by_tester else "*", site if by_site else -1, test_num)
+            if key in rolled:
+                rolled[key].merge(stats)
+            else:
+                rolled[key] = TestStats.from_dict(stats.to_dict())
+        return rolled
+
+    def to_dict(self) -> dict:
+        return {
+            "files": self.files,
+            "part_cnt": self.part_cnt,
+            "names": {str(k): v for k, v in self.names.items()},
+            "stats": [[tester, site, test_num, stats.to_dict()]
+                      for (tester, site, test_num), stats in self.stats.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LotAggregate":
+        agg = cls()
+        agg.files = d["files"]
+        agg.part_cnt = d["part_cnt"]
+        agg.names = {int(k): v for k, v in d["names"].items()}
+        agg.stats = {(tester, site, test_num): TestStats.from_dict(stats) for tester, site, test_num, stats in d["stats"]}
+        return agg
+
+    def to_csv(self, csv_path: str):
+        """ Lot totals first, then per tester, per site and per tester/site breakdowns """
+        fieldnames = ["Test ID", "Tester", "Site", "Name", "Execs", "Fails", "Low Lim", "High Lim",
+                      "Min", "Max", "Mean", "Sigma"]
+        with open(csv_path, "w", newline="") as f_out:
+            writer = csv.DictWriter(f_out, fieldnames=fieldnames)
+            writer.writeheader()
+            for by_tester, by_site in ((False, False), (True, False), (False, True), (True, True)):
+                for (tester, site, test_num), stats in sorted(self.rollup(by_tester, by_site).items()):
+                    writer.writerow({
+                        "Test ID": test_num,
+                        "Tester": tester,
+                        "Site": site if site >= 0 else "*",
+                        "Name": self.names.get(test_num, ""),
+                        "Execs": stats.count + stats.nonfinite,
+                        "Fails": stats.fails,
+                        "Low Lim": stats.lo_lim,
+                        "High Lim": stats.hi_lim,
+                        "Min": stats.min if stats.count else None,
+                        "Max": stats.max if stats.count else None,
+                        "Mean": stats.mean,
+                        "Sigma": stats.sigma,
+                    })
+
+
+def aggregate_file(stdf_path: str, cache_dir: str = None) -> LotAggregate:
+    """ Per-file partial; cached as JSON in cache_dir, keyed by path, size and mtime """
+    cache_path = None
+    if cache_dir is not None:
+        st = os.stat(stdf_path)
+        key = f"{os.path.abspath(stdf_path)}|{st.st_size}|{st.st_mtime_ns}|{CACHE_VERSION}"
+        cache_path = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+        if os.path.exists(cache_path):
+            with open(cache_path) as f_in:
+                return LotAggregate.from_dict(json.load(f_in))
+
+    agg = LotAggregate()
+    agg.files.append(stdf_path)
+    tester = ""
+    # {test_num: (LO_LIMIT, HI_LIMIT)} of the first PTR, the defaults of every later one on any site
+    limits: Dict[int, Tuple[Optional[float], Optional[float]]] = {}
+    scanner = StdfScanner(stdf_path, {"Mir", "Ptr", "Prr"})
+    decoder = StdfRecord(stdf_path)
+    unpack_ptr = None
+    for offset, key, body in scanner:
+        if key == b'\x0f\n':  # Ptr
+            test_num, head_num, site, test_flg, result, test_txt, lo_lim, hi_lim = unpack_ptr(body)
+            if result is None:
+                continue
+            if test_num not in limits:
+                limits[test_num] = (lo_lim, hi_lim)
+            stats = agg.stats.get((tester, site, test_num))
+            if stats is None:
+                stats = agg.stats[(tester, site, test_num)] = TestStats(*limits[test_num])
+                if test_num not in agg.names and test_txt is not None:
+                    agg.names[test_num] = test_txt.decode(errors="replace")
+            # TEST_FLG bit 7: test failed
+            stats.push(result, bool(test_flg & 0x80))
+        elif key == b'\x05\x14':  # Prr
+            agg.part_cnt += 1
+        else:  # Mir
+            decoder.ENDIAN = scanner.ENDIAN
+            unpack_ptr = PtrUnpacker(scanner.ENDIAN)
+            tester = (decoder.decode(key, body)["NODE_NAM"] or b"").decode()
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path + ".tmp", "w") as f_out:
+            json.dump(agg.to_dict(), f_out)
+        os.replace(cache_path + ".tmp", cache_path)
+    return agg
+
+
+def _aggregate_file_args(args: tuple) -> LotAggregate:
+    return aggregate_file(*args)
+
+
+class StdfLot(LotAggregate):
+    """ Map per-file partials over a process pool, reduce them into one lot aggregate """
+    def __init__(self, stdf_paths: Iterable[str], jobs: int = None, cache_dir: str = None):
+        super().__init__()
+        stdf_paths = list(stdf_paths)
+        if jobs == 1 or len(stdf_paths) <= 1:
+            partials = (aggregate_file(path, cache_dir) for path in stdf_paths)
+            for partial in partials:
+                self.merge(partial)
+            return
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for partial in executor.map(_aggregate_file_args, [(path, cache_dir) for path in stdf_paths]):
+                self.merge(partial)
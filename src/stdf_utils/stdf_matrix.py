@@ -0,0 +1,167 @@
+import csv
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from stdf_utils.stdf_record import StdfRecord
+from stdf_utils.stdf_scan import StdfScanner, PtrUnpacker
+
+PART_FIELDS = ("part_id", "site", "x", "y", "hard_bin", "soft_bin")
+COLUMN_FIELDS = ("column", "test_num", "test_name", "lo_limit", "hi_limit")
+
+
+def ptr_catalog(stdf_path: str) -> Tuple[List[Tuple[int, str, float, float]], int]:
+    """ ([(test_num, test_name, lo_limit, hi_limit)] in order of first appearance, part count) """
+    catalog: Dict[int, Tuple[int, str, float, float]] = {}
+    part_cnt = 0
+    scanner = StdfScanner(stdf_path, {"Ptr", "Prr"})
+    unpack_ptr = None
+    for offset, key, body in scanner:
+        if key == b'\x05\x14':  # Prr
+            part_cnt += 1
+            continue
+        if unpack_ptr is None:
+            unpack_ptr = PtrUnpacker(scanner.ENDIAN)
+        test_num, head_num, site, test_flg, result, test_txt, lo_limit, hi_limit = unpack_ptr(body)
+        if test_num is not None and test_num not in catalog:
+            catalog[test_num] = (test_num, (test_txt or b"").decode(errors="replace"), lo_limit, hi_limit)
+    return list(catalog.values()), part_cnt
+
+
+class StdfToMatrix:
+    """
+    Dense part x test float32 matrix, one row per PRR in test order and one column per test, NaN where a
+    test did not run. Columns come from the test catalog (a PTR-only pre-pass, or `tests` to pin the
+    column order across files), and every part fills a preallocated row that is flushed in blocks of
+    `chunk_rows` to:
+        .npy      a memmap of the whole matrix, with part fields in <name>.parts.csv
+        .parquet  row groups of part fields + one column per test (needs pyarrow)
+        .csv      part fields + one column per test, empty for NaN
+    Column headers are test numbers; <name>.columns.csv maps them to test names and limits.
+    """
+    def __init__(self, stdf_path: str, out_path: str, tests: List[int] = None, chunk_rows: int = 4096):
+        self.stdf_path = stdf_path
+        self.out_path = out_path
+        self.fmt = os.path.splitext(out_path)[1].lower().lstrip(".")
+        if self.fmt not in {"npy", "parquet", "csv"}:
+            raise ValueError(f"format '{self.fmt}' is not supported")
+        self.chunk_rows = chunk_rows
+        self.columns_path = os.path.splitext(out_path)[0] + ".columns.csv"
+        self.parts_path: Optional[str] = None
+        self.part_cnt: int = 0
+
+        # columns
+        catalog, part_cnt = ptr_catalog(stdf_path)
+        if tests is not None:
+            known = {test[0]: test for test in catalog}
+            catalog = [known.get(test_num, (test_num, "", None, None)) for test_num in tests]
+        self.catalog = catalog
+        self.column: Dict[int, int] = {test[0]: i for i, test in enumerate(catalog)}
+
+        # rows
+        n_cols = len(catalog)
+        self.values = np.full((chunk_rows, n_cols), np.nan, dtype=np.float32)
+        self.parts: List[tuple] = []
+        self._open(part_cnt, n_cols)
+        self._write_columns()
+        try:
+            self._read()
+            self._flush()
+        finally:
+            self._close()
+
+    def _write_columns(self):
+        with open(self.columns_path, "w", newline="") as f_out:
+            writer = csv.writer(f_out)
+            writer.writerow(COLUMN_FIELDS)
+            for i, (test_num, test_name, lo_limit, hi_limit) in enumerate(self.catalog):
+                writer.writerow((i, test_num, test_name, lo_limit, hi_limit))
+
+    def _read(self):
+        scanner = StdfScanner(self.stdf_path, {"Pir", "Ptr", "Prr"})
+        unpack_ptr = prr = None
+        n_cols = len(self.catalog)
+        rows: Dict[int, np.ndarray] = {}  # {site: row of the open part}
+        for offset, key, body in scanner:
+            if unpack_ptr is None:
+                unpack_ptr = PtrUnpacker(scanner.ENDIAN)
+                prr = StdfRecord(self.stdf_path)
+                prr.ENDIAN = scanner.ENDIAN
+            if key == b'\x0f\n':  # Ptr
+                test_num, head_num, site, test_flg, result, *_ = unpack_ptr(body)
+                col = self.column.get(test_num)
+                if col is not None and result is not None:
+                    row = rows.get(site)
+                    if row is None:
+                        row = rows[site] = np.full(n_cols, np.nan, dtype=np.float32)
+                    row[col] = result
+            elif key == b'\x05\n':  # Pir
+                rows.pop(body[1] if len(body) > 1 else 0, None)
+            else:  # Prr
+                rec = prr.decode(key, body)
+                row = rows.pop(rec["SITE_NUM"], None)
+                i = len(self.parts)
+                self.values[i] = row if row is not None else np.nan
+                self.parts.append(((rec["PART_ID"] or b"").decode(), rec["SITE_NUM"], rec["X_COORD"], rec["Y_COORD"],
+                                   rec["HARD_BIN"], rec["SOFT_BIN"]))
+                if i + 1 == self.chunk_rows:
+                    self._flush()
+
+    # writers
+    def _open(self, part_cnt: int, n_cols: int):
+        if self.fmt == "npy":
+            self.matrix = np.lib.format.open_memmap(self.out_path, mode="w+", dtype=np.float32,
+                                                    shape=(part_cnt, n_cols))
+            self.parts_path = os.path.splitext(self.out_path)[0] + ".parts.csv"
+            self._f_out = open(self.parts_path, "w", newline="")
+            self._writer = csv.writer(self._f_out)
+            self._writer.writerow(PART_FIELDS)
+        elif self.fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("parquet output needs pyarrow: pip install stdf-utils[parquet]") from None
+            self._pa = pa
+            fields = [pa.field(name, pa.string() if name == "part_id" else pa.int32()) for name in PART_FIELDS]
+            fields += [pa.field(str(test[0]), pa.float32()) for test in self.catalog]
+            self._schema = pa.schema(fields)
+            self._writer = pq.ParquetWriter(self.out_path, self._schema)
+        else:
+            self._f_out = open(self.out_path, "w", newline="")
+            self._writer = csv.writer(self._f_out)
+            self._writer.writerow((*PART_FIELDS, *(test[0] for test in self.catalog)))
+
+    def _flush(self):
+        n = len(self.parts)
+        if n == 0:
+            return
+        values = self.values[:n]
+        if self.fmt == "npy":
+            self.matrix[self.part_cnt:self.part_cnt + n] = values
+            self._writer.writerows(self.parts)
+        elif self.fmt == "parquet":
+            pa = self._pa
+            arrays = [pa.array([part[i] for part in self.parts], type=self._schema.field(i).type)
+                      for i in range(len(PART_FIELDS))]
+            arrays += [pa.array(values[:, j], from_pandas=True) for j in range(values.shape[1])]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        else:
+            text = values.astype(str)  # shortest float32 repr
+            text[np.isnan(values)] = ""
+            for part, row in zip(self.parts, text.tolist()):
+                self._writer.writerow((*part, *row))
+        self.part_cnt += n
+        self.parts.clear()
+        self.values.fill(np.nan)
+
+    def _close(self):
+        if self.fmt == "npy":
+            self.matrix.flush()
+            del self.matrix
+            self._f_out.close()
+        elif self.fmt == "parquet":
+            self._writer.close()
+        else:
+            self._f_out.close()
@@ -1,25 +1,188 @@
+import gzip
+import json
 import logging
-from .stdf_record import StdfRecord
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+from .stdf_record import RECORD_TABLE, StdfRecord
+from .stdf_scan import StdfScanner
+from .stdf_writer import KEYS, RecordEncoder
 from util import OpenFile
 
 
 class StdfPatch:
-    def __init__(self, stdf_path: str, mod_stdf_path: str = None, patch_func=None):
+    def __init__(self, stdf_path: str, mod_stdf_path: str = None, patch_func=None, patch_types: set = None,
+                 chunk_size: int = 1 << 20):
+        """
+        patch_func(rec_type, record, buffer) -> bytes: the bytes written in place of the record (header
+            included); b'' drops it
+        patch_types: the record types patch_func is called for; every other record is copied as raw bytes,
+            in contiguous runs, without being decoded. None: all types
+        A mod_stdf_path ending with .gz is gzip compressed.
+        """
         self.stdf_path = stdf_path
         self.mod_stdf_path = mod_stdf_path or stdf_path.replace(".gz", "").replace(".stdf", "_mod.stdf")
         self.patch_func = patch_func or (lambda x, y, z: z)
+        if patch_types is None:
+            patch_types = {r["name"] for r in RECORD_TABLE.values()}
+        self.patch_types: set = patch_types  # empty: every record is copied as is
+        self.chunk_size = chunk_size
+        self.record_cnt: int = 0
+        self.patched_cnt: int = 0  # records handed to patch_func
 
-        with open(self.mod_stdf_path, "wb") as f_out:
-            with OpenFile(stdf_path) as f_in:
-                stdf = StdfRecord(f_in)
-                while True:
-                    try:
-                        record = stdf.get_next_record()
-                        if record is None:
-                            continue
-                        write_buffer = self.patch_func(stdf.rec_type, record, stdf.buffer)
-                        f_out.write(write_buffer)
-
-                    except Exception as e:
-                        logging.debug(str(e))
-                        break
+        open_out = gzip.open if self.mod_stdf_path.endswith(".gz") else open
+        with open_out(self.mod_stdf_path, "wb") as f_out, OpenFile(stdf_path) as f_in:
+            self._patch(f_in, f_out)
+
+    def _patch(self, f_in, f_out):
+        keys = {key for key, r in RECORD_TABLE.items() if r["name"] in self.patch_types}
+        wanted = {key[0] << 8 | key[1] for key in keys}
+        out = bytearray()
+        buf = f_in.read(max(self.chunk_size, 6))
+        if len(buf) < 6:
+            f_out.write(buf)
+            return
+        decoder = StdfRecord(self.stdf_path)
+        decoder.ENDIAN = {1: ">", 2: "<"}.get(buf[4])
+        if decoder.ENDIAN is None:
+            raise ValueError(f"Cpu type '{buf[4]}' is not supported...")
+        unpack_len = struct.Struct(f"{decoder.ENDIAN}H").unpack_from
+
+        # the FAR's REC_LEN is readable once CPU_TYPE is known, so it goes through the loop like the rest
+        pos = run = 0  # run: start of the raw bytes not copied to `out` yet
+        while True:
+            if pos + 4 > len(buf):
+                out += buf[run:pos]
+                more = f_in.read(self.chunk_size)
+                if not more:
+                    if pos != len(buf):
+                        logging.error("Incomplete log...")
+                        out += buf[pos:]  # copied as is
+                    break
+                buf, pos, run = buf[pos:] + more, 0, 0
+                if len(out) >= self.chunk_size:
+                    f_out.write(out)
+                    out = bytearray()
+                continue
+
+            rec_len, = unpack_len(buf, pos)
+            end = pos + 4 + rec_len
+            if end > len(buf):
+                out += buf[run:pos]
+                more = f_in.read(max(self.chunk_size, end - len(buf)))
+                if not more:
+                    logging.error("Incomplete log...")
+                    out += buf[pos:]
+                    break
+                buf, pos, run = buf[pos:] + more, 0, 0
+                continue
+
+            self.record_cnt += 1
+            if buf[pos + 2] << 8 | buf[pos + 3] in wanted:
+                key = bytes(buf[pos + 2:pos + 4])
+                buffer = bytes(buf[pos:end])
+                record = decoder.decode(key, buffer[4:])
+                out += buf[run:pos]
+                out += self.patch_func(decoder.rec_type, record, buffer)
+                run = end
+                self.patched_cnt += 1
+            pos = end
+        f_out.write(out)
+
+
+class StdfInPlacePatch:
+    def __init__(self, stdf_path: str, patch_func, patch_types: set, dry_run: bool = False,
+                 journal_path: str = None, mod_stdf_path: str = None):
+        """
+        Same patch_func as StdfPatch, but the records of patch_types are located with StdfScanner and the
+        edits overwritten in the file through mmap, without a copy. Needs an uncompressed file and edits that
+        keep every record's length; otherwise it falls back to the streaming StdfPatch into mod_stdf_path.
+        The original bytes are appended to the journal (default <stdf_path>.undo) before anything is
+        written; undo_patch(journal_path) puts them back.
+        dry_run: only collect the edits
+        """
+        self.stdf_path = stdf_path
+        self.journal_path = journal_path or stdf_path + ".undo"
+        self.edits: List[Tuple[int, bytes, bytes]] = []  # (offset, original, patched), header included
+        self.in_place: bool = True
+        self.mod_stdf_path: Optional[str] = None
+
+        if stdf_path.endswith((".gz", ".bz2")):
+            reason = "the file is compressed"
+        else:
+            reason = self._collect(patch_func, patch_types)
+        if reason is not None:
+            self.in_place = False
+            logging.info(f"{stdf_path}: {reason}, patching with a streaming rewrite")
+            if not dry_run:
+                self.mod_stdf_path = StdfPatch(stdf_path, mod_stdf_path, patch_func, patch_types).mod_stdf_path
+            return
+        if dry_run or not self.edits:
+            return
+
+        # journal first, so an interrupted write can still be undone
+        with open(self.journal_path, "a") as f_journal:
+            for offset, original, patched in self.edits:
+                f_journal.write(json.dumps({"offset": offset, "original": original.hex(), "patched": patched.hex()}))
+                f_journal.write("\n")
+            f_journal.flush()
+            os.fsync(f_journal.fileno())
+        with open(stdf_path, "r+b") as f, mmap.mmap(f.fileno(), 0) as mm:
+            for offset, original, patched in self.edits:
+                mm[offset:offset + len(patched)] = patched
+            mm.flush()
+
+    def _collect(self, patch_func, patch_types: set) -> Optional[str]:
+        """ Fill self.edits; returns why the file cannot be patched in place, None if it can """
+        if not patch_types:
+            return None  # no types, no edits: StdfScanner would take an empty set for all types
+        scanner = StdfScanner(self.stdf_path, patch_types)
+        decoder = StdfRecord(self.stdf_path)
+        pack_len = None
+        for offset, key, body in scanner:
+            if pack_len is None:
+                decoder.ENDIAN = scanner.ENDIAN
+                pack_len = struct.Struct(f"{scanner.ENDIAN}H").pack
+            record = decoder.decode(key, body)
+            original = pack_len(len(body)) + key + body
+            patched = bytes(patch_func(decoder.rec_type, record, original))
+            if patched == original:
+                continue
+            if len(patched) != len(original):
+                return f"{decoder.rec_type} at {offset} changes length"
+            self.edits.append((offset, original, patched))
+        return None
+
+
+def undo_patch(journal_path: str, stdf_path: str = None):
+    """ Restore the original bytes of every StdfInPlacePatch recorded in the journal, latest first """
+    stdf_path = stdf_path or journal_path[:-len(".undo")]
+    with open(journal_path) as f_journal:
+        edits = [json.loads(line) for line in f_journal if line.strip()]
+    with open(stdf_path, "r+b") as f, mmap.mmap(f.fileno(), 0) as mm:
+        # check the whole journal replays backwards before touching the file
+        current = {}
+        for edit in reversed(edits):
+            offset, patched = edit["offset"], bytes.fromhex(edit["patched"])
+            if current.get(offset, mm[offset:offset + len(patched)]) != patched:
+                raise ValueError(f"{stdf_path} at {offset} does not hold the patched bytes, not undone")
+            current[offset] = bytes.fromhex(edit["original"])
+        for offset, original in current.items():
+            mm[offset:offset + len(original)] = original
+        mm.flush()
+    os.unlink(journal_path)
+
+
+def set_fields(values: Dict[str, dict], endian: str):
+    """
+    patch_func that overwrites fields and re-encodes the record, e.g. {"Mir": {"LOT_ID": b"A12345"}};
+    patch_types are the keys of `values`. A string of the same length keeps the record's length.
+    """
+    encoders = {rec_type: RecordEncoder(RECORD_TABLE[KEYS[rec_type]]["fields"], endian) for rec_type in values}
+    pack_len = struct.Struct(f"{endian}H").pack
+
+    def patch_func(rec_type: str, record: dict, buffer: bytes) -> bytes:
+        body = encoders[rec_type]({**record, **values[rec_type]})
+        return pack_len(len(body)) + buffer[2:4] + body
+    return patch_func
@@ -2,18 +2,20 @@ import os.path
 from collections import defaultdict
 from datetime import datetime
 from copy import copy
+from .part_index import PartIndex, stdf_name
 from .stdf_record import StdfRecord
-from util import OpenFile
 
 
 class StdfPerPart:
     def __init__(self, stdf_path: str, ptr_filter=None,
-                 ptr_extra_fields=None, extra_handler=None):
+                 ptr_extra_fields=None, extra_handler=None, part_index: PartIndex = None, keep: str = "final"):
+        """ part_index: only yield the first or final (keep) test of every die in the index """
 
         self.stdf_path = stdf_path
         self.ptr_filter = ptr_filter or (lambda d: True)
         self.ptr_extra_fields = ptr_extra_fields or (lambda d: {})
         self.previous_rec: dict = {}
+        self.kept = part_index.kept(keep) if part_index is not None else None
         self.handlers = {
             "Mir": self.mir_handler,
             "Ptr": self.ptr_handler,
@@ -25,28 +27,35 @@ class StdfPerPart:
         self.mir = {}
         self.prr = {}
         self.ptr = defaultdict(list)
+        self.ptr_defaults = {}  # {test_num: first PTR}, for the fields later PTRs leave out
 
     def __iter__(self):
         # reset
         self.mir.clear()
         self.prr.clear()
         self.ptr.clear()
-        with OpenFile(self.stdf_path) as f_in:
-            for rec_type, rec in StdfRecord(f_in, set(self.handlers.keys())):
-                self.handlers[rec_type](rec)
-                if rec_type == "Prr":
-                    site = self.prr["site"]
-                    yield {
-                        "mir": copy(self.mir),
-                        "prr": copy(self.prr),
-                        "ptr": self.ptr.pop(site) if site in self.ptr else [],
-                    }
-                elif rec_type == "Mrr":
-                    yield {
-                        "mir": copy(self.mir),
-                        "prr": {},
-                        "ptr": [],
-                    }
+        self.ptr_defaults.clear()
+        name = stdf_name(self.stdf_path)
+        part_seq = -1  # n-th PRR, what the index keys parts by
+        for rec_type, rec in StdfRecord(self.stdf_path, set(self.handlers.keys())):
+            self.handlers[rec_type](rec)
+            if rec_type == "Prr":
+                part_seq += 1
+                site = self.prr["site"]
+                ptr = self.ptr.pop(site) if site in self.ptr else []
+                if self.kept is not None and (name, part_seq) not in self.kept:
+                    continue  # superseded by a retest, or a retest of an earlier one
+                yield {
+                    "mir": copy(self.mir),
+                    "prr": copy(self.prr),
+                    "ptr": ptr,
+                }
+            elif rec_type == "Mrr":
+                yield {
+                    "mir": copy(self.mir),
+                    "prr": {},
+                    "ptr": [],
+                }
 
     def mir_handler(self, d: dict) -> None:
         self.mir = {
@@ -58,6 +67,10 @@ class StdfPerPart:
 
     def ptr_handler(self, d: dict) -> None:
         site: int = d["SITE_NUM"]
+        first = self.ptr_defaults.setdefault(d["TEST_NUM"], d)
+        if d["TEST_TXT"] is None or d["LO_LIMIT"] is None:
+            d = {**d, "TEST_TXT": first["TEST_TXT"], "LO_LIMIT": first["LO_LIMIT"], "HI_LIMIT": first["HI_LIMIT"],
+                 "UNITS": first["UNITS"]}
         if self.ptr_filter(d):
             self.ptr[site].append({
                 "t_num": d["TEST_NUM"],
@@ -71,7 +84,7 @@ class StdfPerPart:
 
     def prr_handler(self, d: dict) -> None:
         self.prr = {
-            "part_id": d["PART_ID"].decode(),
+            "part_id": (d["PART_ID"] or b"").decode(),
             "site": d["SITE_NUM"],
             "x": d["X_COORD"],
             "y": d["Y_COORD"],
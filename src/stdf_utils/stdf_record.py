@@ -2,9 +2,11 @@ import logging
 import math
 import struct
 import sys
+import time
 from datetime import datetime
 from typing import Dict, Tuple, Any
 from util import unp, OpenFile
+from stdf_utils import parse_stats, progress as progress_
 
 # Endian for unpack bytes. For example:
 # 0x3ff in little endian (<) is: ff 03
@@ -144,7 +146,7 @@ RECORD_TABLE: Dict[bytes, dict] = {
 
     b'\x01>': {  # (1, 62)
         "name": "Pgr",
-        "field_ma": (
+        "fields": (
             ('GRP_INDX', 'U2'),
             ('GRP_NAM', 'Cn'),
             ('INDX_CNT', 'U2'),
@@ -486,7 +488,8 @@ RECORD_TABLE: Dict[bytes, dict] = {
     b'2\n': {  # (50,10)
         "name": "Gdr",
         "fields": (
-            ('GEN_DATA', 'Vn'),
+            ('FLD_CNT', 'U2'),
+            ('GEN_DATA', 'K0Vn'),
         )
     },
 
@@ -536,10 +539,27 @@ class Stdf:
 
 
 class StdfRecord:
-    def __init__(self, file_path: str, parse_types: set = None):
+    def __init__(self, file_path: str, parse_types: set = None,
+                 follow: bool = False, timeout: float = 60.0, poll_interval: float = 0.2, start_offset: int = 0,
+                 stats: "parse_stats.ParseStats" = None, progress: "progress_.Progress" = None):
+        """
+        follow: tail a file the tester is still writing; at EOF wait for more bytes instead of stopping,
+            until the MRR arrives or no new byte shows up for `timeout` seconds (uncompressed files only)
+        start_offset: resume at this (uncompressed) record boundary, e.g. a saved `offset`; only the FAR
+            is read from the start of the file
+        stats: ParseStats to count and time records into; default: parse_stats.default_stats, if set
+        progress: Progress to report bytes, records/s and ETA to; default: progress.default_progress, if set
+        """
         self.file_path = file_path
         self.parse_types: set = parse_types or {r["name"] for r in RECORD_TABLE.values()}
         self.ENDIAN = "@"
+        self.follow = follow
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.start_offset = start_offset
+        self.offset: int = 0  # uncompressed offset right after the last record read
+        self.stats = stats if stats is not None else parse_stats.default_stats
+        self.progress = progress if progress is not None else progress_.default_progress
 
         # cache
         self.buffer: bytes = b''
@@ -547,15 +567,93 @@ class StdfRecord:
         self._rec_fields: Tuple[Tuple[str, str]] = tuple()
         self._data: Dict[str, Any] = {}
         self._fp = None
+        self._read = None
 
     def __iter__(self):
-        with OpenFile(self.file_path) as fp:
+        if self.follow and self.file_path.endswith((".gz", ".bz2")):
+            raise ValueError("follow mode needs an uncompressed file")
+        self.offset = 0
+        if self.start_offset:
+            # endian comes from the FAR
+            with OpenFile(self.file_path) as fp:
+                self._fp, self._read = fp, fp.read
+                self.far_handler()
+            self.offset = self.start_offset
+
+        stats, progress = self.stats, self.progress
+        wrap_raw = None
+        if progress is not None:
+            progress.start_file(self.file_path, self.start_offset)
+            wrap_raw = progress.watch if stats is None else (lambda raw: stats.timed_file(progress.watch(raw)))
+        elif stats is not None:
+            wrap_raw = stats.timed_file
+
+        with OpenFile(self.file_path, self.start_offset, wrap_raw=wrap_raw) as fp:
             self._fp = fp
+            self._read = self._read_follow if self.follow else fp.read
+            if progress is not None:
+                self._read = progress.wrap_read(self._read)
+            if stats is not None:
+                self._read = stats.timed_read(self._read)
+            try:
+                if stats is not None:
+                    yield from self._iter_stats(stats)
+                else:
+                    yield from self._iter_records()
+            finally:
+                if progress is not None:
+                    progress.end_file()
+
+    def _iter_records(self):
+        while True:
+            try:
+                record = self.get_next_record()
+                if record is not None:
+                    yield self.rec_type, record
+                if self.follow and self.rec_type == "Mrr":
+                    logging.debug("Completed...")
+                    break
+
+            except EOFError:
+                logging.debug("Completed...")
+                break
+
+            except BufferError:
+                logging.error("Incomplete log...")
+                break
+
+    def _iter_stats(self, stats: "parse_stats.ParseStats"):
+        """ The loop of __iter__, counting every record and timing 1 in stats.sample """
+        clock = time.perf_counter
+        start = clock()
+        n = 0
+        try:
             while True:
+                n += 1
+                timed = n % stats.sample == 0
+                offset = self.offset
                 try:
-                    record = self.get_next_record()
+                    if timed:
+                        t0, read_s = clock(), stats.read_s
+                        record = self.get_next_record()
+                        stats.decode_s[self.rec_type] += clock() - t0 - (stats.read_s - read_s)
+                        stats.timed[self.rec_type] += 1
+                    else:
+                        record = self.get_next_record()
+                    stats.counts[self.rec_type] += 1
+                    stats.bytes[self.rec_type] += self.offset - offset
                     if record is not None:
-                        yield self.rec_type, record
+                        stats.yielded += 1
+                        if timed:
+                            t1 = clock()
+                            yield self.rec_type, record
+                            stats.consumer_s += clock() - t1
+                            stats.consumer_timed += 1
+                        else:
+                            yield self.rec_type, record
+                    if self.follow and self.rec_type == "Mrr":
+                        logging.debug("Completed...")
+                        break
 
                 except EOFError:
                     logging.debug("Completed...")
@@ -564,6 +662,9 @@ class StdfRecord:
                 except BufferError:
                     logging.error("Incomplete log...")
                     break
+        finally:
+            stats.wall_s += clock() - start
+            stats.files += 1
 
     def get_next_record(self):
         if self.ENDIAN == "@":
@@ -575,14 +676,18 @@ class StdfRecord:
         self._data = {}
 
         # read header (4 bytes)
-        header = self._fp.read(4)
+        header = self._read(4)
         if len(header) == 0:
             raise EOFError
 
         elif len(header) != 4:
             raise BufferError
 
-        body = self._fp.read(unp(self.ENDIAN, 'H', header[0:2]))
+        rec_length = unp(self.ENDIAN, 'H', header[0:2])
+        body = self._read(rec_length)
+        if len(body) != rec_length:
+            raise BufferError
+        self.offset += 4 + rec_length
         self.buffer = header + body
         # key: int = header[2] * 1000 + header[3]  # typ * 1000 + sub
         key = header[2:4]
@@ -598,7 +703,12 @@ class StdfRecord:
 
     def far_handler(self):
         self.rec_type = "Far"
-        self.buffer = self._fp.read(6)
+        self.buffer = self._read(6)
+        if len(self.buffer) == 0:
+            raise EOFError
+        elif len(self.buffer) != 6:
+            raise BufferError
+        self.offset += 6
 
         buf = self.buffer
         cpu_type = buf[4]
@@ -612,6 +722,25 @@ class StdfRecord:
         return self.parse(RECORD_TABLE[b'\x00\n'], buf[4:]) \
             if "Far" in self.parse_types else None
 
+    def _read_follow(self, n: int) -> bytes:
+        """ Read n bytes, waiting for the writer at EOF; a partial record is re-read once complete """
+        buf = self._fp.read(n)
+        deadline = time.monotonic() + self.timeout
+        while len(buf) < n and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            more = self._fp.read(n - len(buf))
+            if more:
+                buf += more
+                deadline = time.monotonic() + self.timeout  # idle timeout
+        return buf
+
+    def decode(self, key: bytes, body: bytes) -> dict:
+        """ Decode one raw body outside of iteration, e.g. from StdfScanner; ENDIAN must already be set """
+        record = RECORD_TABLE[key]
+        self.rec_type = record["name"]
+        self._data = {}
+        return self.parse(record, body)
+
     def parse(self, record, body):
         self._rec_fields = record["fields"]
         for field_name, fmt in self._rec_fields:
@@ -648,7 +777,7 @@ class StdfRecord:
             if len(buf) < 1:
                 return None, ''
             else:
-                tmp = unp(self.ENDIAN, 'B', buf[0])
+                tmp = buf[0]
                 r.append(tmp & 0x0F)
                 r.append(tmp >> 4)
                 return r, buf[1:]
@@ -699,7 +828,7 @@ class StdfRecord:
                 r = unp(self.ENDIAN, 'h', buf[0:2])
                 return r, buf[2:]
         elif fmt == 'I1':
-            if len(buf) < 2:
+            if len(buf) < 1:
                 return None, ''
             else:
                 r = unp(self.ENDIAN, 'b', buf[0:1])
@@ -773,15 +902,14 @@ class StdfRecord:
             if len(buf) < 1:
                 return None, ''
             else:
-                char_cnt = unp(self.ENDIAN, 'B', bytes([buf[0]]))
+                char_cnt = buf[0]
                 if len(buf) < (1 + char_cnt):
                     logging.critical('Bn: Not enough data in buffer: needed: %s, actual: %s' % (str(1 + char_cnt),
                                                                                                 str(len(buf))))
                     sys.exit(-1)
                 r = buf[1:(1 + char_cnt)]
                 tmp = '0x'
-                for i in r:
-                    v = unp(self.ENDIAN, 'B', i)
+                for v in r:
                     tmp = tmp + hex_digits[v >> 4] + hex_digits[v & 0x0F]
                 r = tmp
                 return r, buf[(1 + char_cnt):]
@@ -791,7 +919,7 @@ class StdfRecord:
 
     def _get_Dn(self, fmt, buf):
         if fmt == 'Dn':
-            if len(buf) < 1:
+            if len(buf) < 2:
                 return None, ''
             else:
                 dlen = unp(self.ENDIAN, 'H', buf[0:2])
@@ -800,10 +928,10 @@ class StdfRecord:
                 dbyt = int(math.ceil(dlen / 8.0))
                 assert len(buf) >= dbyt
                 for i in range(dbyt):
-                    tmp = unp(self.ENDIAN, 'B', buf[i])
+                    tmp = buf[i]
                     for j in range(8):
                         r.append((tmp >> j) & 0x01)
-                return r, buf[dbyt:]
+                return r[:dlen], buf[dbyt:]  # one item per bit of DLEN
 
     def _get_Kx(self, fmt, buf):
         # first, parse the format to find out in which field of the record defined the length of the array
@@ -815,6 +943,8 @@ class StdfRecord:
         index_cnt = int(fmt[1:-2])
         cnt_name = self._rec_fields[index_cnt][0]
         cnt = self._data[cnt_name]
+        if cnt is None:  # the count field was cut off with the rest of a short record
+            return None, buf
         r = []
         func = self._get_parse_func(item_format)
         if item_format == 'N1':
@@ -830,17 +960,22 @@ class StdfRecord:
                 r.append(item)
             return r, buf
 
+    VN_TYPES = ('B0', 'U1', 'U2', 'U4', 'I1', 'I2', 'I4', 'R4', 'R8', 'Cn', 'Bn', 'Dn', 'N1')
+
     def _get_Vn(self, fmt, buf):
+        """ (type code, value); type 0 is a pad byte with no value """
         assert fmt == "Vn"
-        data_type = ['B0', 'U1', 'U2', 'U4', 'I1', 'I2', 'I4',
-                     'R4', 'R8', 'Cn', 'Bn', 'Dn', 'N1']
         if len(buf) < 1:
             return None, ''
         else:
             typ = buf[0]
             buf = buf[1:]
-            r, buf = self._get_parse_func(data_type[typ])(data_type[typ], buf)
-            return r, buf
+            if typ == 0:
+                return (0, None), buf
+            if typ >= len(self.VN_TYPES):
+                raise BufferError(f"Vn: unknown data type {typ}")
+            r, buf = self._get_parse_func(self.VN_TYPES[typ])(self.VN_TYPES[typ], buf)
+            return (typ, r), buf
 
 
 class Handlers:
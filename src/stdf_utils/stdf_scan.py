@@ -0,0 +1,121 @@
+import io
+import logging
+import os
+import struct
+from typing import Iterator, Tuple
+from stdf_utils.stdf_record import RECORD_TABLE
+from util import OpenFile
+
+
+class StdfScanner:
+    """
+    Walk the 4-byte record headers of a file in large chunks without decoding anything. Only records
+    whose type is in `types` are sliced out and yielded as (offset, key, body); every other body is
+    stepped over in the buffer, or seeked past when it reaches beyond the buffer.
+    """
+    def __init__(self, file_path: str, types: set = None, chunk_size: int = 1 << 20):
+        self.file_path = file_path
+        self.types: set = types or {r["name"] for r in RECORD_TABLE.values()}
+        self.chunk_size = chunk_size
+        self.keys = {key for key, r in RECORD_TABLE.items() if r["name"] in self.types}
+        self.ENDIAN = "@"
+        self.offset: int = 0  # offset right after the last record walked
+        self.record_cnt: int = 0  # all records walked, wanted or not
+
+    def __iter__(self) -> Iterator[Tuple[int, bytes, bytes]]:
+        keys = self.keys
+        wanted = {key[0] << 8 | key[1] for key in keys}
+        with OpenFile(self.file_path) as fp:
+            buf = fp.read(max(self.chunk_size, 6))
+            if len(buf) < 6:
+                return
+            self.ENDIAN = {1: ">", 2: "<"}.get(buf[4])
+            if self.ENDIAN is None:
+                raise ValueError(f"Cpu type '{buf[4]}' is not supported...")
+            unpack_len = struct.Struct(f"{self.ENDIAN}H").unpack_from
+            # plain files seek past EOF without complaint, so check against the size instead
+            size = os.fstat(fp.fileno()).st_size if isinstance(fp, io.BufferedReader) else None
+            if b'\x00\n' in keys:
+                yield 0, b'\x00\n', bytes(buf[4:6])
+
+            base, pos = 0, 6  # base: file offset of buf[0]
+            self.record_cnt = 1
+            while True:
+                if pos + 4 > len(buf):
+                    more = fp.read(self.chunk_size)
+                    if not more:
+                        if pos != len(buf):
+                            logging.error("Incomplete log...")
+                        break
+                    buf, base, pos = buf[pos:] + more, base + pos, 0
+                    continue
+
+                rec_len, = unpack_len(buf, pos)
+                end = pos + 4 + rec_len
+                if buf[pos + 2] << 8 | buf[pos + 3] not in wanted:
+                    self.record_cnt += 1
+                    self.offset = base + end
+                    if end > len(buf):
+                        # the body reaches past the buffer: seek over the rest of it
+                        target = base + end
+                        if fp.seek(end - len(buf), 1) != target or (size is not None and target > size):
+                            logging.error("Incomplete log...")
+                            break
+                        buf, base, pos = b"", target, 0
+                    else:
+                        pos = end
+                    continue
+
+                if end > len(buf):
+                    more = fp.read(max(self.chunk_size, end - len(buf)))
+                    if len(more) < end - len(buf):
+                        logging.error("Incomplete log...")
+                        break
+                    buf, base, pos = buf[pos:] + more, base + pos, 0
+                    continue
+
+                self.record_cnt += 1
+                self.offset = base + end
+                yield base + pos, bytes(buf[pos + 2:pos + 4]), bytes(buf[pos + 4:end])
+                pos = end
+
+
+class PtrUnpacker:
+    """
+    The PTR fields the aggregators need, straight from a raw body and without building a dict:
+    (TEST_NUM, HEAD_NUM, SITE_NUM, TEST_FLG, RESULT, TEST_TXT, LO_LIMIT, HI_LIMIT).
+    Fields cut off by a truncated record come back as None, like StdfRecord, and so do limits that
+    OPT_FLAG marks as absent (bits 6/7) or invalid (bits 4/5: the first PTR's value applies).
+    """
+    def __init__(self, endian: str):
+        self._head = struct.Struct(f"{endian}IBBBxf").unpack_from  # TEST_NUM .. RESULT, PARM_FLG skipped
+        self._limits = struct.Struct(f"{endian}4xff").unpack_from  # OPT_FLAG, 3 x scal skipped
+
+    def __call__(self, body: bytes) -> tuple:
+        n = len(body)
+        if n < 12:
+            return self._short(body)
+        test_num, head_num, site_num, test_flg, result = self._head(body, 0)
+        if n < 13:
+            return test_num, head_num, site_num, test_flg, result, None, None, None
+        end = 13 + body[12]
+        test_txt = body[13:end]
+        if n > end:
+            end += 1 + body[end]  # ALARM_ID
+        if n < end + 12:
+            return test_num, head_num, site_num, test_flg, result, test_txt, None, None
+        lo_limit, hi_limit = self._limits(body, end)
+        opt_flag = body[end]
+        if opt_flag & 0x50:
+            lo_limit = None
+        if opt_flag & 0xA0:
+            hi_limit = None
+        return test_num, head_num, site_num, test_flg, result, test_txt, lo_limit, hi_limit
+
+    def _short(self, body: bytes) -> tuple:
+        padded = body + bytes(12 - len(body))
+        values = list(self._head(padded, 0))
+        for i, end in enumerate((4, 5, 6, 7, 12)):
+            if len(body) < end:
+                values[i] = None
+        return (*values, None, None, None)
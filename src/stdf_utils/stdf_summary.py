@@ -0,0 +1,179 @@
+import os
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from stdf_utils.stdf_record import RECORD_TABLE, StdfRecord
+from stdf_utils.stdf_scan import StdfScanner
+
+SUMMARY_TYPES = {"Mrr", "Pcr", "Hbr", "Sbr", "Tsr"}
+MISSING_U4 = 4294967295
+
+
+def _chains_to_end(tail: bytes, endian: str, known: np.ndarray) -> np.ndarray:
+    """
+    For every position of `tail`, whether a chain of records with known keys starting there lands exactly
+    on the end of `tail`. Vectorised with pointer doubling, so it is O(n log n) in NumPy instead of a
+    Python loop per byte. Offsets are int32 and updated in place: about 10 bytes of memory per tail byte.
+    """
+    w = len(tail)
+    b = np.frombuffer(tail, dtype=np.uint8)
+    n = max(w - 3, 0)
+    key = b[2:n + 2].astype(np.int32)
+    key <<= 8
+    key |= b[3:n + 3]
+    ok = known[key]
+    del key
+
+    hi, lo = (b[0:n], b[1:n + 1]) if endian == ">" else (b[1:n + 1], b[0:n])
+    nxt = hi.astype(np.int32)
+    nxt <<= 8
+    nxt |= lo
+    nxt += np.arange(4, n + 4, dtype=np.int32)
+    ok &= nxt <= w
+    dead = w + 1
+    jump = np.full(w + 2, dead, dtype=np.int32)
+    np.copyto(jump[:n], nxt, where=ok)
+    del nxt, ok
+    jump[w] = w  # reaching the end is final
+
+    other = np.empty_like(jump)
+    steps = 1
+    while steps < w:
+        # in slices: take() converts the indices to intp, a full-size int64 copy at once
+        for i in range(0, len(jump), 1 << 20):
+            np.take(jump, jump[i:i + (1 << 20)], out=other[i:i + (1 << 20)], mode="clip")
+        jump, other = other, jump
+        if np.array_equal(jump, other):
+            break
+        steps *= 2
+    return jump[:w] == w
+
+
+class StdfSummary:
+    """
+    MRR/PCR/HBR/SBR/TSR without reading the whole file. For uncompressed files the summary section is
+    located from the end: a backward window is searched for record chains that land exactly on EOF, the
+    earliest one is followed forward, and the records after its last non-summary record are decoded.
+    Compressed files (or a tail that does not validate, e.g. no trailing MRR) fall back to a forward
+    StdfScanner pass that decodes only the summary records.
+    """
+    def __init__(self, stdf_path: str, tail_size: int = 64 << 10, max_tail_size: int = 16 << 20):
+        self.stdf_path = stdf_path
+        self.tail_size = tail_size
+        self.max_tail_size = max_tail_size
+        self.method: str = ""  # "tail" or "scan"
+        self.mrr: dict = {}
+        self.pcr: List[dict] = []
+        self.hbr: List[dict] = []
+        self.sbr: List[dict] = []
+        self.tsr: List[dict] = []
+
+        records = None
+        if not stdf_path.endswith((".gz", ".bz2")):
+            records = self._read_tail()
+        if records is None:
+            records = self._read_forward()
+        for rec_type, rec in records:
+            if rec_type == "Mrr":
+                self.mrr = rec
+            else:
+                getattr(self, rec_type.lower()).append(rec)
+
+    def _read_tail(self) -> Optional[List[Tuple[str, dict]]]:
+        size = os.path.getsize(self.stdf_path)
+        decoder = StdfRecord(self.stdf_path)
+        known = np.zeros(1 << 16, dtype=bool)
+        for key in RECORD_TABLE:
+            known[key[0] << 8 | key[1]] = True
+        summary_keys = {key for key, r in RECORD_TABLE.items() if r["name"] in SUMMARY_TYPES}
+
+        with open(self.stdf_path, "rb") as f_in:
+            far = f_in.read(6)
+            if len(far) < 6 or far[4] not in (1, 2):
+                return None
+            decoder.ENDIAN = ">" if far[4] == 1 else "<"
+            unpack_len = (lambda h: h[0] << 8 | h[1]) if decoder.ENDIAN == ">" else (lambda h: h[1] << 8 | h[0])
+
+            window = self.tail_size
+            while True:
+                start = max(size - window, 6)
+                f_in.seek(start)
+                tail = f_in.read(size - start)
+                reach = np.flatnonzero(_chains_to_end(tail, decoder.ENDIAN, known))
+
+                # walk the earliest chain forward; chains from wrong alignments merge into it or die out
+                chain = []
+                pos = int(reach[0]) if len(reach) else len(tail)
+                while pos < len(tail):
+                    chain.append((pos, tail[pos + 2:pos + 4]))
+                    pos += 4 + unpack_len(tail[pos:pos + 2])
+                first = len(chain)
+                while first > 0 and chain[first - 1][1] in summary_keys:
+                    first -= 1
+
+                if chain and chain[-1][1] == b'\x01\x14' and (first > 0 or start == 6):
+                    break
+                if start == 6 or window >= self.max_tail_size:
+                    return None
+                window *= 4
+
+        records = []
+        for pos, key in chain[first:]:
+            rec_len = unpack_len(tail[pos:pos + 2])
+            rec = decoder.decode(key, tail[pos + 4:pos + 4 + rec_len])
+            records.append((decoder.rec_type, rec))
+        self.method = "tail"
+        return records
+
+    def _read_forward(self) -> List[Tuple[str, dict]]:
+        scanner = StdfScanner(self.stdf_path, SUMMARY_TYPES)
+        decoder = StdfRecord(self.stdf_path)
+        records = []
+        for offset, key, body in scanner:
+            decoder.ENDIAN = scanner.ENDIAN
+            rec = decoder.decode(key, body)
+            records.append((decoder.rec_type, rec))
+        self.method = "scan"
+        return records
+
+    @property
+    def part_cnt(self) -> Optional[int]:
+        return self._pcr_total("PART_CNT")
+
+    @property
+    def good_cnt(self) -> Optional[int]:
+        good_cnt = self._pcr_total("GOOD_CNT")
+        if good_cnt is None:
+            # HBR pass/fail flag as fallback
+            bins = [r for r in self.hbr if r["HEAD_NUM"] == 255] or self.hbr
+            if any(r["HBIN_PF"] == ord("P") for r in bins):
+                good_cnt = sum(r["HBIN_CNT"] for r in bins if r["HBIN_PF"] == ord("P"))
+        return good_cnt
+
+    @property
+    def yield_(self) -> Optional[float]:
+        part_cnt, good_cnt = self.part_cnt, self.good_cnt
+        if not part_cnt or good_cnt is None:
+            return None
+        return good_cnt / part_cnt
+
+    def _pcr_total(self, field: str) -> Optional[int]:
+        """ Prefer the all-site PCR (HEAD_NUM 255), else sum the per-site ones """
+        pcr = [r for r in self.pcr if r["HEAD_NUM"] == 255] or self.pcr
+        values = [r[field] for r in pcr if r[field] not in (None, MISSING_U4)]
+        return sum(values) if values else None
+
+    def top_failing_tests(self, n: int = 10) -> List[dict]:
+        """ [{test_num, test_nam, exec_cnt, fail_cnt}] sorted by fail count """
+        tsr = [r for r in self.tsr if r["HEAD_NUM"] == 255] or self.tsr
+        tests = defaultdict(lambda: {"exec_cnt": 0, "fail_cnt": 0, "test_nam": ""})
+        for r in tsr:
+            test = tests[r["TEST_NUM"]]
+            test["test_nam"] = test["test_nam"] or (r["TEST_NAM"] or b"").decode().strip()
+            for k in ("exec_cnt", "fail_cnt"):
+                if r[k.upper()] not in (None, MISSING_U4):
+                    test[k] += r[k.upper()]
+        ranked = sorted(tests.items(), key=lambda kv: (-kv[1]["fail_cnt"], kv[0]))
+        return [{"test_num": test_num, **test} for test_num, test in ranked[:n]]
@@ -1,50 +1,85 @@
 import csv
+import math
 import statistics
 from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+from stdf_utils.part_index import PartIndex, stdf_name
+from stdf_utils.spill_sort import SpillSorter
 from stdf_utils.stdf_record import StdfRecord
-from util import OpenFile
 
 
 class StdfToCsv:
-    def __init__(self, stdf_path: str, csv_path: str = None):
+    def __init__(self, stdf_path: str, csv_path: str = None, part_index: PartIndex = None, keep: str = "final",
+                 max_memory: int = None, tmp_dir: str = None):
+        """
+        part_index: only count the first or final (keep) test of every die in the index
+        max_memory: keep results in sorted runs spilled to tmp_dir once they exceed this many bytes
+        """
         self.stdf_path = stdf_path
         self.csv_path = csv_path or stdf_path.replace(".gz", "").replace(".stdf", ".csv")
-        self.ptr_container = PTRContainer()
+        self.ptr_container = PTRContainer() if max_memory is None else SpilledPTRContainer(max_memory, tmp_dir)
+        self.ptr_defaults: Dict[int, dict] = {}  # {test_num: first PTR}, for the fields later PTRs leave out
         self.handlers = {
             "Ptr": self.ptr_handler,
         }
+        if part_index is not None:
+            # hold each part's results until its PRR tells whether the part is kept
+            self.kept = part_index.kept(keep)
+            self.stdf_name = stdf_name(stdf_path)
+            self.part_seq = 0  # PRRs so far, what the index keys parts by
+            self.site_ptr = defaultdict(list)
+            self.handlers = {
+                "Ptr": self.site_ptr_handler,
+                "Prr": self.prr_handler,
+            }
         # read
-        with OpenFile(stdf_path) as f_in:
-            for rec_type, rec in StdfRecord(f_in, set(self.handlers.keys())):
-                self.handlers[rec_type](rec)
+        for rec_type, rec in StdfRecord(stdf_path, set(self.handlers.keys())):
+            self.handlers[rec_type](rec)
         # write
-        self._to_csv()
+        try:
+            self._to_csv()
+        finally:
+            self.ptr_container.close()
 
     def ptr_handler(self, rec: dict):
-        self.ptr_container.push(rec)
+        self.ptr_container.push(self.fill_defaults(rec))
+
+    def site_ptr_handler(self, rec: dict):
+        self.site_ptr[rec['SITE_NUM']].append(self.fill_defaults(rec))
+
+    def fill_defaults(self, rec: dict) -> dict:
+        """ A PTR may leave out the text and limits, which then default to the first PTR of the test """
+        first = self.ptr_defaults.setdefault(rec['TEST_NUM'], rec)
+        if rec['TEST_TXT'] is None or rec['LO_LIMIT'] is None:
+            rec = {**rec, 'TEST_TXT': first['TEST_TXT'], 'LO_LIMIT': first['LO_LIMIT'],
+                   'HI_LIMIT': first['HI_LIMIT']}
+        return rec
+
+    def prr_handler(self, rec: dict):
+        ptr_list = self.site_ptr.pop(rec['SITE_NUM'], [])
+        if (self.stdf_name, self.part_seq) in self.kept:
+            for ptr in ptr_list:
+                self.ptr_container.push(ptr)
+        self.part_seq += 1
 
     def _to_csv(self):
         fieldnames = ["Test ID", "Site", "Name", "Execs", "Fails", "Low Lim", "High Lim", "Min", "Max", "Mean"]
         with open(self.csv_path, "w", newline="") as f_out:
-            writer = csv.DictWriter(f_out, fieldnames=fieldnames)
+            writer = csv.DictWriter(f_out, fieldnames=fieldnames, lineterminator="\n")
             writer.writeheader()
-            for test_name, sites in self.ptr_container.data.items():
-                for i, site_data in enumerate(sites):
-                    data = [d["RESULT"] for d in site_data]
-                    if len(data) == 0:
-                        continue
-                    writer.writerow({
-                        "Test ID": site_data[0]["TEST_NUM"],
-                        "Site": site_data[0]["SITE_NUM"],
-                        "Name": test_name.decode(),
-                        "Execs": len(data),
-                        "Fails": len([d for d in data if d < site_data[0]["LO_LIMIT"] or d > site_data[0]["HI_LIMIT"]]),
-                        "Low Lim": site_data[0]["LO_LIMIT"],
-                        "High Lim": site_data[0]["HI_LIMIT"],
-                        "Min": min(data),
-                        "Max": max(data),
-                        "Mean": statistics.mean(data),
-                    })
+            for test_name, first, data in self.ptr_container.groups():
+                writer.writerow({
+                    "Test ID": first["TEST_NUM"],
+                    "Site": first["SITE_NUM"],
+                    "Name": test_name.decode(),
+                    "Execs": len(data),
+                    "Fails": len([d for d in data if d < first["LO_LIMIT"] or d > first["HI_LIMIT"]]),
+                    "Low Lim": first["LO_LIMIT"],
+                    "High Lim": first["HI_LIMIT"],
+                    "Min": min(data),
+                    "Max": max(data),
+                    "Mean": statistics.mean(data),
+                })
 
 
 class PTRContainer:
@@ -66,3 +101,47 @@ class PTRContainer:
         while len(self.data[key]) <= site:
             self.data[key].append([])
         self.data[key][site].append(rec)
+
+    def groups(self) -> Iterator[Tuple[bytes, dict, list]]:
+        """ (key, first record, results) per key and site """
+        for key, sites in self.data.items():
+            for site_data in sites:
+                data = [d["RESULT"] for d in site_data]
+                if len(data) == 0:
+                    continue
+                yield key, site_data[0], data
+
+    def close(self):
+        pass
+
+
+class SpilledPTRContainer(PTRContainer):
+    """
+    Same groups as PTRContainer, but only (key order, site, sequence, result) rows are kept and they go
+    through a SpillSorter, so one (key, site) group is in memory at a time when the csv is written.
+    """
+    FIELDS = ("TEST_NUM", "SITE_NUM", "LO_LIMIT", "HI_LIMIT")
+
+    def __init__(self, max_memory: int, tmp_dir: str = None, key_type: str = "name"):
+        super().__init__(key_type)
+        self.sorter = SpillSorter("IHQd", max_memory, tmp_dir)
+        self.keys: Dict[bytes, int] = {}  # {key: order of first appearance}
+        self.first: Dict[Tuple[int, int], dict] = {}  # {(order, site): first record}
+        self.seq: int = 0
+
+    def push(self, rec: dict):
+        order = self.keys.setdefault(self.get_key(rec), len(self.keys))
+        site = rec['SITE_NUM']
+        if (order, site) not in self.first:
+            self.first[(order, site)] = {k: rec[k] for k in self.FIELDS}
+        result = rec['RESULT']
+        self.sorter.push((order, site, self.seq, result if result is not None else math.nan))
+        self.seq += 1
+
+    def groups(self) -> Iterator[Tuple[bytes, dict, list]]:
+        keys: List[bytes] = list(self.keys)
+        for (order, site), rows in self.sorter.groups(2):
+            yield keys[order], self.first[(order, site)], [row[3] for row in rows]
+
+    def close(self):
+        self.sorter.close()
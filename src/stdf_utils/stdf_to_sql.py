@@ -1,18 +1,56 @@
+import math
 import os
 import re
-from typing import Dict
+from array import array
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
 from stdf_utils.part_data import PartData
+from stdf_utils.progress import Progress
+from stdf_utils.spill_sort import SpillSorter
 from stdf_utils.sql_conn import SqlConn
 from stdf_utils.stdf_record import StdfRecord
 
 
 class StdfToSql:
-    def __init__(self, stdf_path: str):
+    def __init__(self, stdf_path: str, sql_conn: SqlConn = None, bulk_load: bool = True, storage: str = "row",
+                 replace: bool = False, checkpoint_every: int = 0, max_memory: int = None, tmp_dir: str = None,
+                 progress: Progress = None):
+        """
+        storage: "row" writes one Ptr row per result, "blob" one PtrBlob row per test
+        replace: an stdf already in the db is deleted and re-ingested in the same transaction
+        checkpoint_every: commit every N parts together with the offset after that PRR and the state of
+            the sites still open, so an interrupted ingest resumes there instead of starting over
+        max_memory: blob storage keeps its per-test columns in sorted runs spilled to tmp_dir past this many
+            bytes, and writes them one test at a time at MRR; row storage is already bounded by the bulk
+            load batch size
+        progress: reports the parse, see StdfRecord
+        """
+        if storage not in {"row", "blob"}:
+            raise ValueError(f"storage '{storage}' is not supported")
+        if checkpoint_every and storage == "blob":
+            raise ValueError("blob storage is written at MRR and cannot be checkpointed")
         self.stdf_path: str = stdf_path
+        self.stdf_name: str = re.sub(r"(\.stdf)(\.gz)?", "", os.path.basename(stdf_path), flags=re.I)
+        self.storage: str = storage
+        self.replace: bool = replace
+        self.checkpoint_every: int = checkpoint_every
+        self.progress: Optional[Progress] = progress
         self.stdf_id: int = 0
-        self.sql_conn = SqlConn(os.path.join(os.path.dirname(stdf_path), "local.db"))
+        # result
+        self.completed: bool = False  # MRR reached and committed
+        self.skipped: bool = False  # already in the db
+        self.part_count: int = 0
+        self.ptr_count: int = 0
+        self.sql_conn = sql_conn or SqlConn(os.path.join(os.path.dirname(stdf_path), "local.db"))
         self.part_data_site: Dict[int, PartData] = {}  # per site data {site: DieData}
+        self.open_sites: Set[int] = set()  # sites between PIR and PRR
+        self.stdf_record: Optional[StdfRecord] = None
         self.ptr_fact_dict: Dict[int, dict] = {}  # {test_num, ptr}
+        self.ptr_columns: Dict[int, Tuple[array, array]] = defaultdict(lambda: (array("q"), array("f")))
+        # (test_num, sequence, part_id, result) rows instead of ptr_columns
+        self.ptr_spill: Optional[SpillSorter] = None
+        if storage == "blob" and max_memory is not None:
+            self.ptr_spill = SpillSorter("IQqd", max_memory, tmp_dir)
         self.handlers: dict = {
             "Mir": self.mir_handler,
             "Pir": self.pir_handler,
@@ -21,20 +59,61 @@ class StdfToSql:
             "Prr": self.prr_handler,
             "Mrr": self.mrr_handler,
         }
-        # read
-        for rec_type, rec in StdfRecord(stdf_path, set(self.handlers.keys())):
-            if self.handlers[rec_type](rec) is False:
-                break
+        # read; a shared sql_conn is expected to be inside its own bulk_load() already
+        try:
+            if bulk_load and sql_conn is None:
+                with self.sql_conn.bulk_load():
+                    self._read()
+            else:
+                self._read()
+        finally:
+            if self.ptr_spill is not None:
+                self.ptr_spill.close()
+
+    def _read(self):
+        start_offset = 0 if self.replace else self._resume()
+        self.stdf_record = StdfRecord(self.stdf_path, set(self.handlers.keys()), start_offset=start_offset,
+                                      progress=self.progress)
+        try:
+            for rec_type, rec in self.stdf_record:
+                if self.handlers[rec_type](rec) is False:
+                    break
+        except BaseException:
+            self.sql_conn.rollback()  # never leave half a file behind (past the last checkpoint)
+            raise
+
+    def _resume(self) -> int:
+        """ Restore the state of an interrupted ingest and return the offset to continue from """
+        checkpoint = self.sql_conn.get_checkpoint(self.stdf_name)
+        if checkpoint is None:
+            return 0
+        print(f"{self.stdf_name} resumes after part {checkpoint['part_count']}")
+        self.stdf_id = checkpoint["stdf_id"]
+        self.part_count = checkpoint["part_count"]
+        self.ptr_count = checkpoint["ptr_count"]
+        self.part_data_site = {site: PartData.from_dict(state) for site, state in checkpoint["site_state"].items()}
+        self.open_sites = set(self.part_data_site)
+        return checkpoint["offset"]
+
+    def _checkpoint(self):
+        # the facts are kept: cleared, the next PTR of a test (without TEST_TXT and limits) would become one
+        self.sql_conn.insert_ptr_fact(self.stdf_id, self.ptr_fact_dict)
+        self.sql_conn.save_checkpoint(self.stdf_id, self.stdf_record.offset, self.part_count, self.ptr_count,
+                                      {site: self.part_data_site[site].to_dict() for site in self.open_sites})
+        self.sql_conn.commit()
 
     def mir_handler(self, rec: dict) -> bool:
-        stdf_name = re.sub(r"(\.stdf)(\.gz)?", "", os.path.basename(self.stdf_path), flags=re.I)
-        if self.sql_conn.stdf_exists(stdf_name):
-            print(f"{stdf_name} already exists")
-            return False
-        self.stdf_id = self.sql_conn.insert_stdf(rec, stdf_name)
+        if self.sql_conn.stdf_exists(self.stdf_name):
+            if not self.replace:
+                print(f"{self.stdf_name} already exists")
+                self.skipped = True
+                return False
+            self.sql_conn.delete_stdf(self.stdf_name)  # committed together with the new rows
+        self.stdf_id = self.sql_conn.insert_stdf(rec, self.stdf_name)
 
     def pir_handler(self, rec: dict) -> bool:
         self.part_data_site[rec['SITE_NUM']] = PartData(rec['SITE_NUM'])  # reset
+        self.open_sites.add(rec['SITE_NUM'])
         return True
 
     def dtr_handler(self, rec: dict) -> bool:
@@ -62,19 +141,46 @@ class StdfToSql:
 
     def ptr_handler(self, rec: dict) -> bool:
         self.part_data_site[rec['SITE_NUM']].update_ptr(rec)
-        self.ptr_fact_dict[rec['TEST_NUM']] = rec  # TODO: check different test_text
+        self.ptr_count += 1
+        if rec['TEST_TXT'] is not None or rec['TEST_NUM'] not in self.ptr_fact_dict:  # keep a full PTR
+            self.ptr_fact_dict[rec['TEST_NUM']] = rec  # TODO: check different test_text
         return True
 
     def prr_handler(self, rec: dict) -> bool:
         part_data = self.part_data_site[rec['SITE_NUM']]
         part_data.update_prr(rec, self.stdf_id)
+        self.open_sites.discard(rec['SITE_NUM'])
+        self.part_count += 1
         self.sql_conn.insert_part(part_data)
-        self.sql_conn.insert_ptr(part_data)
+        if self.ptr_spill is not None:
+            for ptr in part_data.ptr_list:
+                self.ptr_spill.push((ptr.test_num, self.ptr_spill.row_cnt, part_data.part_id,
+                                     ptr.result if ptr.result is not None else math.nan))
+        elif self.storage == "blob":
+            for ptr in part_data.ptr_list:
+                part_ids, results = self.ptr_columns[ptr.test_num]
+                part_ids.append(part_data.part_id)
+                results.append(ptr.result if ptr.result is not None else math.nan)
+        else:
+            self.sql_conn.insert_ptr(part_data)
+        if self.checkpoint_every and self.part_count % self.checkpoint_every == 0:
+            self._checkpoint()
         return True
 
     def mrr_handler(self, rec: dict) -> bool:
         self.sql_conn.insert_ptr_fact(self.stdf_id, self.ptr_fact_dict)
-        self.sql_conn.conn.commit()  # remember to commit changes in the last record
+        if self.ptr_spill is not None:
+            for test_num, rows in self.ptr_spill.groups(1):
+                part_ids, results = array("q"), array("f")
+                for _, _, part_id, result in rows:
+                    part_ids.append(part_id)
+                    results.append(result)
+                self.sql_conn.insert_ptr_blobs(self.stdf_id, {test_num: (part_ids, results)})
+        elif self.storage == "blob":
+            self.sql_conn.insert_ptr_blobs(self.stdf_id, self.ptr_columns)
+        self.sql_conn.delete_checkpoint(self.stdf_id)
+        self.sql_conn.commit()  # remember to commit changes in the last record
+        self.completed = True
         return True
 
 
@@ -0,0 +1,138 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from stdf_utils.stdf_record import RECORD_TABLE, StdfRecord
+from stdf_utils.stdf_scan import StdfScanner
+
+STYLES = ("atdf", "txt")
+
+
+def _atdf(value) -> str:
+    """ ATDF-style field text: empty when missing, floats round-trip, arrays comma separated """
+    t = type(value)
+    if t is int or t is str:
+        return str(value)
+    if t is float:
+        return repr(value)
+    if value is None:
+        return ""
+    if t is bytes:
+        return value.decode("latin1")
+    if t is list:
+        return ",".join(map(_atdf, value))
+    if t is tuple:  # Vn item: (type code, value)
+        return _atdf(value[1])
+    return str(value)
+
+
+class RecordFormatter:
+    """
+    Record -> text through a template precomputed per type, in two styles:
+        atdf: "Ptr:1000|1|0|0x00|...\n", one line per record, fields in stdf order and separated by "|"
+        txt: "=== Ptr ===\r\nTEST_NUM: 1000\r\n...", the layout of the former field-by-field dump
+    `fields` ("Ptr.RESULT" or "RESULT") keeps only the matching fields of every type that has any; other
+    types keep all of theirs. Picklable, so batches can be formatted in worker processes.
+    """
+    def __init__(self, style: str = "atdf", fields: Set[str] = None):
+        if style not in STYLES:
+            raise ValueError(f"style '{style}' is not supported, one of {STYLES}")
+        self.style = style
+        self.fields: Set[str] = set(fields or ())
+        self._plans: Dict[bytes, Tuple[str, Optional[Tuple[str, ...]]]] = {}
+        self._decoder: Optional[StdfRecord] = None
+
+    def plan(self, key: bytes) -> Tuple[str, Optional[Tuple[str, ...]]]:
+        """ (template, field names to pick or None for all) of a record type """
+        plan = self._plans.get(key)
+        if plan is None:
+            record = RECORD_TABLE[key]
+            rec_type = record["name"]
+            names = [name for name, fmt in record["fields"]]
+            picked = [name for name in names if name in self.fields or f"{rec_type}.{name}" in self.fields]
+            if picked:
+                names = picked
+            if self.style == "atdf":
+                template = f"{rec_type.upper()}:" + "|".join("{}" for _ in names) + "\n"
+            else:
+                template = f"=== {rec_type} ===\r\n" + "".join(f"{name}: {{}}\r\n" for name in names)
+            plan = self._plans[key] = (template, tuple(names) if picked else None)
+        return plan
+
+    def __call__(self, endian: str, batch: List[Tuple[bytes, bytes]]) -> str:
+        """ Text of a batch of raw (key, body) records """
+        decoder = self._decoder
+        if decoder is None:
+            decoder = self._decoder = StdfRecord("")
+        decoder.ENDIAN = endian
+        out = []
+        atdf = self.style == "atdf"
+        for key, body in batch:
+            template, names = self.plan(key)
+            record = decoder.decode(key, body)
+            values = record.values() if names is None else [record[name] for name in names]
+            out.append(template.format(*map(_atdf, values)) if atdf else template.format(*values))
+        return "".join(out)
+
+    def __getstate__(self):
+        return {"style": self.style, "fields": self.fields, "_plans": self._plans, "_decoder": None}
+
+
+def _format_batch(formatter: RecordFormatter, endian: str, batch: List[Tuple[bytes, bytes]]) -> str:
+    return formatter(endian, batch)
+
+
+class StdfToTxt:
+    """
+    Streaming text dump of a stdf. Only the records of `types` are sliced out by StdfScanner and decoded;
+    every `batch_size` records are formatted into one string (in `workers` processes when > 0, results
+    kept in file order) and written through a `buffer_size` buffer. The output depends on nothing but the
+    file and the options, so dumps of two files can be diffed. Text is latin-1, byte for byte.
+        StdfToTxt("lot.stdf.gz", types={"Ptr", "Prr"}, fields={"Ptr.TEST_NUM", "Ptr.RESULT"})
+    """
+    def __init__(self, stdf_path: str, txt_path: str = None, style: str = "atdf", types: Set[str] = None,
+                 fields: Set[str] = None, workers: int = 0, batch_size: int = 4096, buffer_size: int = 1 << 20):
+        self.stdf_path = stdf_path
+        ext = ".atdf" if style == "atdf" else ".txt"
+        self.txt_path = txt_path or stdf_path.replace(".gz", "").replace(".bz2", "").replace(".stdf", "") \
+            .replace(".std", "") + ext
+        self.formatter = RecordFormatter(style, fields)
+        for rec_type in types or ():
+            if rec_type not in {r["name"] for r in RECORD_TABLE.values()}:
+                raise ValueError(f"record type '{rec_type}' is not supported")
+        self.record_cnt: int = 0
+
+        scanner = StdfScanner(stdf_path, set(types or ()))
+        with open(self.txt_path, "w", encoding="latin1", newline="", buffering=buffer_size) as f_out:
+            if workers > 0:
+                self._parallel(scanner, f_out, workers, batch_size)
+            else:
+                batch = []
+                for offset, key, body in scanner:
+                    batch.append((key, body))
+                    if len(batch) >= batch_size:
+                        f_out.write(self.formatter(scanner.ENDIAN, batch))
+                        self.record_cnt += len(batch)
+                        batch = []
+                f_out.write(self.formatter(scanner.ENDIAN, batch))
+                self.record_cnt += len(batch)
+
+    def _parallel(self, scanner: StdfScanner, f_out, workers: int, batch_size: int):
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            pending = deque()  # in file order, at most 2 batches per worker in flight
+            batch = []
+            for offset, key, body in scanner:
+                batch.append((key, body))
+                if len(batch) >= batch_size:
+                    pending.append(pool.submit(_format_batch, self.formatter, scanner.ENDIAN, batch))
+                    self.record_cnt += len(batch)
+                    batch = []
+                    if len(pending) >= 2 * workers:
+                        f_out.write(pending.popleft().result())
+            if batch:
+                pending.append(pool.submit(_format_batch, self.formatter, scanner.ENDIAN, batch))
+                self.record_cnt += len(batch)
+            while pending:
+                f_out.write(pending.popleft().result())
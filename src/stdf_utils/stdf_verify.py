@@ -0,0 +1,249 @@
+import gzip
+import re
+import struct
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from stdf_utils.stdf_record import RECORD_TABLE
+from util import OpenFile
+
+FIXED_SIZE = {'U1': 1, 'U2': 2, 'U4': 4, 'U8': 8, 'I1': 1, 'I2': 2, 'I4': 4, 'R4': 4, 'R8': 8, 'C1': 1, 'B1': 1,
+              'B0': 1, 'N1': 1}
+FAR, MIR, MRR, PIR, PRR = 0x000A, 0x010A, 0x0114, 0x050A, 0x0514
+BEFORE_MIR = {0x000A, 0x0014, 0x001E}  # FAR, ATR, VUR
+
+
+def _max_len(fields) -> Optional[int]:
+    """ Body length of a record made of fixed-size fields only, None when any field is variable """
+    if any(fmt not in FIXED_SIZE for name, fmt in fields):
+        return None
+    return sum(FIXED_SIZE[fmt] for name, fmt in fields)
+
+
+# {REC_TYP << 8 | REC_SUB: longest possible body or None}
+MAX_LEN: Dict[int, Optional[int]] = {key[0] << 8 | key[1]: _max_len(r["fields"]) for key, r in RECORD_TABLE.items()}
+NAMES: Dict[int, str] = {key[0] << 8 | key[1]: r["name"] for key, r in RECORD_TABLE.items()}
+# positions whose header carries a known REC_TYP / REC_SUB
+RE_KNOWN = re.compile(b"(?=..(?:" + b"|".join(re.escape(key) for key in RECORD_TABLE) + b"))", re.DOTALL)
+
+
+class Issue(NamedTuple):
+    offset: int  # uncompressed
+    kind: str  # truncated, damaged, unknown, sequence
+    detail: str
+
+
+class StdfVerify:
+    """
+    Integrity check that walks the 4-byte headers without decoding bodies. A header is plausible when its
+    type is known and its length fits the type (records of fixed-size fields have a maximum, the others must
+    lead to a header that holds up in turn); a record of an unknown type is kept when the next
+    `resync_depth` headers after it are plausible, otherwise the bytes are damaged and the walk resyncs on
+    the next offset that starts such a chain. On the way the record sequence is checked: FAR first, MIR
+    before anything but ATR/VUR, PIR/PRR paired per head and site, MRR last. With `salvage_path` (.gz
+    compressed) every good record is copied there, damaged bytes and a truncated tail are left out, and an
+    MRR is appended when the log has none.
+    """
+    def __init__(self, stdf_path: str, salvage_path: str = None, chunk_size: int = 1 << 20, resync_depth: int = 4,
+                 max_issues: int = 1000):
+        self.stdf_path = stdf_path
+        self.salvage_path = salvage_path
+        self.chunk_size = chunk_size
+        self.resync_depth = resync_depth
+        self.max_issues = max_issues
+        self.issues: List[Issue] = []  # the first max_issues
+        self.issue_cnt: int = 0
+        self.record_cnt: int = 0
+        self.size: int = 0  # uncompressed bytes walked
+        self.damaged_bytes: int = 0
+        self.truncated_bytes: int = 0
+        self.endian: Optional[str] = None
+
+        self._buf = bytearray()
+        self._base = 0  # offset of _buf[0]
+        self._eof = False
+        self._out = None
+        open_out = gzip.open if salvage_path and salvage_path.endswith(".gz") else open
+        with OpenFile(stdf_path) as self._fp:
+            if salvage_path is None:
+                self._verify()
+            else:
+                with open_out(salvage_path, "wb") as self._out:
+                    self._verify()
+
+    @property
+    def ok(self) -> bool:
+        """ Nothing but records of unknown types """
+        return all(issue.kind == "unknown" for issue in self.issues) and self.issue_cnt == len(self.issues)
+
+    @property
+    def kept_bytes(self) -> int:
+        return self.size - self.damaged_bytes - self.truncated_bytes
+
+    def _issue(self, offset: int, kind: str, detail: str):
+        self.issue_cnt += 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append(Issue(offset, kind, detail))
+
+    # buffer
+    def _ensure(self, end: int) -> bool:
+        """ Read until absolute offset `end` is in the buffer; False at EOF before it """
+        while self._base + len(self._buf) < end and not self._eof:
+            more = self._fp.read(max(self.chunk_size, end - self._base - len(self._buf)))
+            if not more:
+                self._eof = True
+            self._buf += more
+        return self._base + len(self._buf) >= end
+
+    def _end(self) -> int:
+        return self._base + len(self._buf)
+
+    def _header(self, pos: int) -> Tuple[int, int]:
+        """ (rec_len, key) at absolute offset pos, which must be buffered """
+        i = pos - self._base
+        return self._unpack_len(self._buf, i)[0], self._buf[i + 2] << 8 | self._buf[i + 3]
+
+    def _plausible(self, rec_len: int, key: int) -> bool:
+        if key not in MAX_LEN:
+            return False
+        max_len = MAX_LEN[key]
+        return max_len is None or rec_len <= max_len
+
+    def _chain(self, pos: int, depth: int) -> bool:
+        """ The `depth` headers from pos are plausible, or the data ends cleanly on the way """
+        for _ in range(depth):
+            if not self._ensure(pos + 4):
+                return True
+            rec_len, key = self._header(pos)
+            if not self._plausible(rec_len, key):
+                return False
+            pos += 4 + rec_len
+        return True
+
+    def _resync(self, pos: int) -> int:
+        """ Next offset from pos that starts a plausible chain; the end of the data if none """
+        while True:
+            self._compact(pos)
+            # search() rather than finditer(): _chain() may grow the buffer, which an open export forbids
+            m = RE_KNOWN.search(self._buf, pos - self._base)
+            if m is None:
+                if self._eof:
+                    return self._end()
+                pos = max(self._end() - 3, pos)  # a header may straddle the end of the buffer
+                self._ensure(self._end() + self.chunk_size)
+                continue
+            candidate = self._base + m.start()
+            if self._chain(candidate, self.resync_depth + 1):
+                return candidate
+            pos = candidate + 1
+
+    def _copy(self, start: int, end: int):
+        if self._out is not None and end > start:
+            self._out.write(self._buf[start - self._base:end - self._base])
+
+    def _compact(self, keep_from: int):
+        """ Drop the buffer before keep_from """
+        drop = keep_from - self._base
+        if drop >= self.chunk_size:
+            del self._buf[:drop]
+            self._base = keep_from
+
+    # walk
+    def _verify(self):
+        if not self._ensure(6):
+            self._issue(0, "truncated", "shorter than a FAR")
+            self.size = self.truncated_bytes = self._end()
+            return
+        self.endian = {1: ">", 2: "<"}.get(self._buf[4])
+        if self.endian is None or self._buf[2:4] != b'\x00\n':
+            self._issue(0, "damaged", "no FAR: not an stdf file, or its first record is damaged")
+            # without a byte order there is nothing to resync on; only the size is counted, a chunk at a time
+            self.size = self._end()
+            while not self._eof:
+                more = self._fp.read(self.chunk_size)
+                self._eof = not more
+                self.size += len(more)
+            self.damaged_bytes = self.size
+            return
+        self._unpack_len = struct.Struct(f"{self.endian}H").unpack_from
+
+        pos = run = 0  # run: start of the good records not copied yet
+        seen_mir = seen_mrr = False
+        open_parts: Set[Tuple[int, int]] = set()
+        while True:
+            if run == pos:
+                self._compact(pos)
+            if not self._ensure(pos + 4):
+                if pos < self._end():
+                    self._issue(pos, "truncated", f"{self._end() - pos} bytes of a header at the end")
+                    self.truncated_bytes += self._end() - pos
+                break
+            rec_len, key = self._header(pos)
+            end = pos + 4 + rec_len
+            plausible = self._plausible(rec_len, key)
+            if plausible and MAX_LEN[key] is None and self._ensure(end + 4):
+                # any length fits a variable-length body, so the header it leads to has to hold up: a known
+                # type that fits, or an unknown one followed by a plausible chain. A break further on is left
+                # to the record that leads to it
+                next_len, next_key = self._header(end)
+                if next_key in MAX_LEN:
+                    plausible = self._plausible(next_len, next_key)
+                else:
+                    after = end + 4 + next_len
+                    plausible = self._ensure(after) and self._chain(after, self.resync_depth)
+            if not plausible:
+                if key not in MAX_LEN and self._ensure(end) and self._chain(end, self.resync_depth):
+                    self._issue(pos, "unknown", f"record type {key >> 8}/{key & 0xFF}, {rec_len} bytes, kept")
+                    self.record_cnt += 1
+                    pos = end
+                    continue
+                self._copy(run, pos)
+                resync = self._resync(pos + 1)
+                self._issue(pos, "damaged", f"{resync - pos} bytes skipped, resynced at {resync}")
+                self.damaged_bytes += resync - pos
+                pos = run = resync
+                continue
+            if not self._ensure(end):
+                self._issue(pos, "truncated", f"{NAMES[key]} of {rec_len} bytes cut off after "
+                                              f"{self._end() - pos - 4}")
+                self.truncated_bytes += self._end() - pos
+                break
+
+            # sequence
+            self.record_cnt += 1
+            if seen_mrr:
+                self._issue(pos, "sequence", f"{NAMES[key]} after the MRR")
+            if key == MIR:
+                seen_mir = True
+            elif not seen_mir and key not in BEFORE_MIR:
+                seen_mir = True  # reported once
+                self._issue(pos, "sequence", f"{NAMES[key]} before the MIR")
+            elif key == FAR and pos:
+                self._issue(pos, "sequence", "FAR not at the start")
+            elif key in (PIR, PRR):
+                i = pos + 4 - self._base
+                head_site = (self._buf[i], self._buf[i + 1]) if rec_len >= 2 else (1, 0)
+                if key == PIR:
+                    if head_site in open_parts:
+                        self._issue(pos, "sequence", f"PIR of head {head_site[0]} site {head_site[1]} "
+                                                     f"while its part is open")
+                    open_parts.add(head_site)
+                elif head_site in open_parts:
+                    open_parts.remove(head_site)
+                else:
+                    self._issue(pos, "sequence", f"PRR of head {head_site[0]} site {head_site[1]} without a PIR")
+            elif key == MRR:
+                seen_mrr = True
+            pos = end
+            if pos - run >= self.chunk_size:
+                self._copy(run, pos)
+                run = pos
+
+        self._copy(run, pos)
+        self.size = self._end()
+        for head, site in sorted(open_parts):
+            self._issue(self.size, "sequence", f"part of head {head} site {site} has no PRR")
+        if not seen_mrr:
+            self._issue(self.size, "sequence", "no MRR")
+            if self._out is not None:
+                # FINISH_T 0, DISP_COD / USR_DESC / EXC_DESC left out
+                self._out.write(struct.pack(f"{self.endian}H2sI", 4, b'\x01\x14', 0))
@@ -0,0 +1,160 @@
+import struct
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from stdf_utils.stdf_record import StdfRecord
+from stdf_utils.stdf_scan import StdfScanner
+
+INVALID_COORD = -32768
+
+
+class Wafer:
+    def __init__(self, wafer_id: str = "", head_num: int = 1, start_t: int = 0):
+        self.wafer_id = wafer_id
+        self.head_num = head_num
+        self.start_t = start_t
+        self.wrr: dict = {}
+
+        # PRR columns, in test order
+        self.site = array("B")
+        self.x = array("h")
+        self.y = array("h")
+        self.hard_bin = array("H")
+        self.soft_bin = array("H")
+
+        # grids, filled by build(); indexed [y - y_min, x - x_min]
+        self.x_min: int = 0
+        self.y_min: int = 0
+        self.hard_bin_map: Optional[np.ndarray] = None  # final (last tested) bin, -1 where untested
+        self.soft_bin_map: Optional[np.ndarray] = None
+        self.part_count_map: Optional[np.ndarray] = None
+        self.retest_count_map: Optional[np.ndarray] = None
+
+    @property
+    def part_cnt(self) -> int:
+        return len(self.site)
+
+    def build(self):
+        x = np.frombuffer(self.x, dtype=np.int16).astype(np.int32)
+        y = np.frombuffer(self.y, dtype=np.int16).astype(np.int32)
+        valid = (x != INVALID_COORD) & (y != INVALID_COORD)
+        x, y = x[valid], y[valid]
+        hard_bin = np.frombuffer(self.hard_bin, dtype=np.uint16)[valid]
+        soft_bin = np.frombuffer(self.soft_bin, dtype=np.uint16)[valid]
+        if len(x) == 0:
+            shape = (0, 0)
+        else:
+            self.x_min, self.y_min = int(x.min()), int(y.min())
+            shape = (int(y.max()) - self.y_min + 1, int(x.max()) - self.x_min + 1)
+
+        flat = (y - self.y_min) * shape[1] + (x - self.x_min)
+        self.part_count_map = np.bincount(flat, minlength=shape[0] * shape[1]).astype(np.int32).reshape(shape)
+        self.retest_count_map = np.maximum(self.part_count_map - 1, 0)
+
+        # the last part tested on a die decides its bins
+        _, last = np.unique(flat[::-1], return_index=True)
+        last = len(flat) - 1 - last
+        self.hard_bin_map = np.full(shape, -1, dtype=np.int32)
+        self.soft_bin_map = np.full(shape, -1, dtype=np.int32)
+        self.hard_bin_map.flat[flat[last]] = hard_bin[last]
+        self.soft_bin_map.flat[flat[last]] = soft_bin[last]
+
+    def bin_table(self, kind: str = "hard") -> Dict[Tuple[int, int], int]:
+        """ {(site, bin): count} over every part tested, retests included """
+        bins = self.hard_bin if kind == "hard" else self.soft_bin
+        return dict(Counter(zip(self.site, bins)))
+
+
+class StdfWaferMap:
+    """
+    Wafer maps and bin summaries from PRR/WIR/WRR/HBR/SBR alone. Every other record, PTRs included, is
+    stepped over by StdfScanner without being decoded, and PRRs are unpacked at fixed offsets.
+    """
+    TYPES = {"Wir", "Wrr", "Prr", "Hbr", "Sbr"}
+
+    def __init__(self, stdf_path: str):
+        self.stdf_path = stdf_path
+        self.wafers: List[Wafer] = []
+        self.hbr: List[dict] = []
+        self.sbr: List[dict] = []
+
+        # read
+        scanner = StdfScanner(stdf_path, self.TYPES)
+        decoder = StdfRecord(stdf_path)
+        prr = None
+        wafer: Optional[Wafer] = None
+        for offset, key, body in scanner:
+            if prr is None:
+                prr = struct.Struct(f"{scanner.ENDIAN}xBxxxHHhh").unpack_from
+                decoder.ENDIAN = scanner.ENDIAN
+            if key == b'\x05\x14':  # Prr
+                if wafer is None:
+                    wafer = Wafer()  # no WIR: packaged parts
+                    self.wafers.append(wafer)
+                # HEAD_NUM U1, SITE_NUM U1, PART_FLG B1, NUM_TEST U2, HARD_BIN U2, SOFT_BIN U2, X I2, Y I2
+                if len(body) >= 13:
+                    site, hard_bin, soft_bin, x, y = prr(body, 0)
+                else:
+                    # truncated: fields cut off come back as None; a missing X/Y means no coordinates
+                    rec = decoder.decode(key, body)
+                    site, hard_bin, soft_bin, x, y = (
+                        default if rec[name] is None else rec[name] for name, default in (
+                            ("SITE_NUM", 0), ("HARD_BIN", 0xFFFF), ("SOFT_BIN", 0xFFFF), ("X_COORD", INVALID_COORD),
+                            ("Y_COORD", INVALID_COORD)))
+                wafer.site.append(site)
+                wafer.hard_bin.append(hard_bin)
+                wafer.soft_bin.append(soft_bin)
+                wafer.x.append(x)
+                wafer.y.append(y)
+                continue
+
+            rec = decoder.decode(key, body)
+            if key == b'\x02\n':  # Wir
+                wafer = Wafer((rec["WAFER_ID"] or b"").decode(), rec["HEAD_NUM"], rec["START_T"])
+                self.wafers.append(wafer)
+            elif key == b'\x02\x14':  # Wrr
+                if wafer is not None:
+                    wafer.wrr = rec
+                wafer = None
+            elif key == b'\x01(':  # Hbr
+                self.hbr.append(rec)
+            elif key == b'\x012':  # Sbr
+                self.sbr.append(rec)
+
+        for wafer in self.wafers:
+            wafer.build()
+
+    def bin_table(self, kind: str = "hard") -> Dict[Tuple[int, int], int]:
+        """ {(site, bin): count} over all wafers """
+        total = Counter()
+        for wafer in self.wafers:
+            total.update(wafer.bin_table(kind))
+        return dict(total)
+
+    def check(self) -> List[str]:
+        """ Cross-check the PRR counts against HBR/SBR (overall and per site) and WRR part counts """
+        problems = []
+        for kind, summary, num, cnt in (("hard", self.hbr, "HBIN_NUM", "HBIN_CNT"),
+                                        ("soft", self.sbr, "SBIN_NUM", "SBIN_CNT")):
+            if not summary:
+                continue
+            per_site = self.bin_table(kind)
+            overall = Counter()
+            for (site, bin_num), count in per_site.items():
+                overall[bin_num] += count
+            for rec in summary:
+                if rec["HEAD_NUM"] == 255:
+                    counted, where = overall[rec[num]], "all sites"
+                else:
+                    counted, where = per_site.get((rec["SITE_NUM"], rec[num]), 0), f"site {rec['SITE_NUM']}"
+                if counted != rec[cnt]:
+                    problems.append(f"{kind} bin {rec[num]} ({where}): summary {rec[cnt]}, PRR {counted}")
+
+        for wafer in self.wafers:
+            expected = wafer.wrr.get("PART_CNT")
+            if expected not in (None, 4294967295) and expected != wafer.part_cnt:
+                problems.append(f"wafer {wafer.wafer_id}: WRR PART_CNT {expected}, PRR {wafer.part_cnt}")
+        return problems
@@ -0,0 +1,196 @@
+import bz2
+import gzip
+import struct
+from typing import Callable, Dict, List, Tuple, Union
+from stdf_utils.stdf_record import RECORD_TABLE, StdfRecord
+
+SCALAR_FMT = {'U1': 'B', 'U2': 'H', 'U4': 'I', 'U8': 'Q', 'I1': 'b', 'I2': 'h', 'I4': 'i', 'R4': 'f', 'R8': 'd',
+              'C1': 'B', 'B1': 'B', 'B0': 'B'}
+KEYS: Dict[str, bytes] = {r["name"]: key for key, r in RECORD_TABLE.items()}
+
+
+def _flag(v: Union[int, str, bytes]) -> int:
+    """ B1/C1 as StdfRecord decodes them ('0x0E' / 69), or as int / one byte """
+    if isinstance(v, str):
+        return int(v, 16) if v.startswith("0x") else ord(v)
+    if isinstance(v, (bytes, bytearray)):
+        return v[0] if v else 0
+    return v
+
+
+def _text(v: Union[bytes, str]) -> bytes:
+    return v.encode("latin1") if isinstance(v, str) else bytes(v)
+
+
+class RecordEncoder:
+    """
+    Compiled encoder of one record type for one byte order. The longest run of leading fixed-size fields
+    is packed by a single struct.Struct; the rest have a packer each. Trailing fields that are None are
+    left out, as the spec allows and as StdfRecord reports fields missing from a short record, so
+    decode -> encode gives back the original bytes. A None before the last present field is written as
+    zero / empty.
+    """
+    def __init__(self, fields: Tuple[Tuple[str, str]], endian: str):
+        self.endian = endian
+        self.names = [name for name, fmt in fields]
+        self.fmts = [fmt for name, fmt in fields]
+        self.prefix_len = 0
+        while self.prefix_len < len(self.fmts) and self.fmts[self.prefix_len] in SCALAR_FMT:
+            self.prefix_len += 1
+        self.prefix = struct.Struct(endian + "".join(SCALAR_FMT[fmt] for fmt in self.fmts[:self.prefix_len]))
+        self.prefix_flags = [i for i, fmt in enumerate(self.fmts[:self.prefix_len]) if fmt in {'C1', 'B1', 'B0'}]
+        self._vn_packers: Dict[int, Callable] = {}
+        self.packers: List[Callable] = [self._compile(fmt) for fmt in self.fmts]
+
+    def __call__(self, rec: dict) -> bytes:
+        values = [rec.get(name) for name in self.names]
+        n = len(values)
+        while n and values[n - 1] is None:
+            n -= 1
+        start = 0
+        parts = []
+        if n >= self.prefix_len and None not in values[:self.prefix_len]:
+            head = values[:self.prefix_len]
+            for i in self.prefix_flags:
+                head[i] = _flag(head[i])
+            parts.append(self.prefix.pack(*head))
+            start = self.prefix_len
+        for i in range(start, n):
+            parts.append(self.packers[i](values[i], values))
+        return b"".join(parts)
+
+    def _compile(self, fmt: str) -> Callable:
+        if fmt.startswith('K'):
+            item_fmt = fmt[-2:]
+            if item_fmt == 'N1':
+                return self._nibbles
+            item = self._compile(item_fmt)
+            return lambda v, values: b"".join(item(x, values) for x in v or ())
+        if fmt in {'C1', 'B1', 'B0'}:
+            return lambda v, values: bytes((_flag(v or 0),))
+        if fmt in SCALAR_FMT:
+            pack = struct.Struct(self.endian + SCALAR_FMT[fmt]).pack
+            return lambda v, values: pack(v or 0)
+        if fmt == 'Cn':
+            return lambda v, values: self._counted(_text(v or b""))
+        if fmt.startswith('C') and fmt[1:].isdigit():
+            cnt = int(fmt[1:])
+            return lambda v, values: _text(v or b"")[:cnt].ljust(cnt, b" ")
+        if fmt == 'Bn':
+            return lambda v, values: self._counted(self._bits(v))
+        if fmt == 'Dn':
+            return self._dn
+        if fmt == 'N1':
+            return self._nibbles
+        if fmt == 'Vn':
+            return self._vn
+        raise TypeError('Unknown Format: %s' % fmt)
+
+    @staticmethod
+    def _counted(data: bytes) -> bytes:
+        return bytes((min(len(data), 255),)) + data[:255]
+
+    @staticmethod
+    def _bits(v: Union[str, bytes, None]) -> bytes:
+        """ Bn as decoded ('0x0102..') or raw bytes """
+        if v is None:
+            return b""
+        if isinstance(v, str):
+            return bytes.fromhex(v[2:] if v.startswith("0x") else v)
+        return bytes(v)
+
+    def _dn(self, v: Union[List[int], None], values=None) -> bytes:
+        """ list of bits, first bit in the least significant bit of the first byte """
+        bits = list(v or ())
+        data = bytearray((len(bits) + 7) // 8)
+        for i, bit in enumerate(bits):
+            if bit:
+                data[i >> 3] |= 1 << (i & 7)
+        return struct.pack(self.endian + "H", len(bits)) + bytes(data)
+
+    @staticmethod
+    def _nibbles(v: Union[List[int], None], values=None) -> bytes:
+        """ N1 / KxN1 as decoded: a flat list of nibbles, two per byte, low nibble first """
+        nibbles = list(v or ())
+        if len(nibbles) % 2:
+            nibbles.append(0)
+        return bytes(lo & 0x0F | (hi & 0x0F) << 4 for lo, hi in zip(nibbles[0::2], nibbles[1::2]))
+
+    def _vn(self, v: Tuple[int, any], values=None) -> bytes:
+        typ, value = v
+        if typ == 0:
+            return b"\x00"
+        packer = self._vn_packers.get(typ)
+        if packer is None:
+            packer = self._vn_packers[typ] = self._compile(StdfRecord.VN_TYPES[typ])
+        return bytes((typ,)) + packer(value, values)
+
+
+class StdfWriter:
+    """
+    Write record dicts, as StdfRecord yields them, back to STDF. Encoders are compiled once per record
+    type for the writer's byte order; records go through a `buffer_size` output buffer, and a path
+    ending with .gz or .bz2 is compressed.
+        with StdfWriter("out.stdf.gz", endian=">") as writer:
+            for rec_type, rec in StdfRecord(path):
+                writer.write(rec_type, rec)
+    The FAR is written like any other record; its CPU_TYPE should agree with `endian` (1: ">", 2: "<").
+    """
+    def __init__(self, file_path: str, endian: str = "<", buffer_size: int = 1 << 20, compresslevel: int = 6):
+        if endian not in {"<", ">"}:
+            raise ValueError(f"endian '{endian}' is not supported")
+        self.file_path = file_path
+        self.endian = endian
+        self.buffer_size = buffer_size
+        self.record_cnt: int = 0
+        self.encoders: Dict[str, RecordEncoder] = {
+            r["name"]: RecordEncoder(r["fields"], endian) for r in RECORD_TABLE.values()}
+        self._header = struct.Struct(endian + "H2s").pack
+        self._buf = bytearray()
+        if file_path.endswith(".gz"):
+            self._fp = gzip.open(file_path, "wb", compresslevel=compresslevel)
+        elif file_path.endswith(".bz2"):
+            self._fp = bz2.open(file_path, "wb", compresslevel=max(compresslevel, 1))
+        else:
+            self._fp = open(file_path, "wb")
+
+    def encode(self, rec_type: str, rec: dict) -> bytes:
+        """ Body of one record, without the 4-byte header """
+        return self.encoders[rec_type](rec)
+
+    def write(self, rec_type: str, rec: dict):
+        self.write_raw(KEYS[rec_type], self.encoders[rec_type](rec))
+
+    def write_raw(self, key: bytes, body: bytes):
+        """ key: REC_TYP and REC_SUB bytes, as in RECORD_TABLE """
+        if len(body) > 0xFFFF:
+            raise ValueError(f"record body of {len(body)} bytes does not fit REC_LEN")
+        self._buf += self._header(len(body), key)
+        self._buf += body
+        self.record_cnt += 1
+        if len(self._buf) >= self.buffer_size:
+            self.flush()
+
+    def write_records(self, data: bytes, count: int):
+        """ `count` records already framed with their headers, in the writer's byte order """
+        self._buf += data
+        self.record_cnt += count
+        if len(self._buf) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._fp.write(self._buf)
+            self._buf = bytearray()
+
+    def close(self):
+        if self._fp is not None:
+            self.flush()
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,6 +1,16 @@
+import json
+import os
+import re
 import struct
+import sys
 import bz2
 import gzip
+import zlib
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+# sidecar of a multi-member gzip: [[compressed_offset, uncompressed_offset], ...] of every member start
+GZIP_INDEX_SUFFIX = ".gzidx"
 
 
 def unp(endian: str, fmt: str, buf: bytes):
@@ -8,22 +18,123 @@ def unp(endian: str, fmt: str, buf: bytes):
     return r
 
 
+def parse_size(size: str) -> int:
+    """ "2G", "512M", "64k" or plain bytes """
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*", str(size), flags=re.I)
+    if m is None:
+        raise ValueError(f"size '{size}' is not supported")
+    return int(float(m.group(1)) * 1024 ** " kmgt".index(m.group(2).lower() or " "))
+
+
+def peak_rss() -> Optional[int]:
+    """ Peak resident set size of this process in bytes, None where it cannot be read """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024  # bytes on macOS, KiB elsewhere
+
+
+def build_gzip_index(file_path: str, chunk_size: int = 1 << 20) -> List[Tuple[int, int]]:
+    """ Find the member boundaries of a gzip file and save them next to it as seek points """
+    points = [(0, 0)]
+    d = zlib.decompressobj(wbits=31)
+    c_pos = u_pos = 0  # offsets of `data` below
+    with open(file_path, "rb") as f_in:
+        while chunk := f_in.read(chunk_size):
+            data = chunk
+            while data:
+                u_pos += len(d.decompress(data))
+                if not d.eof:
+                    c_pos += len(data)
+                    break
+                c_pos += len(data) - len(d.unused_data)
+                data = d.unused_data
+                if not data.lstrip(b"\0"):  # trailing padding
+                    c_pos += len(data)
+                    break
+                points.append((c_pos, u_pos))
+                d = zlib.decompressobj(wbits=31)
+    if points[-1][1] == u_pos and len(points) > 1:
+        points.pop()  # the last member ended exactly at EOF
+    with open(file_path + GZIP_INDEX_SUFFIX, "w") as f_out:
+        json.dump(points, f_out)
+    return points
+
+
+def read_gzip_index(file_path: str) -> Optional[List[Tuple[int, int]]]:
+    index_path = file_path + GZIP_INDEX_SUFFIX
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(file_path):
+        return None
+    with open(index_path) as f_in:
+        return [tuple(point) for point in json.load(f_in)]
+
+
 class OpenFile:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, offset: int = 0, wrap_raw=None):
+        """
+        offset: uncompressed position to start reading from
+        wrap_raw: called with the raw (compressed) file object, returns the one to read from instead
+        """
         self.file_path = file_path
+        self.offset = offset
+        self.wrap_raw = wrap_raw
         self.fp: any = None
+        self._raw: any = None
 
     def __enter__(self):
+        skip = self.offset
         if self.file_path.endswith(".gz"):
-            self.fp = gzip.open(self.file_path)
+            index = read_gzip_index(self.file_path) if self.offset else None
+            if index:
+                # start decompressing at the closest member boundary instead of the beginning of the file
+                c_offset, u_offset = index[bisect_right([u for _, u in index], self.offset) - 1]
+                self._raw = self._open_raw()
+                self._raw.seek(c_offset)
+                self.fp = gzip.GzipFile(fileobj=self._raw, mode="rb")
+                skip = self.offset - u_offset
+            elif self.wrap_raw is not None:
+                self._raw = self._open_raw()
+                self.fp = gzip.GzipFile(fileobj=self._raw, mode="rb")
+            else:
+                self.fp = gzip.open(self.file_path)
 
         elif self.file_path.endswith(".bz2"):
-            self.fp = bz2.open(self.file_path)
+            if self.wrap_raw is not None:
+                self._raw = self._open_raw()
+                self.fp = bz2.BZ2File(self._raw)
+            else:
+                self.fp = bz2.open(self.file_path)
 
         else:
-            self.fp = open(self.file_path, "rb")
+            self.fp = self._open_raw()
 
+        if skip:
+            self.fp.seek(skip)  # compressed streams decompress forward
         return self.fp
 
+    def _open_raw(self):
+        raw = open(self.file_path, "rb")
+        return raw if self.wrap_raw is None else self.wrap_raw(raw)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.fp.close()
+        if self._raw is not None:
+            self._raw.close()
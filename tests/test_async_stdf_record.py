@@ -0,0 +1,61 @@
+import os
+import asyncio
+from unittest import TestCase
+from stdf_utils import AsyncStdfRecord, StdfRecord, StdfScanner, parse_stats
+
+
+class TestAsyncStdfRecord(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+
+    def test_async_for(self):
+        async def count():
+            n = 0
+            async for rec_type, rec in AsyncStdfRecord(self.f, {"Prr"}):
+                self.assertEqual("Prr", rec_type)
+                n += 1
+            return n
+
+        expected = sum(1 for _ in StdfRecord(self.f, {"Prr"}))
+        self.assertEqual(expected, asyncio.run(count()))
+
+    def test_concurrent_streams(self):
+        async def count(f):
+            n = 0
+            async for batch in AsyncStdfRecord(f, {"Ptr"}, batch_size=1000).batches():
+                n += len(batch)
+            return n
+
+        async def main():
+            return await asyncio.gather(count(self.f), count(self.f))
+
+        a, b = asyncio.run(main())
+        self.assertEqual(a, b)
+        self.assertGreater(a, 0)
+
+    def test_early_exit(self):
+        async def first_records():
+            async with AsyncStdfRecord(self.f, max_batches=1, batch_size=10) as records:
+                out = []
+                async for item in records:
+                    out.append(item)
+                    if len(out) == 5:
+                        break
+            return out
+
+        self.assertEqual(5, len(asyncio.run(first_records())))
+
+    def test_early_exit_narrow_types(self):
+        # after the FAR no record is yielded before the MRR; the reader still stops once closed
+        async def first_record():
+            async with AsyncStdfRecord(self.f, {"Far", "Mrr"}, batch_size=1) as records:
+                async for item in records:
+                    return item
+
+        parse_stats.default_stats = parse_stats.ParseStats()
+        try:
+            self.assertEqual("Far", asyncio.run(first_record())[0])  # waits for the reader thread
+            read_cnt = sum(parse_stats.default_stats.counts.values())
+        finally:
+            parse_stats.default_stats = None
+        self.assertLess(read_cnt, sum(1 for _ in StdfScanner(self.f)) // 2)
@@ -0,0 +1,47 @@
+import os
+import gzip
+from unittest import TestCase
+from stdf_utils import StdfRecord, parse_stats
+from stdf_utils.parse_stats import ParseStats
+
+
+class TestParseStats(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+
+    def test_counts(self):
+        stats = ParseStats()
+        records = list(StdfRecord(self.f, {"Ptr", "Prr"}, stats=stats))
+        self.assertEqual(records, list(StdfRecord(self.f, {"Ptr", "Prr"})))
+        self.assertEqual(54123, stats.counts["Ptr"])
+        self.assertEqual(1619, stats.counts["Prr"])
+        self.assertEqual(810, stats.counts["Gdr"])
+        self.assertEqual(len(records), stats.yielded)
+        with gzip.open(self.f) as f_in:
+            self.assertEqual(len(f_in.read()), sum(stats.bytes.values()))
+        self.assertGreater(stats.decode_total("Ptr"), 0)
+        self.assertGreaterEqual(stats.read_s, stats.io_s)
+        d = stats.to_dict()
+        self.assertEqual(1, d["files"])
+        self.assertEqual("Ptr", next(iter(d["types"])))
+        self.assertIn("Ptr", stats.table())
+
+    def test_sample(self):
+        stats = ParseStats(sample=100)
+        for _ in StdfRecord(self.f, stats=stats):
+            pass
+        self.assertEqual(54123, stats.counts["Ptr"])
+        self.assertLess(stats.timed["Ptr"], 1000)
+        self.assertGreater(stats.decode_total("Ptr"), 0)
+
+    def test_default_stats(self):
+        parse_stats.default_stats = ParseStats()
+        try:
+            for _ in StdfRecord(self.f, {"Mir"}):
+                pass
+            for _ in StdfRecord(self.f, {"Mrr"}):
+                pass
+            self.assertEqual(2, parse_stats.default_stats.files)
+            self.assertEqual(2, parse_stats.default_stats.yielded)
+        finally:
+            parse_stats.default_stats = None
@@ -0,0 +1,64 @@
+import os
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+from stdf_utils import PartIndex, StdfPatch, StdfPerPart, StdfToCsv, StdfToSql
+from stdf_utils.sql_conn import SqlConn
+
+
+class TestPartIndex(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+        self.part_index = PartIndex([self.f])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_index(self):
+        self.assertEqual(1619, self.part_index.part_cnt)
+        self.assertEqual(1619 - 163, self.part_index.die_cnt)
+        self.assertEqual(163, sum(die.count - 1 for key, die in self.part_index.retested()))
+        for key, die in self.part_index.retested():
+            self.assertLess(die.first.order, die.final.order)
+        self.assertGreaterEqual(self.part_index.yield_("final"), self.part_index.yield_("first"))
+
+    def test_per_part(self):
+        parts = [td for td in StdfPerPart(self.f, part_index=self.part_index) if td["prr"]]
+        self.assertEqual(self.part_index.die_cnt, len(parts))
+        self.assertEqual(sorted(part.part_id for part in self.part_index.parts("final")),
+                         sorted(td["prr"]["part_id"] for td in parts))
+
+    def test_csv(self):
+        csv_path = os.path.join(self.tmp_dir, "lot3.csv")
+        stdf_to_csv = StdfToCsv(self.f, csv_path, part_index=self.part_index, keep="first")
+        execs = sum(len(site_data) for sites in stdf_to_csv.ptr_container.data.values() for site_data in sites)
+        self.assertLess(execs, 54123)
+        self.assertTrue(os.path.exists(csv_path))
+
+    def test_truncated_prr(self):
+        def cut_first_prr(rec_type: str, record: dict, buffer: bytes) -> bytes:
+            if cut:
+                return buffer
+            cut.append(record)
+            return struct.pack(">H", 9) + buffer[2:13]  # X_COORD and after cut off, PART_ID with them
+        cut = []
+        mod_path = os.path.join(self.tmp_dir, "lot3_mod.stdf")
+        StdfPatch(self.f, mod_path, patch_func=cut_first_prr, patch_types={"Prr"})
+        part_index = PartIndex([mod_path])
+        self.assertEqual((1619, 1), (part_index.part_cnt, part_index.short_prr_cnt))
+        self.assertIn(("lot3_mod", 0), part_index.kept("first"))
+        parts = [td for td in StdfPerPart(mod_path, part_index=part_index) if td["prr"]]
+        self.assertEqual(part_index.die_cnt, len(parts))
+        StdfToCsv(mod_path, os.path.join(self.tmp_dir, "lot3_mod.csv"), part_index=part_index)
+
+    def test_sql(self):
+        sql_conn = SqlConn(os.path.join(self.tmp_dir, "local.db"))
+        StdfToSql(self.f, sql_conn=sql_conn)
+        self.part_index.to_sql(sql_conn)
+        for view in ("PartFirst", "PartFinal"):
+            count, = sql_conn.cursor.execute(f"SELECT COUNT(*) FROM {view}").fetchone()
+            self.assertEqual(self.part_index.die_cnt, count)
+        hard_bin, = sql_conn.cursor.execute("SELECT hard_bin FROM PartFinal WHERE test_count > 1").fetchone()
+        self.assertIsNotNone(hard_bin)
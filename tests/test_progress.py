@@ -0,0 +1,49 @@
+import os
+import gzip
+import shutil
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfRecord, StdfIngest
+from stdf_utils.parse_stats import ParseStats
+from stdf_utils.progress import Progress
+
+
+class TestProgress(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.infos = []
+
+    def test_gzip(self):
+        progress = Progress(self.infos.append, interval=0.0, check_every=4096)
+        stats = ParseStats()
+        for _ in StdfRecord(self.f, {"Mir"}, progress=progress, stats=stats):
+            pass
+        with gzip.open(self.f) as f_in:
+            size = len(f_in.read())
+        self.assertEqual(size, progress.isize)
+        self.assertGreater(len(self.infos), 1)
+        fractions = [info["fraction"] for info in self.infos]
+        self.assertEqual(sorted(fractions), fractions)
+        last = self.infos[-1]
+        self.assertTrue(last["done"])
+        self.assertEqual((1.0, 0.0, size), (last["fraction"], last["eta_s"], last["bytes"]))
+        self.assertEqual(sum(stats.counts.values()), last["records"])
+
+    def test_throttle(self):
+        progress = Progress(self.infos.append, interval=3600.0)
+        for _ in StdfRecord(self.f, {"Mir"}, progress=progress):
+            pass
+        self.assertEqual([True], [info["done"] for info in self.infos])
+
+    def test_batch(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for name in ("lot2.stdf.gz", "lot3.stdf.gz"):
+                shutil.copy(os.path.join(os.path.dirname(self.f), name), tmp_dir)
+            StdfIngest(tmp_dir, progress=Progress(self.infos.append, interval=0.0))
+            done = [info for info in self.infos if info["done"]]
+            self.assertEqual(2, len(done))
+            self.assertLess(done[0]["batch_fraction"], 1.0)
+            self.assertAlmostEqual(1.0, done[1]["batch_fraction"])
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+from unittest import TestCase
+import numpy as np
+from stdf_utils import ResultStore, StdfPatch, StdfRecord
+
+
+class TestResultStore(TestCase):
+    def setUp(self) -> None:
+        self.f2 = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot2.stdf.gz"))
+        self.f3 = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_append(self):
+        store = ResultStore(self.tmp_dir)
+        self.assertEqual([self.f3], store.add([self.f3]))
+        count = len(store.results(1000))
+        store.close()
+
+        # reopen and append another file; already stored files are skipped
+        store = ResultStore(self.tmp_dir)
+        self.assertEqual([self.f2], store.add([self.f3, self.f2]))
+        self.assertEqual(1619 + 1569, store.part_cnt)
+        self.assertEqual(54123 + 52403, sum(t["count"] for t in store.tests().values()))
+
+        expected = [r["RESULT"] for f in (self.f3, self.f2) for _, r in StdfRecord(f, {"Ptr"}) if r["TEST_NUM"] == 1000]
+        results = store.results(1000)
+        self.assertIsInstance(results, np.memmap)
+        np.testing.assert_array_equal(np.array(expected, dtype=np.float32), results)
+        self.assertEqual(count, int((store.parts()["file_id"][store.rows(1000)] == 1).sum()))
+
+        # plain np.load sees the same arrays
+        np.testing.assert_array_equal(results, np.load(os.path.join(self.tmp_dir, "tests", "1000.npy")))
+        self.assertEqual(0, len(store.results(1)))
+        store.close()
+
+    def test_interrupted_append(self):
+        store = ResultStore(self.tmp_dir)
+        store.append(self.f3)
+        store.conn.execute("CREATE TRIGGER fail BEFORE INSERT ON StoreFile "
+                           "BEGIN SELECT RAISE(ABORT, 'interrupted'); END")
+        with self.assertRaises(sqlite3.IntegrityError):
+            store.append(self.f2)
+        # arrays are written past the catalog, np.load stops at what is committed
+        self.assertEqual(1619, store.part_cnt)
+        self.assertEqual(store.part_cnt, len(np.load(os.path.join(self.tmp_dir, "parts.npy"))))
+        for test_num, test in store.tests().items():
+            self.assertEqual(test["count"], len(np.load(os.path.join(self.tmp_dir, "tests", f"{test_num}.npy"))))
+        store.conn.execute("DROP TRIGGER fail")
+        self.assertTrue(store.append(self.f2))
+        self.assertEqual(1619 + 1569, len(np.load(os.path.join(self.tmp_dir, "parts.npy"))))
+        store.close()
+
+    def test_truncated_prr(self):
+        def cut_first_prr(rec_type: str, record: dict, buffer: bytes) -> bytes:
+            if cut:
+                return buffer
+            cut.append(record)
+            return struct.pack(">H", 9) + buffer[2:13]  # X_COORD and after cut off
+        cut = []
+        mod_path = os.path.join(self.tmp_dir, "lot3_mod.stdf")
+        StdfPatch(self.f3, mod_path, patch_func=cut_first_prr, patch_types={"Prr"})
+        store = ResultStore(os.path.join(self.tmp_dir, "store"))
+        store.append(mod_path)
+        self.assertEqual(1619, store.part_cnt)
+        first = store.parts()[0]
+        self.assertEqual((-1, -32768, -32768), (first["part_id"], first["x"], first["y"]))
+        self.assertEqual(cut[0]["HARD_BIN"], first["hard_bin"])
+        store.close()
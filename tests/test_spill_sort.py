@@ -0,0 +1,21 @@
+import os
+import random
+import tempfile
+from unittest import TestCase
+from stdf_utils.spill_sort import SpillSorter
+
+
+class TestSpillSorter(TestCase):
+    def test_merge_runs(self):
+        tmp_dir = tempfile.mkdtemp()
+        rng = random.Random(7)
+        rows = [(rng.randrange(100), i, rng.random()) for i in range(20000)]
+        with SpillSorter("IQd", max_memory=0, tmp_dir=tmp_dir) as sorter:
+            for row in rows:
+                sorter.push(row)
+            self.assertEqual(4, len(sorter.runs))
+            self.assertEqual(sorted(rows), list(sorter))
+            groups = {key: len(list(group)) for key, group in sorter.groups(1)}
+            self.assertEqual(len(rows), sum(groups.values()))
+        self.assertEqual([], os.listdir(tmp_dir))
+        os.rmdir(tmp_dir)
@@ -0,0 +1,41 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from stdf_utils import stdf_bench
+from stdf_utils.stdf_bench import StdfBench, compare
+
+
+class TestStdfBench(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        stdf_bench.SIZES["tiny"] = {"parts": 40, "tests": 20}
+
+    def tearDown(self) -> None:
+        stdf_bench.SIZES.pop("tiny")
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run(self):
+        bench = StdfBench(["StdfRecord", "StdfPatch"], ["tiny"], ["", ".gz"], repeat=1,
+                          data_dir=os.path.join(self.tmp_dir, "data"))
+        self.assertEqual(["StdfPatch/tiny/gz", "StdfPatch/tiny/stdf", "StdfRecord/tiny/gz", "StdfRecord/tiny/stdf"],
+                         sorted(bench.results))
+        result = bench.results["StdfRecord/tiny/stdf"]
+        self.assertEqual(os.path.getsize(os.path.join(self.tmp_dir, "data", "bench_tiny.stdf")), result["bytes"])
+        self.assertGreater(result["records_per_s"], 0)
+        json_path = os.path.join(self.tmp_dir, "bench.json")
+        bench.save(json_path)
+        self.assertEqual([], compare(json_path, json_path))
+
+    def test_compare(self):
+        paths = []
+        for name, rate in (("baseline", 1000.0), ("current", 850.0)):
+            paths.append(os.path.join(self.tmp_dir, f"{name}.json"))
+            with open(paths[-1], "w") as f_out:
+                json.dump({"meta": {}, "results": {"StdfRecord/small/gz": {"records_per_s": rate},
+                                                   "StdfToCsv/small/gz": {"records_per_s": 100.0}}}, f_out)
+        regressions = compare(*paths, threshold=0.1)
+        self.assertEqual(["StdfRecord/small/gz"], [r["benchmark"] for r in regressions])
+        self.assertAlmostEqual(-0.15, regressions[0]["change"])
+        self.assertEqual([], compare(*paths, threshold=0.2))
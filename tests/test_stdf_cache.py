@@ -0,0 +1,70 @@
+import os
+import shutil
+import struct
+import tempfile
+import time
+import threading
+from unittest import TestCase
+from stdf_utils import StdfCache, StdfPatch
+from stdf_utils.stdf_cache import INVALID_COORD, load_columns
+
+
+class TestStdfCache(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+
+    def test_summary_hit_miss(self):
+        cache = StdfCache()
+        summary = cache.summary(self.f)
+        self.assertEqual(1619, summary["part_cnt"])
+        self.assertIs(summary, cache.summary(self.f))
+        self.assertEqual(1, cache.stats["misses"])
+        self.assertEqual(1, cache.stats["hits"])
+
+    def test_columns(self):
+        columns = StdfCache().columns(self.f)
+        n_parts = len(columns["parts"]["part_id"])
+        self.assertEqual(1619, n_parts)
+        for column in columns["tests"].values():
+            self.assertEqual(n_parts, len(column))
+
+    def test_truncated_prr(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            def cut_first_prr(rec_type: str, record: dict, buffer: bytes) -> bytes:
+                if cut:
+                    return buffer
+                cut.append(record)
+                return struct.pack(">H", 5) + buffer[2:9]  # HARD_BIN and after cut off
+            cut = []
+            mod_path = os.path.join(tmp_dir, "lot3_mod.stdf")
+            StdfPatch(self.f, mod_path, patch_func=cut_first_prr, patch_types={"Prr"})
+            parts = load_columns(mod_path)["parts"]
+            self.assertEqual(1619, len(parts["x"]))
+            self.assertEqual((INVALID_COORD, 0xFFFF), (parts["x"][0], parts["hard_bin"][0]))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_eviction(self):
+        cache = StdfCache(max_bytes=4096, loaders={"a": lambda p: b"a" * 3000, "b": lambda p: b"b" * 3000})
+        cache.get(self.f, "a")
+        cache.get(self.f, "b")
+        self.assertEqual(1, cache.stats["evictions"])
+        self.assertEqual(1, cache.stats["entries"])
+
+    def test_coalesce(self):
+        calls = []
+
+        def slow_loader(path):
+            calls.append(path)
+            time.sleep(0.2)
+            return path
+
+        cache = StdfCache(loaders={"slow": slow_loader})
+        threads = [threading.Thread(target=cache.get, args=(self.f, "slow")) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, cache.stats["misses"])
@@ -0,0 +1,88 @@
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfDiff, StdfPatch
+from stdf_utils.stdf_diff import format_key
+
+
+class TestStdfDiff(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def patch(self, patch_func, patch_types: set) -> str:
+        mod_path = os.path.join(self.tmp_dir, "lot3_mod.stdf")
+        StdfPatch(self.f, mod_path, patch_func=patch_func, patch_types=patch_types)
+        return mod_path
+
+    def test_identical(self):
+        stdf_diff = StdfDiff(self.f, self.f)
+        self.assertTrue(stdf_diff.identical)
+        self.assertEqual(0, stdf_diff.decoded_cnt)
+        self.assertEqual(stdf_diff.old_record_cnt, stdf_diff.same_cnt)
+        self.assertEqual(1619, stdf_diff.new_part_cnt)
+
+    def test_tolerance(self):
+        def patch_func(rec_type: str, record: dict, buffer: bytes) -> bytes:
+            if record["TEST_NUM"] != 1000:
+                return buffer
+            result, = struct.unpack_from(">f", buffer, 12)
+            return buffer[:12] + struct.pack(">f", result * (1 + 1e-6)) + buffer[16:]
+        mod_path = self.patch(patch_func, {"Ptr"})
+
+        stdf_diff = StdfDiff(self.f, mod_path)
+        self.assertFalse(stdf_diff.identical)
+        self.assertEqual({"RESULT"}, {d.field for d in stdf_diff.diffs})
+        self.assertEqual({("Ptr", (1000,))}, {(d.key[1], d.key[2]) for d in stdf_diff.diffs})
+        self.assertEqual(stdf_diff.decoded_cnt, stdf_diff.changed_cnt)
+
+        stdf_diff = StdfDiff(self.f, mod_path, rel_tol=1e-5)
+        self.assertTrue(stdf_diff.identical)
+        self.assertLess(0, stdf_diff.decoded_cnt)
+
+    def test_removed_and_ignored(self):
+        def patch_func(rec_type: str, record: dict, buffer: bytes) -> bytes:
+            if rec_type == "Gdr":
+                return b''
+            return buffer[:4] + struct.pack(">I", record["FINISH_T"] + 60) + buffer[8:]
+        mod_path = self.patch(patch_func, {"Gdr", "Mrr"})
+
+        stdf_diff = StdfDiff(self.f, mod_path)
+        self.assertEqual(810, stdf_diff.removed_cnt)
+        self.assertEqual(0, stdf_diff.added_cnt)
+        self.assertEqual([(None, "Mrr", (), 0)], stdf_diff.changed)
+        self.assertEqual("Gdr", format_key(stdf_diff.removed[0]))
+        self.assertEqual("Gdr #2", format_key(stdf_diff.removed[1]))
+
+        stdf_diff = StdfDiff(self.f, mod_path, ignore={"Mrr.FINISH_T"}, types={"Mrr"})
+        self.assertTrue(stdf_diff.identical)
+
+    def test_part_removed(self):
+        # the records of the 10th part (its PIR, PTRs and PRR on one head / site) are cut out
+        with gzip.open(self.f) as f_in:
+            data = f_in.read()
+        records, pos = [], 0
+        while pos < len(data):
+            rec_len = struct.unpack(">H", data[pos:pos + 2])[0]
+            records.append(data[pos:pos + 4 + rec_len])
+            pos += 4 + rec_len
+        prr = [i for i, r in enumerate(records) if r[2:4] == b'\x05\x14'][9]
+        head_site = records[prr][4:6]
+        pir = max(i for i, r in enumerate(records[:prr]) if r[2:4] == b'\x05\n' and r[4:6] == head_site)
+        part = {i for i in range(pir, prr + 1) if records[i][2:4] in (b'\x05\n', b'\x05\x14') and
+                records[i][4:6] == head_site or records[i][2:4] == b'\x0f\n' and records[i][8:10] == head_site}
+        mod_path = os.path.join(self.tmp_dir, "lot3_mod.stdf")
+        with open(mod_path, "wb") as f_out:
+            f_out.write(b"".join(r for i, r in enumerate(records) if i not in part))
+
+        stdf_diff = StdfDiff(self.f, mod_path)
+        self.assertEqual((len(part), 0, 0), (stdf_diff.removed_cnt, stdf_diff.added_cnt, stdf_diff.changed_cnt))
+        self.assertEqual(1, len({key[0] for key in stdf_diff.removed}))
+        self.assertEqual(1618, stdf_diff.new_part_cnt)
+        self.assertEqual(len(part), sum(line.startswith("- part ") for line in stdf_diff.report()))
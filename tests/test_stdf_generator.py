@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from unittest import TestCase
+from stdf_utils import StdfGenerator, StdfRecord, StdfSummary, PartIndex, StdfToCsv
+
+
+class TestStdfGenerator(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_records(self):
+        out_path = os.path.join(self.tmp_dir, "synth.stdf")
+        g = StdfGenerator(out_path, parts=100, sites=4, tests=40, mpr_ratio=0.1, ftr_ratio=0.1, noise_rate=0.5,
+                          retest_rate=0.1, wafers=2, endian=">", seed=7)
+        records = list(StdfRecord(out_path))
+        cnt = Counter(rec_type for rec_type, rec in records)
+        self.assertEqual(g.record_cnt, len(records))
+        self.assertEqual(110, g.part_cnt)
+        self.assertEqual(10, g.retest_cnt)
+        self.assertEqual(g.part_cnt, cnt["Pir"])
+        self.assertEqual(g.part_cnt, cnt["Prr"])
+        self.assertEqual(g.part_cnt * 40, cnt["Ptr"] + cnt["Mpr"] + cnt["Ftr"])
+        self.assertEqual(2, cnt["Wir"])
+        self.assertEqual(cnt["Dtr"], cnt["Gdr"])
+        self.assertEqual(("Far", "Mir"), (records[0][0], records[1][0]))
+        self.assertEqual("Mrr", records[-1][0])
+
+        # the first touchdown has the limits, later PTRs leave them out
+        ptr = [rec for rec_type, rec in records if rec_type == "Ptr"]
+        self.assertIsNotNone(ptr[0]["LO_LIMIT"])
+        self.assertIsNone(ptr[-1]["LO_LIMIT"])
+
+        stdf_summary = StdfSummary(out_path)
+        self.assertEqual((g.part_cnt, g.good_cnt), (stdf_summary.part_cnt, stdf_summary.good_cnt))
+        part_index = PartIndex([out_path])
+        self.assertEqual(100, part_index.die_cnt)
+
+    def test_deterministic(self):
+        paths = [os.path.join(self.tmp_dir, f"synth{i}.stdf") for i in range(3)]
+        for path, seed in zip(paths, (1, 1, 2)):
+            StdfGenerator(path, parts=50, tests=20, noise_rate=0.1, seed=seed)
+        data = [open(path, "rb").read() for path in paths]
+        self.assertEqual(data[0], data[1])
+        self.assertNotEqual(data[0], data[2])
+
+    def test_compressed(self):
+        for ext in (".stdf.gz", ".stdf.bz2"):
+            out_path = os.path.join(self.tmp_dir, "synth" + ext)
+            g = StdfGenerator(out_path, parts=30, sites=3, tests=10, wafers=0)
+            self.assertEqual(g.record_cnt, sum(1 for _ in StdfRecord(out_path)))
+            csv_path = os.path.join(self.tmp_dir, "synth.csv")
+            StdfToCsv(out_path, csv_path=csv_path)
+            with open(csv_path) as f_in:
+                self.assertEqual(1 + 10 * 3, len(f_in.readlines()))
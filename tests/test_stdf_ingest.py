@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfIngest
+from stdf_utils.__main__ import main
+
+
+class TestStdfIngest(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data = os.path.abspath(os.path.join(__file__, os.pardir, "data"))
+        for name in ("lot2.stdf.gz", "lot3.stdf.gz"):
+            shutil.copy(os.path.join(self.data, name), os.path.join(self.tmp_dir, name))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_incremental(self):
+        self.assertEqual(2, len(StdfIngest(self.tmp_dir, dry_run=True).pending))
+        self.assertEqual(2, len(StdfIngest(self.tmp_dir).ingested))
+        self.assertEqual([], StdfIngest(self.tmp_dir, dry_run=True).pending)
+
+        # touched but same content: fingerprint matches, nothing re-ingested
+        lot3 = os.path.join(self.tmp_dir, "lot3.stdf.gz")
+        os.utime(lot3, ns=(0, 0))
+        stdf_ingest = StdfIngest(self.tmp_dir)
+        self.assertEqual([("changed", os.path.abspath(lot3))], stdf_ingest.pending)
+        self.assertEqual([], stdf_ingest.ingested)
+        self.assertEqual([], StdfIngest(self.tmp_dir, dry_run=True).pending)
+
+    def test_replace_changed(self):
+        StdfIngest(self.tmp_dir)
+        # same name, different content
+        lot3 = os.path.join(self.tmp_dir, "lot3.stdf.gz")
+        shutil.copy(os.path.join(self.data, "lot2.stdf.gz"), lot3)
+        stdf_ingest = StdfIngest(self.tmp_dir)
+        self.assertEqual([os.path.abspath(lot3)], stdf_ingest.ingested)
+        cursor = stdf_ingest.sql_conn.cursor
+        self.assertEqual(2, cursor.execute("SELECT COUNT(*) FROM Stdf").fetchone()[0])
+        self.assertEqual(2 * 1569, cursor.execute("SELECT COUNT(*) FROM Part").fetchone()[0])
+
+    def test_duplicate_name_not_replaced(self):
+        dup_dir = os.path.join(self.tmp_dir, "dup")
+        os.mkdir(dup_dir)
+        dup = os.path.join(dup_dir, "lot3.stdf.gz")
+        shutil.copy(os.path.join(self.data, "lot3.stdf.gz"), dup)
+        self.assertEqual(2, len(StdfIngest(self.tmp_dir).ingested))
+        # the duplicate changes: it never owned the loaded lot3, so that stays as it is
+        shutil.copy(os.path.join(self.data, "lot2.stdf.gz"), dup)
+        stdf_ingest = StdfIngest(self.tmp_dir)
+        self.assertEqual([("changed", os.path.abspath(dup))], stdf_ingest.pending)
+        self.assertEqual([], stdf_ingest.ingested)
+        cursor = stdf_ingest.sql_conn.cursor
+        self.assertEqual(1569 + 1619, cursor.execute("SELECT COUNT(*) FROM Part").fetchone()[0])
+
+    def test_tmp_dir(self):
+        # spilled blob runs go to tmp_dir: a missing one fails every file
+        missing = os.path.join(self.tmp_dir, "missing")
+        self.assertEqual(1, main(["--max-memory", "0", "--tmp-dir", missing, "ingest", self.tmp_dir,
+                                  "--storage", "blob"]))
+        spill_dir = os.path.join(self.tmp_dir, "spill")
+        os.mkdir(spill_dir)
+        stdf_ingest = StdfIngest(self.tmp_dir, storage="blob", max_memory=0, tmp_dir=spill_dir)
+        self.assertEqual((2, []), (len(stdf_ingest.ingested), stdf_ingest.failed))
+        self.assertEqual([], os.listdir(spill_dir))
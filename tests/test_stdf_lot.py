@@ -0,0 +1,82 @@
+import os
+import shutil
+import statistics
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfLot, StdfRecord
+from stdf_utils import stdf_lot
+from stdf_utils.stdf_lot import aggregate_file
+
+
+class TestStdfLot(TestCase):
+    def setUp(self) -> None:
+        self.f2 = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot2.stdf.gz"))
+        self.f3 = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_single_file(self):
+        agg = aggregate_file(self.f3)
+        self.assertEqual(1619, agg.part_cnt)
+        self.assertEqual(54123, sum(stats.count for stats in agg.stats.values()))
+        results = [r["RESULT"] for _, r in StdfRecord(self.f3, {"Ptr"}) if r["TEST_NUM"] == 1550]
+        stats = agg.rollup()[("*", -1, 1550)]
+        self.assertEqual(len(results), stats.count)
+        self.assertAlmostEqual(min(results), stats.min)
+        self.assertAlmostEqual(sum(results) / len(results), stats.mean, places=4)
+
+    def test_merge(self):
+        lot = StdfLot([self.f2, self.f3], jobs=2)
+        self.assertEqual(1569 + 1619, lot.part_cnt)
+        single = aggregate_file(self.f2).merge(aggregate_file(self.f3))
+        self.assertEqual(single.to_dict(), lot.to_dict())
+
+    def test_cache(self):
+        first = aggregate_file(self.f3, cache_dir=self.tmp_dir)
+        self.assertEqual(1, len(os.listdir(self.tmp_dir)))
+        cached = aggregate_file(self.f3, cache_dir=self.tmp_dir)
+        self.assertEqual(first.to_dict(), cached.to_dict())
+
+    def test_histogram_merge(self):
+        a, b = stdf_lot.TestStats(0.0, 1.0), stdf_lot.TestStats(0.0, 1.0)
+        a.push(0.5, False)
+        b.push(2.0, True)
+        merged = stdf_lot.TestStats.from_dict(a.to_dict()).merge(b)
+        self.assertEqual({10: 1, 40: 1}, merged.hist)
+        self.assertEqual(1, merged.fails)
+        self.assertIsNone(merged.merge(stdf_lot.TestStats(0.0, 2.0)).hist)
+
+    def test_nonfinite(self):
+        stats = stdf_lot.TestStats(0.0, 1.0)
+        for value in (0.5, float("nan"), float("inf"), -float("inf")):
+            stats.push(value, value != 0.5)
+        self.assertEqual((1, 3, 3), (stats.count, stats.nonfinite, stats.fails))
+        self.assertEqual({10: 1}, stats.hist)
+        self.assertEqual(0.5, stats.mean)
+        merged = stdf_lot.TestStats.from_dict(stats.to_dict()).merge(stats)
+        self.assertEqual((2, 6), (merged.count, merged.nonfinite))
+
+    def test_test_stats_large_mean(self):
+        values = [2.4e9 + 0.001 * i for i in range(1000)]
+        expected = statistics.pstdev(values)
+        a, b = stdf_lot.TestStats(), stdf_lot.TestStats()
+        for i, value in enumerate(values):
+            (a if i % 3 else b).push(value, False)
+        merged = stdf_lot.TestStats.from_dict(a.to_dict()).merge(stdf_lot.TestStats.from_dict(b.to_dict()))
+        self.assertAlmostEqual(expected, merged.sigma, delta=expected * 1e-3)
+        self.assertAlmostEqual(statistics.mean(values), merged.mean, delta=1e-3)
+
+    def test_limits_per_test(self):
+        # limits come from the test's first PTR, so every site of a test has them and a histogram
+        agg = aggregate_file(self.f3)
+        for test_num in {test_num for tester, site, test_num in agg.stats}:
+            per_site = [stats for (tester, site, t), stats in agg.stats.items() if t == test_num]
+            self.assertEqual(1, len({(stats.lo_lim, stats.hi_lim) for stats in per_site}))
+        # OPT_FLAG 0x4E: no low limit
+        no_low = {r["TEST_NUM"] for _, r in StdfRecord(self.f3, {"Ptr"}) if int(r["OPT_FLAG"], 16) & 0x40}
+        self.assertTrue(no_low)
+        for (tester, site, test_num), stats in agg.stats.items():
+            if test_num in no_low:
+                self.assertIsNone(stats.lo_lim)
@@ -0,0 +1,47 @@
+import csv
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+import numpy as np
+from stdf_utils import StdfRecord, StdfToMatrix
+
+
+class TestStdfToMatrix(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_npy(self):
+        out_path = os.path.join(self.tmp_dir, "lot3.npy")
+        stdf_to_matrix = StdfToMatrix(self.f, out_path, chunk_rows=100)
+        matrix = np.load(out_path, mmap_mode="r")
+        self.assertEqual((1619, 74), matrix.shape)
+        self.assertEqual(54123, int((~np.isnan(matrix)).sum()))
+
+        # the second part's results, in the columns of the mapping
+        with open(stdf_to_matrix.columns_path) as f_in:
+            column = {int(row["test_num"]): int(row["column"]) for row in csv.DictReader(f_in)}
+        part = 0
+        for rec_type, rec in StdfRecord(self.f, {"Ptr", "Prr"}):
+            if rec_type == "Prr":
+                part += 1
+                if part == 2:
+                    break
+            elif part == 1:
+                self.assertEqual(np.float32(rec["RESULT"]), matrix[1, column[rec["TEST_NUM"]]])
+
+    def test_csv_matches_npy(self):
+        npy_path, csv_path = os.path.join(self.tmp_dir, "lot3.npy"), os.path.join(self.tmp_dir, "lot3.csv")
+        StdfToMatrix(self.f, npy_path)
+        StdfToMatrix(self.f, csv_path, tests=[1010, 1000, 1])
+        matrix = np.load(npy_path)
+        with open(csv_path) as f_in:
+            rows = list(csv.reader(f_in))
+        self.assertEqual(["1010", "1000", "1"], rows[0][-3:])
+        values = np.array([[float(v) if v else np.nan for v in row[-3:]] for row in rows[1:]], dtype=np.float32)
+        np.testing.assert_array_equal(matrix[:, [1, 0]], values[:, :2])
+        self.assertTrue(np.isnan(values[:, 2]).all())
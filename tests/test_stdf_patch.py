@@ -1,16 +1,89 @@
 import os
 import re
+import gzip
+import shutil
+import tempfile
 from unittest import TestCase
-from stdf_utils import StdfPatch
+from stdf_utils import StdfPatch, StdfRecord
+from stdf_utils.__main__ import main, parse_assignments
+from stdf_utils.stdf_patch import StdfInPlacePatch, set_fields, undo_patch
 
 
 class TestStdfPatch(TestCase):
     def setUp(self) -> None:
         self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
 
     def test_stdf_patch(self):
-        stdf_patch = StdfPatch(self.f, patch_func=self.patch_func)
-        os.unlink(stdf_patch.mod_stdf_path)
+        stdf_patch = StdfPatch(self.f, os.path.join(self.tmp_dir, "lot3_mod.stdf.gz"), patch_func=self.patch_func)
+        self.assertTrue(os.path.exists(stdf_patch.mod_stdf_path))
+
+    def test_passthrough(self):
+        mod_path = os.path.join(self.tmp_dir, "lot3_mod.stdf")
+        stdf_patch = StdfPatch(self.f, mod_path, patch_func=self.patch_func, patch_types={"Dtr"}, chunk_size=4096)
+        self.assertEqual(0, stdf_patch.patched_cnt)
+        with gzip.open(self.f) as f_in, open(mod_path, "rb") as f_out:
+            self.assertEqual(f_in.read(), f_out.read())
+
+    def test_drop_gdr(self):
+        mod_path = os.path.join(self.tmp_dir, "lot3_mod.stdf.gz")
+        stdf_patch = StdfPatch(self.f, mod_path, patch_func=lambda rec_type, record, buffer: b'',
+                               patch_types={"Gdr"}, chunk_size=4096)
+        self.assertEqual(810, stdf_patch.patched_cnt)
+        expected = [r for r in StdfRecord(self.f) if r[0] != "Gdr"]
+        self.assertEqual(expected, list(StdfRecord(mod_path)))
+
+    def test_in_place(self):
+        stdf_path = os.path.join(self.tmp_dir, "lot3.stdf")
+        with gzip.open(self.f) as f_in, open(stdf_path, "wb") as f_out:
+            original = f_in.read()
+            f_out.write(original)
+
+        patch_func = set_fields({"Mir": {"LOT_ID": b"NEW-LOT"}}, ">")
+        dry_run = StdfInPlacePatch(stdf_path, patch_func, {"Mir"}, dry_run=True)
+        self.assertEqual(1, len(dry_run.edits))
+        self.assertFalse(os.path.exists(dry_run.journal_path))
+
+        stdf_patch = StdfInPlacePatch(stdf_path, patch_func, {"Mir"})
+        self.assertTrue(stdf_patch.in_place)
+        self.assertEqual([b"NEW-LOT"], [r["LOT_ID"] for rec_type, r in StdfRecord(stdf_path) if rec_type == "Mir"])
+        undo_patch(stdf_patch.journal_path)
+        with open(stdf_path, "rb") as f_in:
+            self.assertEqual(original, f_in.read())
+
+    def test_in_place_fallback(self):
+        stdf_patch = StdfInPlacePatch(self.f, set_fields({"Mir": {"LOT_ID": b"NEW-LOT-ID"}}, ">"), {"Mir"},
+                                      mod_stdf_path=os.path.join(self.tmp_dir, "lot3_mod.stdf"))
+        self.assertFalse(stdf_patch.in_place)
+        self.assertEqual([b"NEW-LOT-ID"],
+                         [r["LOT_ID"] for rec_type, r in StdfRecord(stdf_patch.mod_stdf_path) if rec_type == "Mir"])
+
+    def test_parse_assignments(self):
+        values = parse_assignments(["Prr.PART_FLG=0x08", "Prr.HARD_BIN=2", "Mir.LOT_ID=A12345"])
+        self.assertEqual({"Prr": {"PART_FLG": 8, "HARD_BIN": 2}, "Mir": {"LOT_ID": b"A12345"}}, values)
+
+        stdf_patch = StdfInPlacePatch(self.f, set_fields(values, ">"), {"Prr"},
+                                      mod_stdf_path=os.path.join(self.tmp_dir, "lot3_mod.stdf"))
+        flags = {r["PART_FLG"] for rec_type, r in StdfRecord(stdf_patch.mod_stdf_path) if rec_type == "Prr"}
+        self.assertEqual({"0x08"}, flags)
+
+    def test_no_types(self):
+        def patch_func(rec_type: str, record: dict, buffer: bytes) -> bytes:
+            raise AssertionError(f"{rec_type} was not asked for")
+        stdf_patch = StdfPatch(self.f, os.path.join(self.tmp_dir, "lot3_mod.stdf"), patch_func, set())
+        self.assertEqual(0, stdf_patch.patched_cnt)
+        stdf_path = os.path.join(self.tmp_dir, "lot3.stdf")
+        with gzip.open(self.f) as f_in, open(stdf_patch.mod_stdf_path, "rb") as f_mod:
+            original = f_in.read()
+            self.assertEqual(original, f_mod.read())
+        with open(stdf_path, "wb") as f_out:
+            f_out.write(original)
+        in_place = StdfInPlacePatch(stdf_path, patch_func, set())
+        self.assertEqual((True, []), (in_place.in_place, in_place.edits))
+        self.assertEqual(2, main(["patch", stdf_path, "--dry-run"]))
 
     @staticmethod
     def patch_func(rec_type: str, record: dict, buffer: bytes) -> bytes:
@@ -1,4 +1,8 @@
 import os
+import gzip
+import time
+import tempfile
+import threading
 from unittest import TestCase
 from stdf_utils import StdfRecord
 
@@ -13,3 +17,27 @@ class TestStdfRecord(TestCase):
             if i > 100:
                 break
 
+    def test_follow(self):
+        with gzip.open(self.f) as f_in:
+            data = f_in.read()
+        expected = sum(1 for _ in StdfRecord(self.f, {"Prr"}))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "growing.stdf")
+            open(path, "wb").close()
+
+            def tester():
+                # odd chunk size: records are split across writes
+                with open(path, "ab") as f_out:
+                    for i in range(0, len(data), 999_983):
+                        f_out.write(data[i:i + 999_983])
+                        f_out.flush()
+                        time.sleep(0.05)
+
+            writer = threading.Thread(target=tester)
+            writer.start()
+            records = list(StdfRecord(path, {"Prr", "Mrr"}, follow=True, timeout=5, poll_interval=0.01))
+            writer.join()
+
+        self.assertEqual(expected, sum(1 for rec_type, _ in records if rec_type == "Prr"))
+        self.assertEqual("Mrr", records[-1][0])
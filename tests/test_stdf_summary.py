@@ -0,0 +1,37 @@
+import os
+import gzip
+import shutil
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfSummary
+
+
+class TestStdfSummary(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+        self.plain = os.path.join(self.tmp_dir, "lot3.stdf")
+        with gzip.open(self.f) as f_in, open(self.plain, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_tail_matches_scan(self):
+        scan = StdfSummary(self.f)
+        self.assertEqual("scan", scan.method)
+        for tail_size in (256, 64 << 10):
+            tail = StdfSummary(self.plain, tail_size=tail_size)
+            self.assertEqual("tail", tail.method)
+            for attr in ("mrr", "pcr", "hbr", "sbr", "tsr"):
+                self.assertEqual(getattr(scan, attr), getattr(tail, attr))
+
+    def test_counts(self):
+        summary = StdfSummary(self.plain)
+        self.assertEqual(1619, summary.part_cnt)
+        self.assertEqual(1550, summary.top_failing_tests(1)[0]["test_num"])
+
+    def test_truncated_falls_back(self):
+        with open(self.plain, "r+b") as f:
+            f.truncate(os.path.getsize(self.plain) - 3)
+        self.assertEqual("scan", StdfSummary(self.plain).method)
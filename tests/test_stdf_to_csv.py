@@ -1,21 +1,36 @@
 import os
 import hashlib
-from unittest import TestCase
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
 from stdf_utils import StdfToCsv
 
+LOCAL_STDF = r"C:\log\w422_rf_r2gate_release\KN5YT_12_Wafer_Map\RF_A2_WLCSP_KN5YT12_KN5YT12-D1_20240611155932.stdf.gz"
+
 
 class TestStdfToCsv(TestCase):
     def setUp(self) -> None:
         self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
         self.expected_csv = os.path.abspath(os.path.join(self.f, os.pardir, "expected", "lot3.csv"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
 
     def test_stdf_to_csv(self):
-        stdf_to_csv = StdfToCsv(self.f)
+        stdf_to_csv = StdfToCsv(self.f, os.path.join(self.tmp_dir, "lot3.csv"))
         self.assertEqual(self._get_md5(self.expected_csv), self._get_md5(stdf_to_csv.csv_path))
-        os.unlink(stdf_to_csv.csv_path)
 
+    def test_max_memory(self):
+        in_memory = StdfToCsv(self.f, os.path.join(self.tmp_dir, "in_memory.csv"))
+        spilled = StdfToCsv(self.f, os.path.join(self.tmp_dir, "spilled.csv"), max_memory=1 << 20,
+                            tmp_dir=self.tmp_dir)
+        self.assertEqual(self._get_md5(in_memory.csv_path), self._get_md5(spilled.csv_path))
+        self.assertEqual(["in_memory.csv", "spilled.csv"], sorted(os.listdir(self.tmp_dir)))
+
+    @skipUnless(os.path.exists(LOCAL_STDF), "a local production log, not in the repo")
     def test_to_csv_2(self):
-        StdfToCsv(r"C:\log\w422_rf_r2gate_release\KN5YT_12_Wafer_Map\RF_A2_WLCSP_KN5YT12_KN5YT12-D1_20240611155932.stdf.gz")
+        StdfToCsv(LOCAL_STDF, os.path.join(self.tmp_dir, "local.csv"))
 
     @staticmethod
     def _get_md5(f: str):
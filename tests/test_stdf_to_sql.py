@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfGenerator, StdfToSql
+from stdf_utils.sql_conn import SqlConn
+
+
+class TestStdfToSql(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.f = os.path.join(self.tmp_dir, "lot3.stdf.gz")
+        shutil.copy(os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz")), self.f)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def _count(self, sql_conn: SqlConn, table: str) -> int:
+        return sql_conn.cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_bulk_load(self):
+        stdf_to_sql = StdfToSql(self.f)
+        self.assertEqual(1619, self._count(stdf_to_sql.sql_conn, "Part"))
+        self.assertEqual(54123, self._count(stdf_to_sql.sql_conn, "Ptr"))
+        journal_mode, = stdf_to_sql.sql_conn.cursor.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual("delete", journal_mode)
+
+    def test_row_by_row_matches_bulk(self):
+        row_by_row = StdfToSql(self.f, bulk_load=False).sql_conn
+        rows = row_by_row.cursor.execute("SELECT * FROM Ptr ORDER BY part_id, test_num").fetchall()
+        row_by_row.conn.close()
+        os.unlink(os.path.join(self.tmp_dir, "local.db"))
+        bulk = StdfToSql(self.f).sql_conn
+        self.assertEqual(rows, bulk.cursor.execute("SELECT * FROM Ptr ORDER BY part_id, test_num").fetchall())
+
+    def test_skip_existing(self):
+        sql_conn = StdfToSql(self.f).sql_conn
+        StdfToSql(self.f, sql_conn=sql_conn)
+        self.assertEqual(1, self._count(sql_conn, "Stdf"))
+        self.assertEqual(1619, self._count(sql_conn, "Part"))
+
+    def test_blob_storage(self):
+        rows = StdfToSql(self.f, bulk_load=False).sql_conn.cursor.execute(
+            "SELECT part_id, result FROM Ptr WHERE test_num = 1000 ORDER BY part_id").fetchall()
+        os.unlink(os.path.join(self.tmp_dir, "local.db"))
+
+        sql_conn = StdfToSql(self.f, storage="blob").sql_conn
+        self.assertEqual(0, self._count(sql_conn, "Ptr"))
+        (stdf_id, part_ids, results), = sql_conn.get_ptr_blobs(1000)
+        self.assertEqual(rows, sorted(zip(part_ids, results)))
+
+    def test_blob_storage_spilled(self):
+        in_memory = StdfToSql(self.f, storage="blob").sql_conn
+        blobs = in_memory.cursor.execute("SELECT test_num, count, part_ids, results FROM PtrBlob ORDER BY test_num").fetchall()
+        in_memory.conn.close()
+        os.unlink(os.path.join(self.tmp_dir, "local.db"))
+
+        run_dir = os.path.join(self.tmp_dir, "runs")
+        os.mkdir(run_dir)
+        spilled = StdfToSql(self.f, storage="blob", max_memory=1 << 20, tmp_dir=run_dir).sql_conn
+        self.assertEqual(blobs, spilled.cursor.execute(
+            "SELECT test_num, count, part_ids, results FROM PtrBlob ORDER BY test_num").fetchall())
+        self.assertEqual([], os.listdir(run_dir))
+
+    def test_query_by_test_num(self):
+        sql_conn = StdfToSql(self.f).sql_conn
+        sql_conn.create_covering_index()
+        plan = " ".join(str(row) for row in sql_conn.cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT stdf_id, part_id, result FROM Ptr WHERE test_num = ?", (1000,)))
+        self.assertIn("COVERING INDEX Ptr_test_num_idx", plan)
+
+        rows = list(sql_conn.get_by_test_num(1000, batch_size=100))
+        stats, = sql_conn.get_test_stats(1000)
+        self.assertEqual(len(rows), stats["count"])
+        self.assertAlmostEqual(sum(r[2] for r in rows) / len(rows), stats["mean"])
+        self.assertEqual([], list(sql_conn.get_by_test_num(1000, stdf_ids=[stats["stdf_id"] + 1])))
+
+    def test_checkpoint_resume(self):
+        expected = StdfToSql(self.f).sql_conn
+        expected_rows = expected.cursor.execute("SELECT * FROM Ptr ORDER BY part_id, test_num").fetchall()
+        expected.conn.close()
+        os.unlink(os.path.join(self.tmp_dir, "local.db"))
+
+        class Interrupted(StdfToSql):
+            def prr_handler(self, rec: dict) -> bool:
+                if self.part_count == 1234:
+                    raise KeyboardInterrupt
+                return super().prr_handler(rec)
+
+        with self.assertRaises(KeyboardInterrupt):
+            Interrupted(self.f, checkpoint_every=500)
+        stdf_to_sql = StdfToSql(self.f, checkpoint_every=500)
+        self.assertTrue(stdf_to_sql.completed)
+        self.assertGreater(stdf_to_sql.stdf_record.start_offset, 0)
+        self.assertEqual(1619, stdf_to_sql.part_count)
+        rows = stdf_to_sql.sql_conn.cursor.execute("SELECT * FROM Ptr ORDER BY part_id, test_num").fetchall()
+        self.assertEqual(expected_rows, rows)
+        self.assertEqual(0, self._count(stdf_to_sql.sql_conn, "IngestCheckpoint"))
+
+    def test_checkpoint_truncated_ptr(self):
+        # generated PTRs leave out TEST_TXT and the limits after the first of each test
+        stdf_path = os.path.join(self.tmp_dir, "gen.stdf")
+        StdfGenerator(stdf_path, parts=200, sites=4, tests=20, seed=1)
+        stdf_to_sql = StdfToSql(stdf_path, checkpoint_every=50)
+        self.assertTrue(stdf_to_sql.completed)
+        facts = stdf_to_sql.sql_conn.cursor.execute("SELECT test_name, lo_lim FROM PtrFact").fetchall()
+        self.assertEqual(20, len(facts))
+        self.assertTrue(all(name is not None and lo_lim is not None for name, lo_lim in facts))
+
+    def test_test_stats_large_mean(self):
+        sql_conn = StdfToSql(self.f).sql_conn
+        stats, = sql_conn.get_test_stats(1000)
+        sql_conn.cursor.execute("UPDATE Ptr SET result = result + 1e9 WHERE test_num = 1000")
+        shifted, = sql_conn.get_test_stats(1000)
+        self.assertAlmostEqual(stats["mean"] + 1e9, shifted["mean"], delta=1e-3)
+        self.assertAlmostEqual(stats["sigma"], shifted["sigma"], delta=stats["sigma"] * 1e-4)
@@ -1,20 +1,68 @@
-from unittest import TestCase
-from stdf_utils import StdfRecord
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
+from stdf_utils import StdfRecord, StdfToTxt
 from util import OpenFile
 
+LOCAL_STDF = r"C:\Users\nxf79056\Downloads\FT_03112026_000234.std"
+
 
 class TestStdfToTxt(TestCase):
     def setUp(self) -> None:
         # self.f = r"C:\Users\nxf79056\OneDrive - NXP\log\2025\w542_bb2_fowlp_buck_limit_study\20251031184042_fr1_LV93K_A2024250_ENG_r1827_SYSE03CP1400_B240924_TTT_86_80_28_89_81_33_87_94_swap_BUCK_LD_50_250_450mA.stdf"
-        self.f = r"C:\Users\nxf79056\Downloads\FT_03112026_000234.std"
+        self.f = LOCAL_STDF
+        self.lot3 = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    @skipUnless(os.path.exists(LOCAL_STDF), "a local production log, not in the repo")
     def test_stdf_to_txt(self):
-        txt_path = (self.f
-                    .replace(".stdf", ".txt")
-                    .replace(".std", ".txt")
-                    .replace(".gz", ""))
+        txt_path = os.path.join(self.tmp_dir, (os.path.basename(self.f)
+                                               .replace(".stdf", ".txt")
+                                               .replace(".std", ".txt")
+                                               .replace(".gz", "")))
 
         with open(txt_path, "w", newline="") as f_out:
             for rec_type, rec in StdfRecord(self.f):
                 f_out.write(f"=== {rec_type} ===\r\n")
                 for k, v in rec.items():
                     f_out.write(f"{k}: {v}\r\n")
+
+    def test_txt_style(self):
+        # the same bytes as the field-by-field dump above
+        types = {"Far", "Mir", "Prr", "Hbr", "Mrr"}
+        txt_path = os.path.join(self.tmp_dir, "lot3_legacy.txt")
+        record_cnt = 0
+        with open(txt_path, "w", newline="") as f_out:
+            for rec_type, rec in StdfRecord(self.lot3, types):
+                record_cnt += 1
+                f_out.write(f"=== {rec_type} ===\r\n")
+                for k, v in rec.items():
+                    f_out.write(f"{k}: {v}\r\n")
+        stdf_to_txt = StdfToTxt(self.lot3, os.path.join(self.tmp_dir, "lot3.txt"), style="txt", types=types,
+                                batch_size=100)
+        self.assertEqual(record_cnt, stdf_to_txt.record_cnt)
+        with open(txt_path, "rb") as f_legacy, open(stdf_to_txt.txt_path, "rb") as f_in:
+            self.assertEqual(f_legacy.read(), f_in.read())
+
+    def test_atdf_filters(self):
+        stdf_to_txt = StdfToTxt(self.lot3, os.path.join(self.tmp_dir, "lot3.atdf"), types={"Ptr", "Mrr"},
+                                fields={"Ptr.TEST_NUM", "Ptr.RESULT"})
+        self.assertEqual(54123 + 1, stdf_to_txt.record_cnt)
+        with open(stdf_to_txt.txt_path, encoding="latin1", newline="") as f_in:
+            lines = f_in.read().split("\n")
+        self.assertEqual("", lines.pop())
+        self.assertEqual(54123 + 1, len(lines))
+        self.assertEqual("PTR:1000|-0.6610937714576721", lines[0])
+        self.assertTrue(lines[-1].startswith("MRR:991795688|"))
+
+    def test_parallel(self):
+        serial = StdfToTxt(self.lot3, os.path.join(self.tmp_dir, "serial.atdf"), types={"Ptr", "Prr"})
+        parallel = StdfToTxt(self.lot3, os.path.join(self.tmp_dir, "parallel.atdf"), types={"Ptr", "Prr"},
+                             workers=2, batch_size=1000)
+        self.assertEqual(serial.record_cnt, parallel.record_cnt)
+        with open(serial.txt_path, "rb") as f_serial, open(parallel.txt_path, "rb") as f_parallel:
+            self.assertEqual(f_serial.read(), f_parallel.read())
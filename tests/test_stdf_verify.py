@@ -0,0 +1,107 @@
+import os
+import gzip
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfRecord, StdfVerify
+
+
+class TestStdfVerify(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+        with gzip.open(self.f) as f_in:
+            self.data = f_in.read()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, data: bytes) -> str:
+        stdf_path = os.path.join(self.tmp_dir, "lot3.stdf")
+        with open(stdf_path, "wb") as f_out:
+            f_out.write(data)
+        return stdf_path
+
+    def test_clean(self):
+        salvage_path = os.path.join(self.tmp_dir, "salvaged.stdf")
+        verify = StdfVerify(self.f, salvage_path, chunk_size=4096)
+        self.assertTrue(verify.ok)
+        self.assertEqual([], verify.issues)
+        self.assertEqual(len(self.data), verify.size)
+        with open(salvage_path, "rb") as f_in:
+            self.assertEqual(self.data, f_in.read())
+
+    def test_truncated(self):
+        salvage_path = os.path.join(self.tmp_dir, "salvaged.stdf")
+        verify = StdfVerify(self.write(self.data[:len(self.data) // 2]), salvage_path, chunk_size=4096)
+        self.assertFalse(verify.ok)
+        kinds = [issue.kind for issue in verify.issues]
+        self.assertEqual("truncated", kinds[0])
+        self.assertIn("no MRR", [issue.detail for issue in verify.issues])
+        # every record up to the cut is kept, an MRR closes the file
+        records = list(StdfRecord(salvage_path))
+        self.assertEqual("Mrr", records[-1][0])
+        self.assertEqual(verify.record_cnt + 1, len(records))
+
+    def test_damaged(self):
+        middle = len(self.data) // 2
+        data = self.data[:middle] + b'\xff' * 1000 + self.data[middle + 1000:]
+        salvage_path = os.path.join(self.tmp_dir, "salvaged.stdf.gz")
+        verify = StdfVerify(self.write(data), salvage_path, chunk_size=4096)
+        damaged = [issue for issue in verify.issues if issue.kind == "damaged"]
+        self.assertEqual(1, len(damaged))
+        # found at the first header after the last intact one
+        self.assertLess(damaged[0].offset, middle + 1000)
+        self.assertGreaterEqual(verify.damaged_bytes, 1000)
+        # the salvaged file parses to the end
+        records = list(StdfRecord(salvage_path))
+        self.assertEqual("Mrr", records[-1][0])
+        self.assertEqual(verify.record_cnt, len(records))
+        with gzip.open(salvage_path) as f_in:
+            self.assertEqual(verify.kept_bytes, len(f_in.read()))
+
+    def test_unknown_record(self):
+        unknown = struct.pack(">H2s", 3, b'\xfa\x01') + b'abc'
+        far_mir = 6 + 4 + struct.unpack(">H", self.data[6:8])[0]
+        data = self.data[:far_mir] + unknown + self.data[far_mir:]
+        verify = StdfVerify(self.write(data))
+        self.assertTrue(verify.ok)
+        self.assertEqual([far_mir], [issue.offset for issue in verify.issues if issue.kind == "unknown"])
+        self.assertEqual(0, verify.damaged_bytes)
+
+    def test_sequence(self):
+        # the second part's PRR is dropped: its PIR site is opened twice
+        records = []
+        pos = 0
+        while pos < len(self.data):
+            rec_len = struct.unpack(">H", self.data[pos:pos + 2])[0]
+            records.append(self.data[pos:pos + 4 + rec_len])
+            pos += 4 + rec_len
+        prr = [i for i, r in enumerate(records) if r[2:4] == b'\x05\x14']
+        del records[prr[0]]
+        verify = StdfVerify(self.write(b''.join(records)))
+        self.assertFalse(verify.ok)
+        self.assertTrue(all(issue.kind == "sequence" for issue in verify.issues))
+        self.assertIn("while its part is open", verify.issues[0].detail)
+
+    def test_bad_length(self):
+        # a PTR claiming 200 bytes fits the type, but the headers after it do not
+        pos = 0
+        while True:
+            rec_len = struct.unpack(">H", self.data[pos:pos + 2])[0]
+            if pos > len(self.data) // 2 and self.data[pos + 2:pos + 4] == b'\x0f\n' and rec_len < 200:
+                break
+            pos += 4 + rec_len
+        data = self.data[:pos] + struct.pack(">H", 200) + self.data[pos + 2:]
+        salvage_path = os.path.join(self.tmp_dir, "salvaged.stdf")
+        verify = StdfVerify(self.write(data), salvage_path, chunk_size=4096)
+        self.assertEqual([(pos, "damaged")], [(issue.offset, issue.kind) for issue in verify.issues])
+        self.assertEqual(4 + rec_len, verify.damaged_bytes)
+        # only the damaged PTR is left out
+        self.assertEqual(StdfVerify(self.f).record_cnt - 1, len(list(StdfRecord(salvage_path))))
+
+    def test_no_far(self):
+        verify = StdfVerify(self.write(b'\xff' * 6 + self.data[6:]), chunk_size=4096)
+        self.assertEqual(["damaged"], [issue.kind for issue in verify.issues])
+        self.assertEqual((len(self.data), len(self.data)), (verify.size, verify.damaged_bytes))
@@ -0,0 +1,53 @@
+import os
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfPatch, StdfWaferMap, StdfScanner, StdfRecord
+from stdf_utils.stdf_wafer_map import INVALID_COORD
+
+
+class TestStdfWaferMap(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+
+    def test_scanner_matches_record(self):
+        expected = [rec for rec_type, rec in StdfRecord(self.f, {"Prr", "Hbr"})]
+        scanner = StdfScanner(self.f, {"Prr", "Hbr"}, chunk_size=4096)
+        decoder = StdfRecord(self.f)
+        decoded = []
+        for offset, key, body in scanner:
+            decoder.ENDIAN = scanner.ENDIAN
+            decoded.append(decoder.decode(key, body))
+        self.assertEqual(expected, decoded)
+
+    def test_wafer_map(self):
+        wafer_map = StdfWaferMap(self.f)
+        self.assertEqual([], wafer_map.check())
+        wafer, = wafer_map.wafers
+        self.assertEqual("GAL-LOT-03", wafer.wafer_id)
+        self.assertEqual(1619, wafer.part_count_map.sum())
+        self.assertEqual(wafer.part_count_map.sum() - (wafer.part_count_map > 0).sum(),
+                         wafer.retest_count_map.sum())
+        self.assertEqual((wafer.part_count_map > 0).sum(), (wafer.hard_bin_map >= 0).sum())
+        self.assertEqual(1378, sum(n for (site, hard_bin), n in wafer.bin_table().items() if hard_bin == 1))
+
+    def test_truncated_prr(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            first = []
+
+            def cut_first_prr(rec_type: str, record: dict, buffer: bytes) -> bytes:
+                if first:
+                    return buffer
+                first.append(record)
+                return struct.pack(">H", 9) + buffer[2:4] + buffer[4:13]  # X_COORD and after cut off
+
+            mod_path = os.path.join(tmp_dir, "lot3_mod.stdf")
+            StdfPatch(self.f, mod_path, patch_func=cut_first_prr, patch_types={"Prr"})
+            wafer, = StdfWaferMap(mod_path).wafers
+            self.assertEqual(1619, wafer.part_cnt)
+            self.assertEqual(1618, wafer.part_count_map.sum())
+            self.assertEqual((first[0]["HARD_BIN"], INVALID_COORD), (wafer.hard_bin[0], wafer.x[0]))
+        finally:
+            shutil.rmtree(tmp_dir)
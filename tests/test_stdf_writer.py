@@ -0,0 +1,48 @@
+import os
+import gzip
+import shutil
+import tempfile
+from unittest import TestCase
+from stdf_utils import StdfRecord, StdfWriter
+
+
+class TestStdfWriter(TestCase):
+    def setUp(self) -> None:
+        self.f = os.path.abspath(os.path.join(__file__, os.pardir, "data", "lot3.stdf.gz"))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        out_path = os.path.join(self.tmp_dir, "lot3.stdf.gz")
+        with StdfWriter(out_path, endian=">", buffer_size=1 << 16) as writer:
+            for rec_type, rec in StdfRecord(self.f):
+                writer.write(rec_type, rec)
+        with gzip.open(self.f) as f_in, gzip.open(out_path) as f_out:
+            self.assertEqual(f_in.read(), f_out.read())
+
+    def test_little_endian(self):
+        out_path = os.path.join(self.tmp_dir, "lot3_le.stdf")
+        records = list(StdfRecord(self.f))
+        with StdfWriter(out_path, endian="<") as writer:
+            for rec_type, rec in records:
+                writer.write(rec_type, {**rec, "CPU_TYPE": 2} if rec_type == "Far" else rec)
+        records[0] = ("Far", {**records[0][1], "CPU_TYPE": 2})
+        self.assertEqual(records, list(StdfRecord(out_path)))
+
+    def test_encode(self):
+        writer = StdfWriter(os.path.join(self.tmp_dir, "x.stdf"), endian="<")
+        writer.close()
+        decoder = StdfRecord(self.f)
+        decoder.ENDIAN = "<"
+        # trailing fields left out
+        self.assertEqual(b"\x01\x00\x00\x00\x04", writer.encode("Mrr", {"FINISH_T": 1, "DISP_COD": 4}))
+        gdr = {"FLD_CNT": 3, "GEN_DATA": [(0, None), (1, 5), (9, b"abc")]}
+        self.assertEqual(gdr, decoder.decode(b"2\n", writer.encode("Gdr", gdr)))
+        ftr = {"TEST_NUM": 7, "HEAD_NUM": 1, "SITE_NUM": 2, "TEST_FLG": "0x80", "OPT_FLAG": "0xFF", "CYCL_CNT": 0,
+               "REL_VADR": 0, "REPT_CNT": 0, "NUM_FAIL": 0, "XFAIL_AD": 0, "YFAIL_AD": 0, "VECT_OFF": 0,
+               "RTN_ICNT": 3, "PGM_ICNT": 0, "RTN_INDX": [1, 2, 3], "RTN_STAT": [4, 5, 6, 0], "PGM_INDX": [],
+               "PGM_STAT": [], "FAIL_PIN": [1, 0, 0, 1, 0, 0, 0, 0, 0, 1]}
+        decoded = decoder.decode(b"\x0f\x14", writer.encode("Ftr", ftr))
+        self.assertEqual(ftr, {k: decoded[k] for k in ftr})